@@ -0,0 +1,427 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import mimetypes
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import render_template
+
+from app import app as flask_app, config, formatting
+from app.routes import scheduler
+from app.scheduler import QueueFullError
+from app.teacher_ai_module import teacher_ai
+from app.metrics import metrics
+from app.compression import encoder
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ASGI version of the web app, with the same JSON and Server-Sent Events
+# contract as app/routes.py, for serving many mostly idle or streaming
+# connections from one process:
+#
+#     uvicorn app.asgi:application --host 0.0.0.0 --port 5000
+#
+# A connection costs a coroutine instead of a thread. Model requests wait on
+# the request scheduler's futures; other blocking work (template and
+# retrieval responses, stream steps, static files) runs on a bounded thread
+# pool. Requests are abandoned when they time out or the client disconnects,
+# and their queued work is cancelled if it has not started yet.
+
+MAX_BODY_BYTES = 1024 * 1024
+
+BUSY_MESSAGE = "EDUASSIST is busy right now. Please try again in a moment."
+ERROR_MESSAGE = "An internal server error occurred. Please try again."
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class _BoundedPool:
+    """A thread pool that refuses new work once max_pending calls are queued or running"""
+
+    def __init__(self, threads, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Raise QueueFullError if the pool can't take more work"""
+        if self.max_pending and self.pending >= self.max_pending:
+            raise QueueFullError("asgi", 1)
+
+    def submit(self, func, *args):
+        with self._lock:
+            self.pending += 1
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        self.admit()
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+
+pool = _BoundedPool(config.ASGI_THREADS, config.ASGI_MAX_PENDING)
+
+_index_html = None
+
+
+async def _read_json(receive):
+    """The request body parsed as JSON; None if it is missing or invalid"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise RequestTooLarge(f"The request body is larger than {MAX_BODY_BYTES} bytes.")
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _until_disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _user_input(data):
+    # Accept both 'message' and 'question' keys
+    if not isinstance(data, dict):
+        return ""
+    return str(data.get('message', '')).strip() or str(data.get('question', '')).strip()
+
+
+def _query(scope):
+    return dict(parse_qsl(scope.get("query_string", b"").decode('latin-1')))
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", ()):
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _send_response(send, status, body, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload, headers=()):
+    await _send_response(send, status, json.dumps(payload).encode('utf-8'), "application/json", headers)
+
+
+def _busy(retry_after):
+    return 503, {"error": BUSY_MESSAGE}, [(b"retry-after", str(retry_after).encode())]
+
+
+def _lookup(user_input, task_type):
+    """(cache key, cached entry or None) for a request; the key is None for
+    tasks that aren't cached"""
+    if task_type not in ('lesson_plan', 'quiz'):
+        return None, None
+    key = teacher_ai.cache_key(task_type, user_input)
+    return key, teacher_ai.response_cache.get(key) if teacher_ai.response_cache is not None else None
+
+
+async def _answer(user_input, task_type):
+    """(status, payload, headers) for an /ask request; on success the
+    payload is (response_data, display text or None)"""
+    # The key (retrieval scoring, a corpus index built on first use) and the
+    # SQLite cache reads block, so they run on the pool like generation
+    try:
+        key, cached = await pool.run(_lookup, user_input, task_type)
+    except QueueFullError as e:
+        logger.warning(f"⚠️ {e}")
+        return _busy(e.retry_after)
+    if cached is not None:
+        logger.info("✅ Served response from cache")
+        return 200, (cached["response"], cached["display"]), []
+
+    # Identical requests already being generated share that result
+    inflight = teacher_ai.inflight if key is not None else None
+    try:
+        if scheduler is not None and task_type in scheduler.queues and teacher_ai.has_model(task_type):
+            # Waiting on the batch costs no thread; cancelling skips the item if its batch hasn't started
+            start = lambda: scheduler.submit(task_type, user_input)
+        else:
+            pool.admit()
+            start = lambda: pool.submit(teacher_ai.generate_response, user_input, False)
+        future = inflight.submit(key, start) if inflight is not None else start()
+        response_data = await asyncio.wrap_future(future)
+    except QueueFullError as e:
+        logger.warning(f"⚠️ {e}")
+        return _busy(e.retry_after)
+
+    if not response_data.get("success", False):
+        return 400, {"error": response_data.get("message", "Unknown error occurred")}, []
+
+    logger.info("✅ Successfully generated response")
+    return 200, (response_data, None), []
+
+
+async def _send_answer(scope, send, task_type, fmt, response_data, display):
+    """Send a successful /ask response in the requested format, compressed,
+    with an ETag and Cache-Control when the same request will get it again"""
+    body, content_type = formatting.response_body(response_data, fmt, display)
+    status, headers, body = encoder.encode(
+        body, content_type,
+        accept_encoding=_header(scope, "accept-encoding"),
+        if_none_match=_header(scope, "if-none-match"),
+        cacheable=teacher_ai.is_repeatable(task_type, response_data)
+    )
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            *((name.lower().encode(), value.encode()) for name, value in headers),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+async def ask(scope, receive, send):
+    query = _query(scope)
+    data = await _read_json(receive) if scope["method"] == "POST" else query
+    user_input = _user_input(data)
+    logger.info(f"User input: '{user_input}'")
+
+    fmt = query.get("format") or (data.get("format") if isinstance(data, dict) else None)
+    if fmt is not None and fmt not in formatting.FORMATS:
+        await _send_json(send, 400, {"error": f"'format' must be one of: {', '.join(formatting.FORMATS)}."})
+        return 400, "none"
+
+    if not user_input:
+        await _send_json(send, 400, {"error": "Please enter a message."})
+        return 400, "none"
+
+    task_type = teacher_ai.detect_intent(user_input)
+    work = asyncio.ensure_future(_answer(user_input, task_type))
+    disconnected = asyncio.ensure_future(_until_disconnected(receive))
+    done, _ = await asyncio.wait(
+        {work, disconnected}, timeout=config.ASGI_REQUEST_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+    )
+    disconnected.cancel()
+
+    if work not in done:
+        work.cancel()
+        if disconnected in done:
+            logger.info("🔌 Client disconnected, request cancelled")
+            return 499, task_type
+        logger.warning(f"⚠️ Request timed out after {config.ASGI_REQUEST_TIMEOUT}s")
+        queued = scheduler is not None and task_type in scheduler.queues
+        status, payload, headers = _busy(scheduler.retry_after(task_type) if queued else 1)
+    else:
+        try:
+            status, payload, headers = work.result()
+        except Exception as e:
+            logger.error(f"Error in /ask route: {e}")
+            status, payload, headers = 500, {"error": ERROR_MESSAGE}, []
+
+    if status == 200:
+        status = await _send_answer(scope, send, task_type, fmt, *payload)
+    else:
+        await _send_json(send, status, payload, headers)
+    return status, task_type
+
+
+async def ask_stream(scope, receive, send):
+    """Like /ask, but sends the response as Server-Sent Events while it is produced"""
+    data = await _read_json(receive)
+    user_input = _user_input(data)
+    logger.info(f"User input (stream): '{user_input}'")
+
+    if not user_input:
+        await _send_json(send, 400, {"error": "Please enter a message."})
+        return 400, "none"
+
+    try:
+        pool.admit()
+    except QueueFullError as e:
+        status, payload, headers = _busy(e.retry_after)
+        await _send_json(send, status, payload, headers)
+        return status, "none"
+
+    task_type = teacher_ai.detect_intent(user_input)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+
+    # stream_response blocks between events, so each step runs on the pool
+    events = teacher_ai.stream_response(user_input)
+    disconnected = asyncio.ensure_future(_until_disconnected(receive))
+    step = None
+    try:
+        while True:
+            step = pool.submit(next, events, None)
+            waiter = asyncio.wrap_future(step)
+            done, _ = await asyncio.wait(
+                {waiter, disconnected}, timeout=config.ASGI_REQUEST_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+            )
+            if waiter not in done:
+                waiter.cancel()
+                if disconnected in done:
+                    logger.info("🔌 Client disconnected, stream cancelled")
+                    return 499, task_type
+                raise TimeoutError(f"No event in {config.ASGI_REQUEST_TIMEOUT}s")
+
+            item = waiter.result()
+            if item is None:
+                break
+            event, payload = item
+            await send({
+                "type": "http.response.body",
+                "body": f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode('utf-8'),
+                "more_body": True,
+            })
+    except Exception as e:
+        logger.error(f"Error in /ask/stream route: {e}")
+        payload = {"error": ERROR_MESSAGE}
+        await send({
+            "type": "http.response.body",
+            "body": f"event: error\ndata: {json.dumps(payload)}\n\n".encode('utf-8'),
+            "more_body": True,
+        })
+    finally:
+        disconnected.cancel()
+        # A generator can't be closed while a step is still running in it
+        if step is not None:
+            step.add_done_callback(lambda _: events.close())
+        else:
+            events.close()
+
+    await send({"type": "http.response.body", "body": b""})
+    return 200, task_type
+
+
+async def health(scope, receive, send):
+    """Per-model readiness, as in the Flask /health endpoint"""
+    models = {task_type: teacher_ai.registry.readiness(task_type) for task_type in teacher_ai.registry.model_paths}
+    status = "degraded" if "failed" in models.values() else "healthy"
+    await _send_json(send, 200, {
+        "status": status,
+        "message": "EDUASSIST for 'His First Flight' is running",
+        "models": models,
+        "versions": dict(teacher_ai.registry.versions),
+    })
+    return 200, "none"
+
+
+async def metrics_endpoint(scope, receive, send):
+    if not metrics.enabled:
+        await _send_json(send, 404, {"error": "Metrics are disabled."})
+        return 404, "none"
+    await _send_response(send, 200, metrics.render().encode('utf-8'), "text/plain; version=0.0.4")
+    return 200, "none"
+
+
+async def index(scope, receive, send):
+    global _index_html
+    if _index_html is None:
+        with flask_app.test_request_context():
+            _index_html = render_template('index.html').encode('utf-8')
+    await _send_response(send, 200, _index_html, "text/html; charset=utf-8")
+    return 200, "none"
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def static_file(scope, receive, send):
+    root = os.path.realpath(flask_app.static_folder)
+    path = os.path.realpath(os.path.join(root, scope["path"][len("/static/"):]))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        await _send_json(send, 404, {"error": "Not found."})
+        return 404, "none"
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    await _send_response(send, 200, await pool.run(_read_file, path), content_type)
+    return 200, "none"
+
+
+ROUTES = {
+    "/": (("GET",), index),
+    "/ask": (("GET", "POST"), ask),
+    "/ask/stream": (("POST",), ask_stream),
+    "/health": (("GET",), health),
+    "/metrics": (("GET",), metrics_endpoint),
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            pool.executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    if path.startswith("/static/"):
+        endpoint, (methods, handler) = "/static", (("GET",), static_file)
+    elif path in ROUTES:
+        endpoint, (methods, handler) = path, ROUTES[path]
+    else:
+        await _send_json(send, 404, {"error": "Not found."})
+        return
+
+    if scope["method"] not in methods:
+        await _send_json(send, 405, {"error": "Method not allowed."}, [(b"allow", ", ".join(methods).encode())])
+        return
+
+    start = time.perf_counter()
+    try:
+        status, task_type = await handler(scope, receive, send)
+    except RequestTooLarge as e:
+        await _send_json(send, 413, {"error": str(e)})
+        status, task_type = 413, "none"
+
+    if metrics.enabled and endpoint != "/metrics":
+        metrics.inc("eduassist_requests_total", endpoint=endpoint, task_type=task_type, status=status)
+        metrics.observe(
+            "eduassist_stage_duration_seconds", time.perf_counter() - start, stage='request', endpoint=endpoint
+        )
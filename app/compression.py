@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from app import config
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _accepted(accept_encoding):
+    """Content codings the client accepts, from an Accept-Encoding header"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class ResponseEncoder:
+    """Compression, ETags and Cache-Control for rendered responses.
+
+    Bodies of at least min_bytes go out brotli compressed when the brotli
+    package is installed and the client accepts it, gzip compressed
+    otherwise. Cacheable responses -- ones the server would send again
+    unchanged -- get a strong ETag per encoding and a public max-age, a
+    matching If-None-Match is answered 304 without a body, and their
+    compressed bodies are kept in a small LRU so repeats skip compression.
+    """
+
+    def __init__(self, min_bytes=1024, max_age=300, cache_entries=256, gzip_level=6, brotli_quality=5):
+        self.min_bytes = min_bytes
+        self.max_age = max_age
+        self.cache_entries = cache_entries
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compressed = OrderedDict()  # (ETag, encoding) -> compressed body
+        self._lock = threading.Lock()
+
+    def _encoding(self, body, accept_encoding):
+        if len(body) < self.min_bytes:
+            return None
+        accepted = _accepted(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def encode(self, body, content_type, accept_encoding=None, if_none_match=None, cacheable=False):
+        """(status, headers, body) for a rendered body; headers is a list of (name, value)"""
+        encoding = self._encoding(body, accept_encoding)
+        headers = [("Content-Type", content_type), ("Vary", "Accept-Encoding")]
+
+        etag = None
+        if cacheable:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+            headers.append(("ETag", etag))
+            headers.append(("Cache-Control", f"public, max-age={self.max_age}"))
+            if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+                return 304, headers, b""
+        else:
+            headers.append(("Cache-Control", "no-store"))
+
+        if encoding is None:
+            return 200, headers, body
+
+        headers.append(("Content-Encoding", encoding))
+        if etag is None:
+            return 200, headers, self._compress(body, encoding)
+
+        key = (etag, encoding)
+        with self._lock:
+            compressed = self.compressed.get(key)
+            if compressed is not None:
+                self.compressed.move_to_end(key)
+        if compressed is None:
+            compressed = self._compress(body, encoding)
+            with self._lock:
+                self.compressed[key] = compressed
+                while len(self.compressed) > self.cache_entries:
+                    self.compressed.popitem(last=False)
+        return 200, headers, compressed
+
+
+encoder = ResponseEncoder(min_bytes=config.COMPRESS_MIN_BYTES, max_age=config.ASK_CACHE_MAX_AGE)
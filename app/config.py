@@ -0,0 +1,132 @@
+import os
+
+# Runtime settings for EDUASSIST. Every value can be overridden with an
+# environment variable so that each worker can be tuned without code changes.
+
+
+def _env_list(name, default=""):
+    """Read a comma separated environment variable into a list"""
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+# Where the fine-tuned models produced by train_models.py live
+MODEL_PATHS = {
+    'lesson_plan': os.environ.get('EDUASSIST_LESSON_PLAN_MODEL', 'trained_models/final_model_lesson_plan'),
+    'quiz': os.environ.get('EDUASSIST_QUIZ_MODEL', 'trained_models/final_model_quiz'),
+}
+
+# Template-only serving: no model is ever loaded and torch is never imported,
+# so a container starts in well under a second. Every request gets the
+# closest curated sample or the built-in template.
+TEMPLATE_ONLY = os.environ.get('EDUASSIST_TEMPLATE_ONLY', '0') == '1'
+
+# Tasks whose models are loaded in the background as soon as the app starts.
+# Models for every other task are loaded the first time that task is requested.
+PRELOAD_TASKS = _env_list('EDUASSIST_PRELOAD_TASKS')
+
+# Model rollouts without a restart. A manifest in the models directory maps
+# each task to {"path": ..., "version": ...}; tasks it doesn't list are
+# versioned by their directory's newest file. Every MODEL_WATCH_INTERVAL
+# seconds (0 turns watching off) a new version is loaded in the background,
+# warmed with the first MODEL_WARMUP_PROMPTS prompts of the validation data
+# and swapped in, and the old weights are released once the requests using
+# them finish. The pre-fork server reloads its workers instead.
+MODEL_MANIFEST = os.environ.get('EDUASSIST_MODEL_MANIFEST', 'trained_models/manifest.json')
+MODEL_WATCH_INTERVAL = float(os.environ.get('EDUASSIST_MODEL_WATCH_INTERVAL', '0'))
+MODEL_WARMUP_PROMPTS = int(os.environ.get('EDUASSIST_MODEL_WARMUP_PROMPTS', '2'))
+MODEL_WARMUP_DATA_FILES = {
+    'lesson_plan': os.environ.get('EDUASSIST_LESSON_PLAN_WARMUP_DATA', 'data/lesson_plan_validation.json'),
+    'quiz': os.environ.get('EDUASSIST_QUIZ_WARMUP_DATA', 'data/quiz_validation.json'),
+}
+
+# CPU inference: dynamic int8 quantization of the linear layers (saved next to
+# each final_model_* directory and reused), torch.compile, and the number of
+# torch threads per worker (0 keeps torch's default)
+INFERENCE_QUANTIZE = os.environ.get('EDUASSIST_QUANTIZE', '0') == '1'
+INFERENCE_COMPILE = os.environ.get('EDUASSIST_COMPILE', '0') == '1'
+INFERENCE_THREADS = int(os.environ.get('EDUASSIST_TORCH_THREADS', '0'))
+
+# Batched generation with the fine-tuned models
+GENERATION_MAX_BATCH_SIZE = int(os.environ.get('EDUASSIST_GENERATION_MAX_BATCH_SIZE', '8'))
+GENERATION_MAX_WAIT_MS = float(os.environ.get('EDUASSIST_GENERATION_MAX_WAIT_MS', '10'))
+GENERATION_MAX_NEW_TOKENS = int(os.environ.get('EDUASSIST_GENERATION_MAX_NEW_TOKENS', '512'))
+
+# Keys and values of recent prompts, kept per task model so that a prompt
+# starting like an earlier one only prefills the tokens that differ. Bounded
+# in megabytes, least recently used first out; 0 disables it.
+PREFIX_CACHE_MB = float(os.environ.get('EDUASSIST_PREFIX_CACHE_MB', '64'))
+
+# Decode model output under the JSON schema of the curated samples in data/:
+# keys and punctuation are filled in without running the model, only tokens
+# that keep the JSON valid are allowed, and decoding stops when the object
+# closes. Requests are then decoded one at a time instead of in batches.
+CONSTRAINED_DECODING = os.environ.get('EDUASSIST_CONSTRAINED_DECODING', '0') == '1'
+
+# Seconds to wait for a model before falling back to the template generators
+GENERATION_TIMEOUT = float(os.environ.get('EDUASSIST_GENERATION_TIMEOUT', '30'))
+
+# Request scheduler between /ask and the models: one queue per task type.
+# Requests are collected for up to MAX_WAIT_MS or MAX_BATCH_SIZE items and run
+# as one batch. When a queue already holds MAX_QUEUE_DEPTH requests, /ask
+# answers 503 with a Retry-After header.
+SCHEDULER_ENABLED = os.environ.get('EDUASSIST_SCHEDULER_ENABLED', '1') == '1'
+SCHEDULER_MAX_BATCH_SIZE = int(os.environ.get('EDUASSIST_SCHEDULER_MAX_BATCH_SIZE', '8'))
+SCHEDULER_MAX_WAIT_MS = float(os.environ.get('EDUASSIST_SCHEDULER_MAX_WAIT_MS', '20'))
+SCHEDULER_MAX_QUEUE_DEPTH = int(os.environ.get('EDUASSIST_SCHEDULER_MAX_QUEUE_DEPTH', '64'))
+SCHEDULER_TIMEOUT = float(os.environ.get('EDUASSIST_SCHEDULER_TIMEOUT', '60'))
+
+# Finished responses are cached by task type and request parameters, so
+# repeated requests skip generation and formatting. Set the size to 0 to
+# disable caching; set a database path to share the cache between workers.
+RESPONSE_CACHE_SIZE = int(os.environ.get('EDUASSIST_RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_TTL = float(os.environ.get('EDUASSIST_RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_DB = os.environ.get('EDUASSIST_RESPONSE_CACHE_DB', '') or None
+
+# /ask bodies of at least COMPRESS_MIN_BYTES are gzip compressed (brotli when
+# the package is installed) for clients that accept it. Responses that stay
+# the same while they are in the response cache get a strong ETag and may be
+# cached by clients for ASK_CACHE_MAX_AGE seconds.
+COMPRESS_MIN_BYTES = int(os.environ.get('EDUASSIST_COMPRESS_MIN_BYTES', '1024'))
+ASK_CACHE_MAX_AGE = int(os.environ.get('EDUASSIST_ASK_CACHE_MAX_AGE', '300'))
+
+# Identical /ask requests that arrive while one is being generated wait for
+# that generation instead of starting their own (keyed like the cache)
+SINGLEFLIGHT_ENABLED = os.environ.get('EDUASSIST_SINGLEFLIGHT_ENABLED', '1') == '1'
+
+# Nearest-match retrieval over the curated samples in data/. Without a model,
+# requests get the closest curated lesson plan or quiz, adapted to the
+# request's parameters; the hard-coded templates are the last resort.
+RETRIEVAL_ENABLED = os.environ.get('EDUASSIST_RETRIEVAL_ENABLED', '1') == '1'
+RETRIEVAL_DATA_FILES = {
+    'lesson_plan': _env_list('EDUASSIST_LESSON_PLAN_DATA', 'data/lesson_plan_training.json,data/lesson_plan_validation.json'),
+    'quiz': _env_list('EDUASSIST_QUIZ_DATA', 'data/quiz_training.json,data/quiz_validation.json'),
+}
+
+# Number of retrieved samples to show the model before each request. The
+# fine-tuned models are trained without examples, so this is off by default.
+FEW_SHOT_EXAMPLES = int(os.environ.get('EDUASSIST_FEW_SHOT_EXAMPLES', '0'))
+
+# Request counts, per-stage latency histograms, cache, model and queue
+# gauges, served in the Prometheus text format at /metrics
+METRICS_ENABLED = os.environ.get('EDUASSIST_METRICS_ENABLED', '1') == '1'
+
+# Pre-fork server (run_chatbot_app.py --workers N): the master process loads
+# the models once and forks SERVER_WORKERS workers that share the weights,
+# each serving requests on SERVER_THREADS threads. 0 workers runs Flask's
+# development server instead.
+SERVER_HOST = os.environ.get('EDUASSIST_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('EDUASSIST_PORT', '5000'))
+SERVER_WORKERS = int(os.environ.get('EDUASSIST_WORKERS', '0'))
+SERVER_THREADS = int(os.environ.get('EDUASSIST_WORKER_THREADS', '8'))
+
+# ASGI serving path (app.asgi:application). CPU-bound work runs on a pool of
+# ASGI_THREADS threads; at most ASGI_MAX_PENDING requests may wait for it
+# before new ones get 503, and a request that takes longer than
+# ASGI_REQUEST_TIMEOUT seconds is abandoned with 503.
+ASGI_THREADS = int(os.environ.get('EDUASSIST_ASGI_THREADS', '4'))
+ASGI_MAX_PENDING = int(os.environ.get('EDUASSIST_ASGI_MAX_PENDING', '256'))
+ASGI_REQUEST_TIMEOUT = float(os.environ.get('EDUASSIST_ASGI_REQUEST_TIMEOUT', '120'))
+
+# Largest number of requests accepted by one /ask/batch call
+BULK_MAX_REQUESTS = int(os.environ.get('EDUASSIST_BULK_MAX_REQUESTS', '200'))
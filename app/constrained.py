@@ -0,0 +1,486 @@
+import os
+import json
+import logging
+from functools import lru_cache
+
+from app.retrieval import _dataset_samples
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Schema-constrained JSON decoding for the task models.
+#
+# The schema of each task's output (key order, which keys are optional,
+# value types, list lengths and small closed sets of string values) is read
+# from the curated samples in data/. A grammar walker turns the schema into
+# a sequence of steps: fixed text (keys, punctuation, constant values), a
+# choice between a few fixed texts (close a list or add an item, optional
+# keys, enum values), a free string or a free integer. Fixed text is never
+# decoded: it is appended to the output and fed to the model together with
+# the next free token, in one forward pass. Free steps only allow tokens
+# that keep the output valid, and decoding stops as soon as the object
+# closes. When the token budget runs out, the rest of the object is closed
+# with the shortest valid text, so the output always parses.
+
+# Longest lookahead a closing token may reach into the following fixed text
+_MAX_FOLLOW_CHARS = 12
+
+# Strings are enums when the samples show a few short, digit-free categories.
+# A value that never varies in the data (a title, the focus) stays free text,
+# since requests can ask for something else.
+_MAX_ENUM_VALUES = 6
+_MAX_ENUM_CHARS = 20
+_MIN_ENUM_SAMPLES = 10
+
+# JSON string escape states: 0 normal, 1 after a backslash, 2-5 inside \uXXXX
+# with 4-1 hex digits to go
+_STRING_STATES = 6
+_CLOSE_STRING = {0: '"', 1: 'n"', 2: '0000"', 3: '000"', 4: '00"', 5: '0"'}
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def infer_schema(values):
+    """The schema shared by a list of JSON values from the training data"""
+    if values and all(isinstance(value, dict) for value in values):
+        order = []
+        for value in values:
+            position = -1
+            for key in value:
+                if key in order:
+                    position = order.index(key)
+                else:
+                    position += 1
+                    order.insert(position, key)
+        fields = [
+            (key, infer_schema([value[key] for value in values if key in value]), all(key in value for value in values))
+            for key in order
+        ]
+        return {"type": "object", "fields": fields}
+
+    if values and all(isinstance(value, list) for value in values):
+        lengths = [len(value) for value in values]
+        items = [item for value in values for item in value]
+        return {"type": "array", "items": infer_schema(items), "min": max(1, min(lengths)), "max": max(1, 2 * max(lengths))}
+
+    if values and all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return {"type": "integer"}
+
+    schema = {"type": "string"}
+    distinct = sorted({value for value in values if isinstance(value, str)})
+    if (len(values) >= _MIN_ENUM_SAMPLES and 2 <= len(distinct) <= _MAX_ENUM_VALUES
+            and all(isinstance(value, str) for value in values)
+            and all(len(value) <= _MAX_ENUM_CHARS and not any(char.isdigit() for char in value) for value in distinct)):
+        schema["enum"] = distinct
+    return schema
+
+
+def load_schemas(data_files):
+    """task_type -> schema of the outputs in that task's data files"""
+    schemas = {}
+    for task_type, paths in data_files.items():
+        outputs = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    samples = _dataset_samples(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Could not read the output schema from {path}: {e}")
+                continue
+            outputs.extend(sample["output"] for sample in samples if isinstance(sample.get("output"), dict))
+        if outputs:
+            schemas[task_type] = infer_schema(outputs)
+    return schemas
+
+
+def schema_errors(value, schema, path="$"):
+    """Where a JSON value departs from a schema, one message per problem (empty when it conforms)"""
+    kind = schema["type"]
+    if kind == "object":
+        if not isinstance(value, dict):
+            return [f"{path}: expected an object"]
+        errors = []
+        for key, field, required in schema["fields"]:
+            if key in value:
+                errors.extend(schema_errors(value[key], field, f"{path}.{key}"))
+            elif required:
+                errors.append(f"{path}.{key}: missing")
+        known = {key for key, _, _ in schema["fields"]}
+        errors.extend(f"{path}.{key}: unexpected key" for key in value if key not in known)
+        return errors
+
+    if kind == "array":
+        if not isinstance(value, list):
+            return [f"{path}: expected an array"]
+        errors = []
+        if len(value) < schema["min"]:
+            errors.append(f"{path}: {len(value)} items, expected at least {schema['min']}")
+        for i, item in enumerate(value):
+            errors.extend(schema_errors(item, schema["items"], f"{path}[{i}]"))
+        return errors
+
+    if kind == "integer":
+        return [] if isinstance(value, int) and not isinstance(value, bool) else [f"{path}: expected an integer"]
+
+    if not isinstance(value, str):
+        return [f"{path}: expected a string"]
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path}: {value!r} is not one of {', '.join(schema['enum'])}"]
+    return []
+
+
+def _follow(options, follow):
+    """Every option followed by every text that can come after it, cut to the lookahead length"""
+    return tuple(sorted({(option + after)[:_MAX_FOLLOW_CHARS] for option in options for after in follow}))
+
+
+def _field_options(fields, start, first):
+    """The fixed texts that can come next in an object: one of the optional
+    fields before the next required one, that required field, or the end
+    of the object when no required field is left."""
+    separator = "" if first else ", "
+    candidates = []
+    for index in range(start, len(fields)):
+        candidates.append(index)
+        if fields[index][2]:
+            break
+    options = [f"{separator}{json.dumps(fields[index][0])}:" for index in candidates]
+    closes = not candidates or not fields[candidates[-1]][2]
+    if closes:
+        options.append("}")
+    return candidates, options, closes
+
+
+def walk(schema, lead, follow):
+    """Generate the decoding steps for a value of the given schema.
+
+    Yields ("text", text), ("choice", options) -- which must be answered
+    with the index of the chosen option via send() -- ("string", follow)
+    and ("integer", lead, follow). lead is the space json.dumps puts in
+    front of the value; follow holds the texts that can come after it.
+    """
+    kind = schema["type"]
+    if kind == "object":
+        yield ("text", lead + "{")
+        fields = schema["fields"]
+        start, first = 0, True
+        while True:
+            candidates, options, closes = _field_options(fields, start, first)
+            if len(options) == 1:
+                yield ("text", options[0])
+                choice = 0
+            else:
+                choice = yield ("choice", options)
+            if closes and choice == len(options) - 1:
+                return
+            index = candidates[choice]
+            _, next_options, next_closes = _field_options(fields, index + 1, False)
+            keys = next_options[:-1] if next_closes else next_options
+            value_follow = tuple(sorted(set(_follow(keys, ("",))) | set(_follow(("}",), follow) if next_closes else ())))
+            yield from walk(fields[index][1], " ", value_follow)
+            start, first = index + 1, False
+
+    elif kind == "array":
+        yield ("text", lead + "[")
+        count = 0
+        while True:
+            separators = []
+            if count + 1 < schema["max"]:
+                separators.append(",")
+            if count + 1 >= schema["min"]:
+                separators.append("]")
+            item_follow = set(_follow((",",), ("",))) if "," in separators else set()
+            if "]" in separators:
+                item_follow.update(_follow(("]",), follow))
+            item_follow = tuple(sorted(item_follow))
+            yield from walk(schema["items"], "" if count == 0 else " ", item_follow)
+            count += 1
+            if len(separators) == 1:
+                yield ("text", separators[0])
+                choice = 0
+            else:
+                choice = yield ("choice", separators)
+            if separators[choice] == "]":
+                return
+
+    elif kind == "integer":
+        yield ("integer", lead, follow)
+
+    elif schema.get("enum"):
+        options = [lead + json.dumps(value) for value in schema["enum"]]
+        if len(options) == 1:
+            yield ("text", options[0])
+        else:
+            yield ("choice", options)
+
+    else:
+        yield ("text", lead + '"')
+        yield ("string", follow)
+
+
+def _advance_string(state, text):
+    """Run a token's text through the JSON string escape states.
+
+    Returns (state after the text, None), (None, suffix) when an unescaped
+    quote closes the string (suffix is the text after it), or (None, None)
+    when the text can't appear here.
+    """
+    for position, char in enumerate(text):
+        if state == 0:
+            if char == '"':
+                return None, text[position + 1:]
+            if char == '\\':
+                state = 1
+            elif ord(char) < 0x20 or char == '�':
+                return None, None
+        elif state == 1:
+            if char == 'u':
+                state = 2
+            elif char in '"\\/bfnrt':
+                state = 0
+            else:
+                return None, None
+        elif char in _HEX_DIGITS:
+            state = 0 if state == 5 else state + 1
+        else:
+            return None, None
+    return state, None
+
+
+class TokenIndex:
+    """Per-tokenizer tables of which tokens may appear in each decoding step"""
+
+    def __init__(self, tokenizer, vocab_size):
+        import torch
+
+        self.vocab_size = vocab_size
+        special = set(tokenizer.all_special_ids)
+        texts = tokenizer.batch_decode([[token_id] for token_id in range(len(tokenizer))])
+        self.texts = texts + [""] * (vocab_size - len(texts))
+
+        self.by_text = {}
+        self.string_masks = [torch.zeros(vocab_size, dtype=torch.bool) for _ in range(_STRING_STATES)]
+        self.string_next = [[-1] * vocab_size for _ in range(_STRING_STATES)]
+        self.closers = {}  # text after the closing quote -> token ids
+        self.digits = torch.zeros(vocab_size, dtype=torch.bool)
+        self.spaced_digits = torch.zeros(vocab_size, dtype=torch.bool)
+
+        for token_id, text in enumerate(self.texts):
+            if not text or token_id in special:
+                continue
+            self.by_text.setdefault(text, []).append(token_id)
+            if text.isascii() and text.isdigit():
+                self.digits[token_id] = True
+            elif text[0] == " " and text[1:].isascii() and text[1:].isdigit():
+                self.spaced_digits[token_id] = True
+            for state in range(_STRING_STATES):
+                next_state, suffix = _advance_string(state, text)
+                if next_state is not None:
+                    self.string_masks[state][token_id] = True
+                    self.string_next[state][token_id] = next_state
+                elif suffix is not None and state == 0:
+                    self.closers.setdefault(suffix, []).append(token_id)
+
+    @lru_cache(maxsize=1024)
+    def prefix_ids(self, texts):
+        """Tokens whose text is a non-empty prefix of one of the texts"""
+        ids = set()
+        for text in texts:
+            for end in range(1, len(text) + 1):
+                ids.update(self.by_text.get(text[:end], ()))
+        return tuple(sorted(ids))
+
+    @lru_cache(maxsize=1024)
+    def closer_ids(self, follow):
+        """Tokens that close a string and continue with a prefix of one of the follow texts"""
+        ids = set()
+        for text in follow:
+            for end in range(len(text) + 1):
+                ids.update(self.closers.get(text[:end], ()))
+        return tuple(sorted(ids))
+
+    def mask(self, ids, base=None):
+        import torch
+
+        mask = base.clone() if base is not None else torch.zeros(self.vocab_size, dtype=torch.bool)
+        if ids:
+            mask[list(ids)] = True
+        return mask
+
+
+class ConstrainedDecoder:
+    """Greedy decoding of one JSON object that follows a schema.
+
+    decode() is a generator of text pieces; afterwards `text` holds the
+    whole object, and `free_tokens`, `forced_tokens` and `forward_passes`
+    say how the tokens were produced.
+    """
+
+    def __init__(self, model, tokenizer, token_index, schema, max_new_tokens=512, prefill=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.index = token_index
+        self.schema = schema
+        self.max_new_tokens = max_new_tokens
+        self.prefill = prefill  # prompt ids -> past key/values of all but the last one
+
+    def decode(self, prompt):
+        import torch
+
+        self.past = None
+        self.pending_ids = self.tokenizer(prompt).input_ids
+        if self.prefill is not None:
+            self.past = self.prefill(self.pending_ids)
+            self.pending_ids = self.pending_ids[-1:]
+        self.pending_text = ""
+        self.buffer = ""  # text a token produced beyond the step that picked it
+        self.pieces = []
+        self.text_pieces = []
+        self.free_tokens = 0
+        self.forced_tokens = 0
+        self.forward_passes = 0
+        self.finishing = False
+
+        steps = walk(self.schema, " ", ("",))
+        with torch.inference_mode():
+            answer = None
+            while True:
+                try:
+                    step = steps.send(answer)
+                except StopIteration:
+                    break
+                answer = None
+                if step[0] == "text":
+                    self._force(step[1])
+                elif step[0] == "choice":
+                    answer = self._choose(step[1])
+                elif step[0] == "string":
+                    self._string(step[1])
+                else:
+                    self._integer(step[1], step[2])
+                if self.pieces:
+                    yield "".join(self.pieces)
+                    self.text_pieces.extend(self.pieces)
+                    self.pieces = []
+
+    @property
+    def text(self):
+        return "".join(self.text_pieces)
+
+    def _emit(self, text, forced):
+        self.pieces.append(text)
+        if forced:
+            self.pending_text += text
+
+    def _force(self, text):
+        """Append fixed text, minus whatever the last picked token already produced"""
+        if self.buffer:
+            if text.startswith(self.buffer):
+                text, self.buffer = text[len(self.buffer):], ""
+            elif self.buffer.startswith(text):
+                self.buffer = self.buffer[len(text):]
+                return
+            else:
+                raise ValueError(f"Decoded text {self.buffer!r} does not continue with {text!r}")
+        if text:
+            self._emit(text, forced=True)
+
+    def _logits(self):
+        import torch
+
+        ids = self.pending_ids
+        if self.pending_text:
+            forced = self.tokenizer(self.pending_text, add_special_tokens=False).input_ids
+            self.forced_tokens += len(forced)
+            ids = ids + forced
+        output = self.model(
+            input_ids=torch.tensor([ids], device=self.model.device), past_key_values=self.past, use_cache=True
+        )
+        self.past = output.past_key_values
+        self.pending_ids, self.pending_text = [], ""
+        self.forward_passes += 1
+        return output.logits[0, -1]
+
+    def _pick(self, mask):
+        """The most likely allowed token, or None once the token budget is spent"""
+        if self.finishing:
+            return None
+        logits = self._logits()
+        mask = mask[:logits.shape[-1]]
+        token_id = int(logits.masked_fill(~mask, float('-inf')).argmax())
+        self.pending_ids = [token_id]
+        self.free_tokens += 1
+        if self.free_tokens + self.forced_tokens >= self.max_new_tokens:
+            self.finishing = True
+        return token_id
+
+    def _choose(self, options):
+        while True:
+            complete = [i for i, option in enumerate(options) if self.buffer.startswith(option)]
+            if complete:
+                choice = max(complete, key=lambda i: len(options[i]))
+                self._force(options[choice])
+                return choice
+            live = [i for i, option in enumerate(options) if option.startswith(self.buffer)]
+            if not live:
+                raise ValueError(f"Decoded text {self.buffer!r} matches none of {options!r}")
+            if len(live) == 1 or self.finishing:
+                choice = min(live, key=lambda i: len(options[i]))
+                self._force(options[choice])
+                return choice
+
+            # Fixed text shared by every remaining option needs no decoding
+            common = os.path.commonprefix([options[i] for i in live])
+            if len(common) > len(self.buffer):
+                added = common[len(self.buffer):]
+                self._emit(added, forced=True)
+                self.buffer = common
+                continue
+
+            remainders = tuple(options[i][len(self.buffer):] for i in live)
+            token_id = self._pick(self.index.mask(self.index.prefix_ids(remainders)))
+            if token_id is not None:
+                text = self.index.texts[token_id]
+                self._emit(text, forced=False)
+                self.buffer += text
+
+    def _string(self, follow):
+        state = 0
+        closers = self.index.closer_ids(follow)
+        closer_mask = self.index.mask(closers, base=self.index.string_masks[0])
+        closer_set = set(closers)
+        while True:
+            token_id = self._pick(closer_mask if state == 0 else self.index.string_masks[state])
+            if token_id is None:
+                self._emit(_CLOSE_STRING[state], forced=True)
+                return
+            text = self.index.texts[token_id]
+            self._emit(text, forced=False)
+            if state == 0 and token_id in closer_set:
+                self.buffer = _advance_string(0, text)[1]
+                return
+            state = self.index.string_next[state][token_id]
+
+    def _integer(self, lead, follow):
+        digits = 0
+        enders = self.index.prefix_ids(follow)
+        end_mask = self.index.mask(enders)
+        end_set = set(enders)
+        while True:
+            if digits == 0:
+                mask = self.index.spaced_digits if lead else self.index.digits
+            elif digits >= 6:
+                mask = end_mask
+            else:
+                mask = end_mask | self.index.digits
+            token_id = self._pick(mask)
+            if token_id is None:
+                if digits == 0:
+                    self._emit(lead + "0", forced=True)
+                return
+            text = self.index.texts[token_id]
+            self._emit(text, forced=False)
+            if token_id in end_set:
+                self.buffer = text
+                return
+            digits += len(text.strip())
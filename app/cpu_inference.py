@@ -0,0 +1,163 @@
+import io
+import os
+import json
+import time
+import logging
+
+import torch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Only imported by the model registry once a model is being loaded, so torch
+# stays out of workers that never serve a model.
+
+
+def quantized_artifact_path(model_path):
+    """Where the int8 version of a model is stored, next to the model directory"""
+    return f"{model_path.rstrip('/')}_int8.pt"
+
+
+def _report_path(model_path):
+    return f"{model_path.rstrip('/')}_int8.json"
+
+
+def _weights_mtime(model_path):
+    """Newest modification time of the files in a saved model directory"""
+    mtimes = [
+        os.path.getmtime(os.path.join(model_path, name))
+        for name in os.listdir(model_path)
+        if os.path.isfile(os.path.join(model_path, name))
+    ]
+    return max(mtimes, default=0.0)
+
+
+def model_size_bytes(model):
+    """Serialized size of the model's weights, including packed int8 weights"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def measure_forward_latency(model, seq_length=64, runs=3):
+    """Average seconds for one forward pass over a dummy prompt"""
+    input_ids = torch.zeros((1, seq_length), dtype=torch.long, device=model.device)
+    with torch.inference_mode():
+        model(input_ids=input_ids)  # warm-up
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(input_ids=input_ids)
+    return (time.perf_counter() - start) / runs
+
+
+def _conv1d_to_linear(model):
+    """Swap GPT-2's Conv1D layers for nn.Linear so dynamic quantization covers them"""
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every linear layer (weights int8, activations fp32)"""
+    model = _conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_or_build_quantized(model_path, load_fp32_model):
+    """Return (int8 model, report), reusing the saved artifact when it is up to date.
+
+    load_fp32_model is only called when the artifact has to be (re)built.
+    """
+    artifact_path = quantized_artifact_path(model_path)
+    if os.path.exists(artifact_path) and os.path.getmtime(artifact_path) >= _weights_mtime(model_path):
+        model = torch.load(artifact_path, weights_only=False)
+        model.eval()
+        try:
+            with open(_report_path(model_path), 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            report = {}
+        report["artifact"] = artifact_path
+        report["reused_artifact"] = True
+        return model, report
+
+    model = load_fp32_model()
+    fp32_bytes = model_size_bytes(model)
+    fp32_latency = measure_forward_latency(model)
+
+    model = quantize_int8(model)
+    model.eval()
+    int8_bytes = model_size_bytes(model)
+    int8_latency = measure_forward_latency(model)
+
+    report = {
+        "fp32_mb": round(fp32_bytes / 1e6, 1),
+        "int8_mb": round(int8_bytes / 1e6, 1),
+        "memory_saved_mb": round((fp32_bytes - int8_bytes) / 1e6, 1),
+        "fp32_forward_ms": round(fp32_latency * 1000, 2),
+        "int8_forward_ms": round(int8_latency * 1000, 2),
+        "latency_change_pct": round((int8_latency - fp32_latency) / fp32_latency * 100, 1),
+    }
+
+    try:
+        torch.save(model, artifact_path)
+        with open(_report_path(model_path), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"💾 Saved quantized model to {artifact_path}")
+    except OSError as e:
+        logger.warning(f"⚠️ Could not save quantized model to {artifact_path}: {e}")
+
+    report["artifact"] = artifact_path
+    report["reused_artifact"] = False
+    return model, report
+
+
+def compile_model(model):
+    """Compile the model's forward pass with torch.compile (dynamic shapes for KV-cache decoding).
+
+    Compilation happens on the first calls, so a short generate() runs here
+    to pay that cost while the model loads rather than on a user's request.
+    """
+    model.forward = torch.compile(model.forward, dynamic=True)
+
+    start = time.perf_counter()
+    input_ids = torch.zeros((2, 8), dtype=torch.long, device=model.device)
+    with torch.inference_mode():
+        model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                       max_new_tokens=3, do_sample=False, pad_token_id=0)
+    logger.info(f"⚙️ Compiled model forward pass in {time.perf_counter() - start:.1f}s")
+    return model
+
+
+def prepare_for_cpu(model_path, load_fp32_model, quantize=False, compile=False):
+    """Load a model for CPU inference, applying the configured optimizations.
+
+    Returns (model, report) where report describes what was applied and, for
+    quantization, the memory saved and the change in forward latency.
+    """
+    report = {"quantized": quantize, "compiled": compile}
+    if quantize:
+        model, quantize_report = load_or_build_quantized(model_path, load_fp32_model)
+        report.update(quantize_report)
+        if "memory_saved_mb" in report:
+            logger.info(
+                f"⚡ int8 model {model_path}: {report['fp32_mb']}MB → {report['int8_mb']}MB "
+                f"(saved {report['memory_saved_mb']}MB), forward {report['fp32_forward_ms']}ms → "
+                f"{report['int8_forward_ms']}ms ({report['latency_change_pct']:+}%)"
+            )
+    else:
+        model = load_fp32_model()
+
+    if compile:
+        model = compile_model(model)
+
+    return model, report
@@ -0,0 +1,201 @@
+import os
+import json
+import logging
+
+from app.metrics import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rendering of finished responses in the formats /ask serves:
+#
+#   text  the plain display text (what /ask has always returned)
+#   html  an escaped HTML fragment, ready to insert into the chat
+#   json  the structured content itself
+#
+# Text sections are filled in from format strings parsed once at import and
+# joined once each; the HTML fragments are Jinja templates compiled on first
+# use and kept by the environment.
+
+FORMATS = ('text', 'html', 'json')
+
+CONTENT_TYPES = {
+    'text': "text/plain; charset=utf-8",
+    'html': "text/html; charset=utf-8",
+    'json': "application/json",
+}
+
+_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'responses')
+
+_LESSON_PLAN_HEADER = (
+    "📚 LESSON PLAN\n\n"
+    "Title: {title}\n\n"
+    "Duration: {duration}\n"
+    "Grade Level: {grade_level}\n"
+    "Subject: {subject}\n"
+    "Topic: {topic}\n"
+    "Focus: {focus}\n\n"
+)
+_ACTIVITY = "{time} - {activity}:\n  {description}\n\n"
+_ASSESSMENT = "📝 ASSESSMENT:\n{type}:\n{description}\n\n"
+_DIFFERENTIATION = (
+    "🎓 DIFFERENTIATION:\n"
+    "For struggling learners: {for_struggling_learners}\n"
+    "For advanced learners: {for_advanced_learners}\n"
+)
+_HOMEWORK = "\n🏠 HOMEWORK:\n{}\n"
+
+_QUIZ_HEADER = (
+    "📝 QUIZ\n\n"
+    "Title: {title}\n"
+    "Difficulty: {difficulty}\n"
+    "Questions: {question_count}\n"
+    "Instructions: {instructions}\n\n"
+    + "=" * 50 + "\n\n"
+)
+_QUESTION = "QUESTION {number}: {question}\n\n{options}\n✅ ANSWER: {correct_answer}\n{explanation}\n" + "-" * 40 + "\n\n"
+
+_environment = None
+
+
+def lesson_plan_fields(data):
+    """A lesson plan's display fields, with the defaults filled in"""
+    assessment = data.get('assessment')
+    differentiation = data.get('differentiation')
+    return {
+        "title": data.get('title', 'Lesson Plan'),
+        "duration": data.get('duration', '45 minutes'),
+        "grade_level": data.get('grade_level', '10th Grade'),
+        "subject": data.get('subject', 'English Literature'),
+        "topic": data.get('topic', 'His First Flight'),
+        "focus": data.get('focus', 'Character Analysis'),
+        "objectives": list(data.get('learning_objectives', [])),
+        "materials": list(data.get('materials_needed', [])),
+        "activities": [
+            {
+                "time": activity.get('time', 'Time'),
+                "activity": activity.get('activity', 'Activity'),
+                "description": activity.get('description', 'Description'),
+            }
+            for activity in data.get('activities', [])
+        ],
+        "assessment": None if assessment is None else {
+            "type": assessment.get('type', 'Assessment'),
+            "description": assessment.get('description', 'Description'),
+        },
+        "differentiation": None if differentiation is None else {
+            "for_struggling_learners": differentiation.get('for_struggling_learners', 'N/A'),
+            "for_advanced_learners": differentiation.get('for_advanced_learners', 'N/A'),
+        },
+        "homework": data.get('homework'),
+    }
+
+
+def quiz_fields(data):
+    """A quiz's display fields, with the defaults filled in"""
+    return {
+        "title": data.get('title', 'Quiz'),
+        "difficulty": data.get('difficulty', 'Medium'),
+        "question_count": data.get('question_count', 'Multiple'),
+        "instructions": data.get('instructions', 'Select the best answer for each question.'),
+        "questions": [
+            {
+                "question": question.get('question', 'Question'),
+                "options": [(chr(65 + j), option) for j, option in enumerate(question.get('options', []))],
+                "correct_answer": question.get('correct_answer', 'Answer'),
+                "explanation": question.get('explanation'),
+            }
+            for question in data.get('questions', [])
+        ],
+    }
+
+
+def lesson_plan_sections(data):
+    """Yield a lesson plan's display text, one section at a time"""
+    fields = lesson_plan_fields(data)
+    yield _LESSON_PLAN_HEADER.format_map(fields)
+    yield "".join(["🎯 LEARNING OBJECTIVES:\n", *(f"{i}. {obj}\n" for i, obj in enumerate(fields["objectives"], 1)), "\n"])
+    yield "".join(["📦 MATERIALS NEEDED:\n", *(f"• {material}\n" for material in fields["materials"]), "\n"])
+    yield "🕒 ACTIVITIES:\n"
+    for activity in fields["activities"]:
+        yield _ACTIVITY.format_map(activity)
+    if fields["assessment"] is not None:
+        yield _ASSESSMENT.format_map(fields["assessment"])
+    if fields["differentiation"] is not None:
+        yield _DIFFERENTIATION.format_map(fields["differentiation"])
+    if fields["homework"]:
+        yield _HOMEWORK.format(fields["homework"])
+
+
+def quiz_sections(data):
+    """Yield a quiz's display text, one section at a time"""
+    fields = quiz_fields(data)
+    yield _QUIZ_HEADER.format_map(fields)
+    for number, question in enumerate(fields["questions"], 1):
+        yield _QUESTION.format(
+            number=number,
+            question=question["question"],
+            options="".join(f"  {letter}) {option}\n" for letter, option in question["options"]),
+            correct_answer=question["correct_answer"],
+            explanation=f"💡 EXPLANATION: {question['explanation']}\n" if question["explanation"] else "",
+        )
+
+
+def _template(name):
+    global _environment
+    if _environment is None:
+        from jinja2 import Environment, FileSystemLoader
+        _environment = Environment(
+            loader=FileSystemLoader(_TEMPLATE_DIR), autoescape=True, trim_blocks=True, lstrip_blocks=True
+        )
+    return _environment.get_template(name)
+
+
+def precompile():
+    """Compile the HTML templates now rather than on the first request"""
+    for name in ('lesson_plan.html', 'quiz.html'):
+        _template(name)
+
+
+def structured(response_data):
+    """The JSON body of a format=json response"""
+    body = {
+        "task_type": response_data["task_type"],
+        "source": response_data.get("source"),
+        "content": response_data["content"],
+    }
+    if response_data.get("note"):
+        body["note"] = response_data["note"]
+    return body
+
+
+def response_body(response_data, fmt=None, display=None):
+    """(body, content type) of a successful /ask response in one of FORMATS.
+
+    Without a format the body is the original {"response": text} JSON.
+    display is the response's text, if the caller already has it.
+    """
+    with metrics.timer('formatting'):
+        if fmt is None:
+            text = display if display is not None else render(response_data, 'text')
+            return json.dumps({"response": text}, ensure_ascii=False).encode('utf-8'), CONTENT_TYPES['json']
+        return render(response_data, fmt, display).encode('utf-8'), CONTENT_TYPES[fmt]
+
+
+def render(response_data, fmt, display=None):
+    """A successful response rendered in one of FORMATS, as a string"""
+    if fmt == 'json':
+        return json.dumps(structured(response_data), ensure_ascii=False)
+    if fmt == 'html':
+        task_type = response_data["task_type"]
+        content = response_data["content"]
+        if task_type == 'lesson_plan':
+            return _template('lesson_plan.html').render(plan=lesson_plan_fields(content), note=response_data.get("note"))
+        return _template('quiz.html').render(quiz=quiz_fields(content), note=response_data.get("note"))
+    if display is not None:
+        return display
+    parts = [f"📝 {response_data['note']}\n\n"] if response_data.get("note") else []
+    sections = lesson_plan_sections if response_data["task_type"] == 'lesson_plan' else quiz_sections
+    parts.extend(sections(response_data["content"]))
+    return "".join(parts)
@@ -0,0 +1,403 @@
+import json
+import time
+import threading
+import logging
+
+from app.scheduler import BatchQueue
+from app.metrics import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a task has no usable model"""
+
+
+def build_prompt(instruction, prefix="", examples=()):
+    """Format a request exactly like the training samples in train_models.py.
+
+    Training text is "Instruction: ...\\nResponse: {json}<eos>", so the prompt
+    stops right after "Response:" and the model continues with the JSON.
+    Multi-task models also expect their task prefix token first. Optional
+    few-shot (instruction, response) examples are written out the same way.
+    """
+    shots = "".join(f"Instruction: {shot}\nResponse: {response}\n\n" for shot, response in examples)
+    return f"{prefix}{shots}Instruction: {instruction}\nResponse:"
+
+
+def task_prefix(tokenizer, task_type):
+    """The task's prefix token if the tokenizer belongs to a multi-task model"""
+    token = f"<|{task_type}|>"
+    return token if token in tokenizer.all_special_tokens else ""
+
+
+def extract_json_object(text):
+    """Parse the first complete JSON object in generated text, or return None"""
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(text[start:i + 1])
+                except ValueError:
+                    return None
+    return None
+
+
+class _JsonBraceTracker:
+    """Tracks brace depth of every sequence in a batch, one token at a time.
+
+    A sequence is finished once its top-level JSON object has closed, so we can
+    stop decoding there instead of running on to max_new_tokens.
+    """
+
+    def __init__(self, tokenizer, batch_size):
+        self.tokenizer = tokenizer
+        self.token_text = {}
+        self.depth = [0] * batch_size
+        self.started = [False] * batch_size
+        self.in_string = [False] * batch_size
+        self.escaped = [False] * batch_size
+        self.closed = [False] * batch_size
+
+    def _text(self, token_id):
+        text = self.token_text.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id])
+            self.token_text[token_id] = text
+        return text
+
+    def update(self, row, token_id):
+        if self.closed[row]:
+            return True
+        for char in self._text(token_id):
+            if self.in_string[row]:
+                if self.escaped[row]:
+                    self.escaped[row] = False
+                elif char == '\\':
+                    self.escaped[row] = True
+                elif char == '"':
+                    self.in_string[row] = False
+            elif char == '"':
+                self.in_string[row] = True
+            elif char == '{':
+                self.depth[row] += 1
+                self.started[row] = True
+            elif char == '}':
+                self.depth[row] -= 1
+                if self.started[row] and self.depth[row] <= 0:
+                    self.closed[row] = True
+                    break
+        return self.closed[row]
+
+
+def _json_stopping_criteria(tokenizer, batch_size):
+    """Build a StoppingCriteria that ends a sequence when its JSON object closes"""
+    import torch
+    from transformers import StoppingCriteria
+
+    class JsonObjectClosed(StoppingCriteria):
+        def __init__(self):
+            self.tracker = _JsonBraceTracker(tokenizer, batch_size)
+
+        def __call__(self, input_ids, scores, **kwargs):
+            last_tokens = input_ids[:, -1].tolist()
+            done = [self.tracker.update(row, token_id) for row, token_id in enumerate(last_tokens)]
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    return JsonObjectClosed()
+
+
+def _stop_event_criteria(stop):
+    """Build a StoppingCriteria that ends generation once the threading.Event is set"""
+    import torch
+    from transformers import StoppingCriteria
+
+    class StopRequested(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), stop.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return StopRequested()
+
+
+class GenerationEngine:
+    """Batched CPU generation with the fine-tuned task models.
+
+    Concurrent calls to generate() for the same task are micro-batched: the
+    first request waits up to max_wait_ms for others to arrive, then all of
+    them are decoded together in one padded generate() call.
+
+    examples_for(task_type, instruction), if given, returns few-shot
+    (instruction, response) pairs to put in front of each prompt.
+
+    schemas, if given, maps task types to output schemas (see
+    app.constrained); those tasks are decoded one request at a time under
+    the schema, so their output always parses.
+
+    prefix_cache, a PrefixCache, lets single prompts skip the prefill of
+    tokens they share with earlier prompts. Padded batches of several
+    prompts are prefilled in full.
+    """
+
+    def __init__(self, registry, max_batch_size=8, max_wait_ms=10, max_new_tokens=512, examples_for=None, schemas=None,
+                 prefix_cache=None):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_new_tokens = max_new_tokens
+        self.examples_for = examples_for
+        self.schemas = schemas or {}
+        self.prefix_cache = prefix_cache
+        self._batchers = {}
+        self._batchers_lock = threading.Lock()
+        self._token_indexes = {}  # id(tokenizer) -> (tokenizer, TokenIndex)
+        self._token_indexes_lock = threading.Lock()
+
+    def _batcher(self, task_type):
+        batcher = self._batchers.get(task_type)
+        if batcher is None:
+            with self._batchers_lock:
+                batcher = self._batchers.get(task_type)
+                if batcher is None:
+                    batcher = BatchQueue(
+                        f"generation-{task_type}",
+                        lambda instructions: self.generate_batch(task_type, instructions),
+                        max_batch_size=self.max_batch_size,
+                        max_wait_ms=self.max_wait_ms
+                    )
+                    self._batchers[task_type] = batcher
+        return batcher
+
+    def stats(self):
+        return {task_type: batcher.stats() for task_type, batcher in list(self._batchers.items())}
+
+    def generate(self, task_type, instruction, timeout=None):
+        """Generate one response; waits at most `timeout` seconds.
+
+        Returns the parsed JSON object, or None if the output was not valid JSON.
+        Raises concurrent.futures.TimeoutError if the batch did not finish in time.
+        """
+        future = self._batcher(task_type).submit(instruction)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def _prompt(self, model, tokenizer, task_type, instruction):
+        prefix = task_prefix(tokenizer, task_type)
+        examples = list(self.examples_for(task_type, instruction)) if self.examples_for else []
+
+        # Drop examples until the prompt leaves room for a full response
+        max_prompt_tokens = getattr(model.config, 'max_position_embeddings', 1024) - self.max_new_tokens
+        while examples:
+            prompt = build_prompt(instruction, prefix, examples)
+            if len(tokenizer(prompt).input_ids) <= max_prompt_tokens:
+                return prompt
+            examples.pop()
+        return build_prompt(instruction, prefix)
+
+    def _generate_kwargs(self, tokenizer, batch_size):
+        from transformers import StoppingCriteriaList
+
+        return {
+            "max_new_tokens": self.max_new_tokens,
+            "do_sample": False,
+            "use_cache": True,
+            "pad_token_id": tokenizer.pad_token_id,
+            "eos_token_id": tokenizer.eos_token_id,
+            "stopping_criteria": StoppingCriteriaList([_json_stopping_criteria(tokenizer, batch_size)]),
+        }
+
+    def _decoder(self, task_type, model, tokenizer):
+        """A ConstrainedDecoder for the task, or None if it has no schema"""
+        schema = self.schemas.get(task_type)
+        if schema is None:
+            return None
+
+        from app.constrained import ConstrainedDecoder, TokenIndex
+
+        entry = self._token_indexes.get(id(tokenizer))
+        if entry is None or entry[0] is not tokenizer:
+            with self._token_indexes_lock:
+                entry = self._token_indexes.get(id(tokenizer))
+                if entry is None or entry[0] is not tokenizer:
+                    start = time.perf_counter()
+                    vocab_size = max(len(tokenizer), getattr(model.config, 'vocab_size', 0))
+                    entry = (tokenizer, TokenIndex(tokenizer, vocab_size))
+                    self._token_indexes[id(tokenizer)] = entry
+                    logger.info(f"🔤 Indexed {vocab_size} tokens for constrained decoding in {time.perf_counter() - start:.2f}s")
+        prefill = None
+        if self.prefix_cache is not None:
+            prefill = lambda ids: self.prefix_cache.prefill(task_type, model, ids)
+        return ConstrainedDecoder(model, tokenizer, entry[1], schema, self.max_new_tokens, prefill=prefill)
+
+    def _encode(self, model, tokenizer, task_type, prompts):
+        """Model inputs for the prompts, with the cached prefix of a single prompt already run"""
+        if self.prefix_cache is None or len(prompts) != 1:
+            return tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+
+        import torch
+
+        ids = tokenizer(prompts[0]).input_ids
+        input_ids = torch.tensor([ids], device=model.device)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": self.prefix_cache.prefill(task_type, model, ids),
+        }
+
+    def _record_constrained(self, task_type, decoder, elapsed):
+        token_count = decoder.free_tokens + decoder.forced_tokens
+        metrics.observe("eduassist_stage_duration_seconds", elapsed, stage='generation', task_type=task_type)
+        metrics.inc("eduassist_generated_tokens_total", token_count, task_type=task_type)
+        logger.info(
+            f"🧠 Generated {token_count} tokens for a '{task_type}' request in {elapsed:.2f}s: "
+            f"{decoder.free_tokens} decoded, {decoder.forced_tokens} forced by the schema, "
+            f"{decoder.forward_passes} forward passes"
+        )
+
+    def generate_batch(self, task_type, instructions):
+        """Decode a list of instructions for one task in a single generate() call"""
+        with self.registry.lease(task_type) as (model, tokenizer):
+            if model is None:
+                raise ModelUnavailableError(f"No model available for '{task_type}'")
+            return self._generate_batch(task_type, model, tokenizer, instructions)
+
+    def warm(self, task_type, model, tokenizer, instructions):
+        """Run instructions one at a time through a model that isn't serving yet.
+
+        The new model takes its first requests with its kernels warm and the
+        task's prompt prefix cached. Returns how many outputs parsed as JSON.
+        """
+        start = time.perf_counter()
+        parsed = sum(
+            self._generate_batch(task_type, model, tokenizer, [instruction])[0] is not None
+            for instruction in instructions
+        )
+        logger.info(
+            f"🔥 Warmed the new '{task_type}' model with {len(instructions)} prompt(s) in "
+            f"{time.perf_counter() - start:.2f}s; {parsed} produced valid JSON"
+        )
+        return parsed
+
+    def release(self, task_type, model, tokenizer):
+        """Forget what was kept for a model that no longer serves (registry release callback)"""
+        with self._token_indexes_lock:
+            entry = self._token_indexes.get(id(tokenizer))
+            if entry is not None and entry[0] is tokenizer:
+                del self._token_indexes[id(tokenizer)]
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear(task_type, model)
+
+    def _generate_batch(self, task_type, model, tokenizer, instructions):
+        decoder = self._decoder(task_type, model, tokenizer)
+        if decoder is not None:
+            results = []
+            for instruction in instructions:
+                start = time.perf_counter()
+                text = "".join(decoder.decode(self._prompt(model, tokenizer, task_type, instruction)))
+                self._record_constrained(task_type, decoder, time.perf_counter() - start)
+                try:
+                    results.append(json.loads(text))
+                except ValueError:
+                    results.append(extract_json_object(text))
+            return results
+
+        import torch
+
+        prompts = [self._prompt(model, tokenizer, task_type, instruction) for instruction in instructions]
+        start = time.perf_counter()
+        encoding = self._encode(model, tokenizer, task_type, prompts)
+        prompt_length = encoding["input_ids"].shape[1]
+
+        with torch.inference_mode():
+            output_ids = model.generate(**encoding, **self._generate_kwargs(tokenizer, len(prompts)))
+        elapsed = time.perf_counter() - start
+
+        new_tokens = output_ids[:, prompt_length:]
+        token_count = int((new_tokens != tokenizer.pad_token_id).sum())
+        metrics.observe("eduassist_stage_duration_seconds", elapsed, stage='generation', task_type=task_type)
+        metrics.inc("eduassist_generated_tokens_total", token_count, task_type=task_type)
+        logger.info(
+            f"🧠 Generated {token_count} tokens for {len(prompts)} '{task_type}' request(s) "
+            f"in {elapsed:.2f}s ({token_count / max(elapsed, 1e-6):.1f} tokens/s)"
+        )
+
+        texts = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        return [extract_json_object(text) for text in texts]
+
+    def stream(self, task_type, instruction, timeout=None):
+        """Yield generated text for one instruction as it is decoded.
+
+        Generation runs on a background thread; `timeout` bounds the wait for
+        each new piece of text.
+        """
+        with self.registry.lease(task_type) as (model, tokenizer):
+            if model is None:
+                raise ModelUnavailableError(f"No model available for '{task_type}'")
+            yield from self._stream(task_type, model, tokenizer, instruction, timeout)
+
+    def _stream(self, task_type, model, tokenizer, instruction, timeout):
+        decoder = self._decoder(task_type, model, tokenizer)
+        if decoder is not None:
+            start = time.perf_counter()
+            yield from decoder.decode(self._prompt(model, tokenizer, task_type, instruction))
+            self._record_constrained(task_type, decoder, time.perf_counter() - start)
+            return
+
+        import torch
+        from transformers import TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        prompt = self._prompt(model, tokenizer, task_type, instruction)
+        stop = threading.Event()
+        generate_kwargs = self._generate_kwargs(tokenizer, 1)
+        generate_kwargs["stopping_criteria"].append(_stop_event_criteria(stop))
+
+        def run():
+            try:
+                start = time.perf_counter()
+                encoding = self._encode(model, tokenizer, task_type, [prompt])
+                with torch.inference_mode():
+                    output_ids = model.generate(**encoding, streamer=streamer, **generate_kwargs)
+                metrics.observe(
+                    "eduassist_stage_duration_seconds", time.perf_counter() - start, stage='generation', task_type=task_type
+                )
+                metrics.inc("eduassist_generated_tokens_total", output_ids.shape[1] - encoding["input_ids"].shape[1], task_type=task_type)
+            except Exception as e:
+                logger.error(f"❌ Streaming generation failed for '{task_type}': {e}")
+                streamer.end()
+
+        thread = threading.Thread(target=run, name=f"stream-{task_type}", daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            # Closed early (the client went away) or timed out: stop decoding, and
+            # keep the lease on the model until generate() has returned
+            stop.set()
+            thread.join()
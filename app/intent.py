@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+
+# Intent and parameter extraction for a request, in one regex pass.
+#
+# One precompiled regex finds every keyword, difficulty, focus and
+# "<number> questions" / "<number> minutes" phrase in the request, and each
+# match is looked up in a table. Keywords only match whole words (with plural
+# endings): "planet" no longer counts as a lesson plan, "classic" no longer
+# counts as a class and "medium-difficulty" no longer means hard. Scoring is
+# otherwise the same as before: each keyword counts once however often it
+# appears, "lesson plan" counts as "lesson plan", "lesson" and "plan", and
+# "questions" counts as "questions" and "question".
+
+LESSON_PLAN_KEYWORDS = frozenset(['lesson plan', 'lesson', 'plan', 'teaching', 'class', 'duration', 'minute'])
+QUIZ_KEYWORDS = frozenset(['quiz', 'test', 'questions', 'assessment', 'exam', 'question'])
+
+DEFAULT_PARAMETERS = {
+    'duration': "45 minutes",
+    'difficulty': 'medium',
+    'question_count': 5,
+    'focus': 'character analysis',
+}
+
+_REQUEST_RE = re.compile(
+    r"\b(?:"
+    r"(\d+)\s*-?\s*(?:mcqs?\s+)?(questions?|min(?:ute)?s?)"
+    r"|(lessons?(?:\s+plans?)?|plans?|teaching|class(?:es)?|durations?|minutes?|quiz(?:zes)?|tests?"
+    r"|questions?|assessments?|exams?|easy|hard|difficult|characters?|themes?|thematic|comprehension"
+    r"|his\s+first\s+flight)"
+    r")\b"
+)
+
+# Matched word -> (kind, value)
+_WORDS = {}
+for _base in ['lesson', 'plan', 'teaching', 'class', 'duration', 'minute', 'quiz', 'test', 'question', 'assessment', 'exam']:
+    for _suffix in ('', 's', 'es', 'zes'):
+        _WORDS[_base + _suffix] = ('keywords', (_base,))
+_WORDS['questions'] = ('keywords', ('question', 'questions'))
+for _lesson in ('lesson', 'lessons'):
+    for _plan in ('plan', 'plans'):
+        _WORDS[f"{_lesson} {_plan}"] = ('keywords', ('lesson plan', 'lesson', 'plan'))
+_WORDS.update({
+    'easy': ('difficulty', 'easy'),
+    'hard': ('difficulty', 'hard'),
+    'difficult': ('difficulty', 'hard'),
+    # When several focuses are mentioned, the lowest priority wins
+    'character': ('focus', (0, 'character analysis')),
+    'characters': ('focus', (0, 'character analysis')),
+    'theme': ('focus', (1, 'theme analysis')),
+    'themes': ('focus', (1, 'theme analysis')),
+    'thematic': ('focus', (1, 'theme analysis')),
+    'comprehension': ('focus', (2, 'reading comprehension')),
+    'his first flight': ('book', True),
+})
+
+
+@lru_cache(maxsize=4096)
+def _analyze(user_input):
+    keywords = set()
+    minutes = count = None
+    book = easy = hard = False
+    focus = None  # (priority, focus)
+
+    for number, unit, word in _REQUEST_RE.findall(user_input.lower()):
+        if number:
+            if unit.startswith('question'):
+                keywords.update(_WORDS[unit][1])
+                if count is None:
+                    count = int(number)
+            else:
+                if unit.startswith('minute'):
+                    keywords.add('minute')
+                if minutes is None:
+                    minutes = int(number)
+            continue
+
+        kind, value = _WORDS.get(word) or _WORDS[" ".join(word.split())]
+        if kind == 'keywords':
+            keywords.update(value)
+        elif kind == 'difficulty':
+            if value == 'easy':
+                easy = True
+            else:
+                hard = True
+        elif kind == 'focus':
+            focus = min(focus or value, value)
+        else:
+            book = True
+
+    lesson_score = len(keywords & LESSON_PLAN_KEYWORDS)
+    quiz_score = len(keywords & QUIZ_KEYWORDS)
+    if lesson_score > quiz_score or (book and lesson_score == quiz_score):
+        intent = 'lesson_plan'
+    elif quiz_score > lesson_score:
+        intent = 'quiz'
+    else:
+        intent = 'ambiguous'
+
+    return {
+        'intent': intent,
+        'lesson_score': lesson_score,
+        'quiz_score': quiz_score,
+        'duration': f"{minutes} minutes" if minutes is not None else DEFAULT_PARAMETERS['duration'],
+        'difficulty': 'easy' if easy else 'hard' if hard else DEFAULT_PARAMETERS['difficulty'],
+        'question_count': count if count is not None else DEFAULT_PARAMETERS['question_count'],
+        'focus': focus[1] if focus else DEFAULT_PARAMETERS['focus'],
+    }
+
+
+def analyze_request(user_input):
+    """Return the intent, keyword scores and parameters of a request.
+
+    Results are memoized, since the same request is analyzed several times on
+    its way through the app; callers get their own copy.
+    """
+    return dict(_analyze(user_input))
+
+
+def detect_intent(user_input):
+    """'lesson_plan', 'quiz' or 'ambiguous'"""
+    return _analyze(user_input)['intent']
+
+
+def extract_parameters(user_input):
+    """duration, difficulty, question_count and focus, with defaults for anything not mentioned"""
+    analysis = _analyze(user_input)
+    return {name: analysis[name] for name in DEFAULT_PARAMETERS}
+
+
+def request_text(item):
+    """The request text for a bulk item: a request string, a dict with a
+    'message' or 'question', or a parameter set such as
+    {"task_type": "quiz", "difficulty": "hard", "question_count": 10}.
+
+    Parameter sets are written out as a request that analyze_request reads
+    back to the same parameters. Raises ValueError for anything else.
+    """
+    if isinstance(item, str):
+        text = item
+    elif not isinstance(item, dict):
+        raise ValueError("Each request must be a string or an object")
+    elif item.get('message') or item.get('question'):
+        text = str(item.get('message') or item.get('question'))
+    else:
+        task_type = item.get('task_type')
+        topic = f" about {item['topic']}" if item.get('topic') else ""
+        if task_type == 'quiz':
+            difficulty = item.get('difficulty', DEFAULT_PARAMETERS['difficulty'])
+            if difficulty not in ('easy', 'medium', 'hard'):
+                raise ValueError(f"Unknown difficulty '{difficulty}'")
+            count = int(item.get('question_count', DEFAULT_PARAMETERS['question_count']))
+            text = f"Create a {count} question {difficulty} quiz on His First Flight{topic}"
+        elif task_type == 'lesson_plan':
+            duration = item.get('duration', DEFAULT_PARAMETERS['duration'])
+            match = re.match(r'\s*(\d+)(?!\S)', str(duration))
+            if isinstance(duration, bool) or not match:
+                raise ValueError(f"Unknown duration '{duration}'")
+            minutes = int(match.group(1))
+            focus = item.get('focus', DEFAULT_PARAMETERS['focus'])
+            if focus not in ('character analysis', 'theme analysis', 'reading comprehension'):
+                raise ValueError(f"Unknown focus '{focus}'")
+            text = f"Create a {minutes} minute lesson plan on His First Flight focusing on {focus}{topic}"
+        else:
+            raise ValueError("A parameter set needs a task_type of 'lesson_plan' or 'quiz'")
+
+    text = text.strip()
+    if not text:
+        raise ValueError("Empty request")
+    return text
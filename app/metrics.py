@@ -0,0 +1,159 @@
+import time
+import threading
+
+from app import config
+
+# Request counters, stage latency histograms and scrape-time gauges, rendered
+# in the Prometheus text exposition format by /metrics. When metrics are
+# disabled every timer is one shared no-op object and inc()/observe() return
+# straight away, so the instrumentation can stay in the hot path.
+
+# Seconds; spans the microsecond cache hits up to slow CPU generation
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "eduassist_requests_total": ("counter", "Requests handled, by endpoint, task type and HTTP status"),
+    "eduassist_stage_duration_seconds": ("histogram", "Time spent in each stage of a request"),
+    "eduassist_generated_tokens_total": ("counter", "Tokens generated by the task models"),
+}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _NullTimer:
+    """Stand-in for _Timer when metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'labels', 'start')
+
+    def __init__(self, metrics, labels):
+        self.metrics = metrics
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe("eduassist_stage_duration_seconds", time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """In-process metrics registry.
+
+    Collectors registered with add_collector() are called at scrape time and
+    return (name, type, help, labels, value) tuples for values that are
+    cheaper to read when asked for than to track, such as queue depths.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def timer(self, stage, **labels):
+        """Context manager that records the time spent in a stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        labels["stage"] = stage
+        return _Timer(self, labels)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        families = {}  # name -> (type, help, [lines])
+
+        def family(name, metric_type=None, help_text=None):
+            if name not in families:
+                default_type, default_help = METRIC_HELP.get(name, ("untyped", ""))
+                families[name] = (metric_type or default_type, help_text or default_help, [])
+            return families[name][2]
+
+        with self._lock:
+            counters = list(self.counters.items())
+            histograms = [(key, list(values)) for key, values in self.histograms.items()]
+
+        for (name, labels), value in sorted(counters):
+            family(name).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), values in sorted(histograms):
+            lines = family(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+
+        for collector in self.collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                family(name, metric_type, help_text).append(
+                    f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}"
+                )
+
+        output = []
+        for name, (metric_type, help_text, lines) in families.items():
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+metrics = Metrics(enabled=config.METRICS_ENABLED)
@@ -0,0 +1,422 @@
+import gc
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Loads each task's model on demand, the first time the task is requested.
+
+    torch and transformers are only imported when a model is actually loaded,
+    so a worker that never serves a model pays neither the import cost nor
+    the memory for the weights.
+
+    Models are versioned. manifest_path names a JSON file mapping task types
+    to {"path": ..., "version": ...} (paths relative to the manifest); tasks
+    it doesn't list use their model_paths entry, versioned by the newest
+    modification time in the directory. check_for_updates() -- or watch(),
+    on a thread -- loads a new version while the current one keeps serving
+    and swaps it in. Generation holds a lease() on the model it uses, and a
+    replaced model is released when its last lease ends.
+    """
+
+    def __init__(self, model_paths, quantize=False, compile=False, num_threads=0, manifest_path=None):
+        self.model_paths = dict(model_paths)
+        self.quantize = quantize
+        self.compile = compile
+        self.num_threads = num_threads
+        self.manifest_path = manifest_path
+        self.models = {}
+        self.tokenizers = {}
+        self.versions = {}
+        self.load_times = {}
+        self.optimizations = {}
+        self.errors = {}
+        self.swaps = 0
+        self.update_errors = {}  # task type -> (version, error) of a version that was not swapped in
+        self.retired = {}  # id(model) -> (task type, version, model, tokenizer), waiting for its leases to end
+        self.release_callbacks = []  # called with (task type, model, tokenizer) when a model is released
+        self._leases = {}  # id(model) -> requests using it
+        self._leases_lock = threading.Lock()
+        self._candidates = {}  # task type -> version seen on the previous check
+        self._resolved = {}  # task type -> (path, version), refreshed by pending_updates()
+        self._watch_stop = None
+        self._locks = {task_type: threading.Lock() for task_type in self.model_paths}
+
+    def _manifest(self):
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable model manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _resolve(self, task_type, manifest):
+        entry = manifest.get(task_type)
+        if entry:
+            path = os.path.join(os.path.dirname(self.manifest_path), entry["path"])
+            return path, str(entry.get("version", path)) if os.path.exists(path) else None
+        path = self.model_paths.get(task_type)
+        return path, _directory_version(path)
+
+    def refresh(self):
+        """Re-read the manifest and model directories behind resolve(); returns the manifest"""
+        manifest = self._manifest()
+        self._resolved = {task_type: self._resolve(task_type, manifest) for task_type in self.model_paths}
+        return manifest
+
+    def resolve(self, task_type):
+        """(path, version) of the newest model for a task; version is None when there is no model.
+
+        Looked up once and then only on refresh(), so requests don't touch the
+        filesystem; the watcher refreshes on every check.
+        """
+        resolved = self._resolved.get(task_type)
+        if resolved is None:
+            resolved = self._resolved[task_type] = self._resolve(task_type, self._manifest())
+        return resolved
+
+    def is_available(self, task_type):
+        """True if a model for this task exists on disk (loaded or not)"""
+        if task_type in self.models:
+            return True
+        return task_type in self.model_paths and self.resolve(task_type)[1] is not None
+
+    def version(self, task_type):
+        """The version serving a task, or else the one a request would load; None without a model"""
+        if task_type in self.versions:
+            return self.versions[task_type]
+        return self.resolve(task_type)[1] if task_type in self.model_paths else None
+
+    def is_loaded(self, task_type):
+        return task_type in self.models
+
+    def get(self, task_type):
+        """Return (model, tokenizer) for a task, loading it on first use.
+
+        Returns (None, None) when the task has no model or it failed to load.
+        """
+        if task_type in self.models:
+            return self.models[task_type], self.tokenizers[task_type]
+
+        if task_type not in self._locks or task_type in self.errors:
+            return None, None
+
+        with self._locks[task_type]:
+            # Another thread may have finished loading while we waited
+            if task_type not in self.models and task_type not in self.errors:
+                self._load(task_type)
+
+        return self.models.get(task_type), self.tokenizers.get(task_type)
+
+    @contextmanager
+    def lease(self, task_type):
+        """get() for the duration of a request: a model swapped out meanwhile is
+        only released once every lease on it has ended"""
+        model, tokenizer = self.get(task_type)
+        if model is None:
+            yield None, None
+            return
+
+        key = id(model)
+        with self._leases_lock:
+            self._leases[key] = self._leases.get(key, 0) + 1
+        try:
+            yield model, tokenizer
+        finally:
+            with self._leases_lock:
+                self._leases[key] -= 1
+                released = None
+                if not self._leases[key]:
+                    del self._leases[key]
+                    released = self.retired.pop(key, None)
+            if released is not None:
+                self._release(*released)
+                model = tokenizer = released = None
+                _free_memory()
+
+    def _load(self, task_type):
+        model_path, version = self.resolve(task_type)
+        if version is None:
+            logger.warning(f"⚠️ Model path {model_path} does not exist")
+            self.errors[task_type] = f"Model path {model_path} does not exist"
+            return
+
+        # A multi-task model serves several tasks from one path; load it once
+        for other_task in self.models:
+            if self.model_paths[other_task] == model_path and self.versions.get(other_task) == version:
+                logger.info(f"Sharing the '{other_task}' model with '{task_type}' ({model_path})")
+                self.tokenizers[task_type] = self.tokenizers[other_task]
+                self.models[task_type] = self.models[other_task]
+                self.optimizations[task_type] = self.optimizations.get(other_task, {})
+                self.load_times[task_type] = 0.0
+                self.versions[task_type] = version
+                self.model_paths[task_type] = model_path
+                return
+
+        logger.info(f"Loading model for '{task_type}' from {model_path} (version {version})...")
+        start = time.perf_counter()
+        try:
+            model, tokenizer, report = self._load_model(model_path)
+        except Exception as e:
+            logger.error(f"❌ Failed to load {task_type} model: {e}")
+            self.errors[task_type] = str(e)
+            return
+
+        if report is not None:
+            self.optimizations[task_type] = report
+        self.tokenizers[task_type] = tokenizer
+        self.models[task_type] = model
+        self.versions[task_type] = version
+        self.model_paths[task_type] = model_path
+        self.load_times[task_type] = time.perf_counter() - start
+        logger.info(f"✅ Model '{task_type}' loaded successfully in {self.load_times[task_type]:.2f}s.")
+
+    def _load_model(self, model_path):
+        """(model, tokenizer, CPU optimization report) for the model at model_path"""
+        # Heavy imports are deferred until a model is really needed
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models need left padding for batched generation
+        tokenizer.padding_side = "left"
+
+        def load_fp32_model():
+            model = AutoModelForCausalLM.from_pretrained(model_path)
+            model.eval()
+            return model
+
+        # Check if CUDA is available
+        if torch.cuda.is_available():
+            logger.info(f"Using device: cuda")
+            return load_fp32_model().cuda(), tokenizer, None
+
+        from app.cpu_inference import prepare_for_cpu
+        model, report = prepare_for_cpu(
+            model_path,
+            load_fp32_model,
+            quantize=self.quantize,
+            compile=self.compile
+        )
+        return model, tokenizer, report
+
+    def warmup(self, task_types=None):
+        """Load the given tasks (all tasks by default) and return their status.
+
+        A warm-up also retries tasks whose previous load attempt failed.
+        """
+        if task_types is None:
+            task_types = list(self.model_paths)
+
+        for task_type in task_types:
+            if task_type in self.model_paths:
+                self.errors.pop(task_type, None)
+                self.get(task_type)
+
+        return {task_type: self.task_status(task_type) for task_type in task_types}
+
+    def preload_in_background(self, task_types):
+        """Start loading the given tasks on a daemon thread"""
+        thread = threading.Thread(
+            target=self.warmup,
+            args=(list(task_types),),
+            name="model-preload",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def freeze(self):
+        """Put every loaded model in eval mode with gradients off, for serving
+        from forked workers. Returns the size of the weights in bytes."""
+        total = 0
+        seen = set()
+        for model in self.models.values():
+            if id(model) in seen:
+                continue
+            seen.add(id(model))
+            model.eval()
+            for tensor in list(model.parameters()) + list(model.buffers()):
+                tensor.requires_grad_(False)
+                total += tensor.numel() * tensor.element_size()
+        return total
+
+    def reset(self):
+        """Forget all loaded models so that the next request or warm-up loads them again"""
+        self._resolved = {}
+        for task_type in self.model_paths:
+            with self._locks[task_type]:
+                self.models.pop(task_type, None)
+                self.tokenizers.pop(task_type, None)
+                self.versions.pop(task_type, None)
+                self.load_times.pop(task_type, None)
+                self.optimizations.pop(task_type, None)
+                self.errors.pop(task_type, None)
+
+    def pending_updates(self):
+        """{task type: (path, version)} for loaded tasks with a newer version ready on disk.
+
+        A version found by scanning a model directory is only reported once
+        two checks in a row agree on it, so a model that is still being
+        written is not picked up halfway.
+        """
+        pending = {}
+        manifest = self.refresh()
+        for task_type in list(self.models):
+            path, version = self.resolve(task_type)
+            if version is None or version == self.versions.get(task_type):
+                self._candidates.pop(task_type, None)
+                continue
+            if version == self.update_errors.get(task_type, (None,))[0]:
+                continue  # already tried and rejected
+            if task_type not in manifest and self._candidates.get(task_type) != version:
+                self._candidates[task_type] = version
+                continue
+            pending[task_type] = (path, version)
+        return pending
+
+    def check_for_updates(self, warm=None):
+        """Load, warm and swap in every pending update; returns the task types that changed.
+
+        The new version is loaded while the current one keeps serving.
+        warm(task_type, model, tokenizer), if given, runs before the swap;
+        if it raises, the version is rejected and the current one stays.
+        """
+        swapped = []
+        loaded = {}  # (path, version) -> (model, tokenizer, report, seconds), for tasks sharing a model
+        for task_type, (path, version) in self.pending_updates().items():
+            if (path, version) not in loaded:
+                logger.info(f"🔄 Loading version {version} of the '{task_type}' model from {path}...")
+                start = time.perf_counter()
+                try:
+                    model, tokenizer, report = self._load_model(path)
+                    if warm is not None:
+                        warm(task_type, model, tokenizer)
+                except Exception as e:
+                    logger.error(f"❌ Version {version} of the '{task_type}' model was not swapped in: {e}")
+                    self.update_errors[task_type] = (version, str(e))
+                    continue
+                loaded[(path, version)] = (model, tokenizer, report, time.perf_counter() - start)
+            self.swap(task_type, path, version, *loaded[(path, version)])
+            swapped.append(task_type)
+        return swapped
+
+    def swap(self, task_type, path, version, model, tokenizer, report=None, load_seconds=0.0):
+        """Serve the task from a new model; the old one is released when its leases end"""
+        with self._locks[task_type]:
+            old_model = self.models.get(task_type)
+            old_tokenizer = self.tokenizers.get(task_type)
+            old_version = self.versions.get(task_type)
+            self.tokenizers[task_type] = tokenizer
+            self.models[task_type] = model
+            self.versions[task_type] = version
+            self.model_paths[task_type] = path
+            self.load_times[task_type] = load_seconds
+            self.optimizations[task_type] = report
+            self.errors.pop(task_type, None)
+            self.update_errors.pop(task_type, None)
+            self.swaps += 1
+        logger.info(f"✅ Swapped the '{task_type}' model from version {old_version} to {version}")
+
+        if old_model is None or any(other is old_model for other in self.models.values()):
+            return
+        with self._leases_lock:
+            if self._leases.get(id(old_model)):
+                self.retired[id(old_model)] = (task_type, old_version, old_model, old_tokenizer)
+                logger.info(f"⏳ Version {old_version} of the '{task_type}' model is released once "
+                            f"{self._leases[id(old_model)]} in-flight request(s) finish")
+                return
+        self._release(task_type, old_version, old_model, old_tokenizer)
+        del old_model, old_tokenizer
+        _free_memory()
+
+    def _release(self, task_type, version, model, tokenizer):
+        for callback in self.release_callbacks:
+            try:
+                callback(task_type, model, tokenizer)
+            except Exception as e:
+                logger.warning(f"⚠️ Release callback failed for the '{task_type}' model: {e}")
+        logger.info(f"🧹 Released version {version} of the '{task_type}' model")
+
+    def watch(self, interval, warm=None):
+        """Call check_for_updates every `interval` seconds on a daemon thread"""
+        self._watch_stop = stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.check_for_updates(warm)
+                except Exception as e:
+                    logger.error(f"❌ Model update check failed: {e}")
+
+        thread = threading.Thread(target=run, name="model-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+    def readiness(self, task_type):
+        """'ready', 'loading', 'not_loaded' (loads on first use), 'missing' or 'failed'"""
+        if task_type in self.models:
+            return "ready"
+        if task_type in self.errors:
+            return "failed"
+        if not self.is_available(task_type):
+            return "missing"
+        if self._locks[task_type].locked():
+            return "loading"
+        return "not_loaded"
+
+    def task_status(self, task_type):
+        if task_type not in self.model_paths:
+            return {"known": False}
+        return {
+            "known": True,
+            "state": self.readiness(task_type),
+            "path": self.model_paths[task_type],
+            "version": self.versions.get(task_type),
+            "available": self.is_available(task_type),
+            "loaded": self.is_loaded(task_type),
+            "load_seconds": self.load_times.get(task_type),
+            "optimizations": self.optimizations.get(task_type),
+            "error": self.errors.get(task_type),
+        }
+
+    def status(self):
+        return {task_type: self.task_status(task_type) for task_type in self.model_paths}
+
+
+def _free_memory():
+    """Collect the released model's reference cycles and hand cached GPU memory back"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _directory_version(path):
+    """Version of a model directory: the newest modification time of its files, or None if it doesn't exist"""
+    if not path or not os.path.isdir(path):
+        return None
+    mtimes = [entry.stat().st_mtime for entry in os.scandir(path) if entry.is_file()]
+    if not mtimes:
+        return None
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime(max(mtimes)))
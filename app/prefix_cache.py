@@ -0,0 +1,149 @@
+import os
+import copy
+import threading
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def cache_bytes(past_key_values):
+    """Memory held by the key and value tensors of a transformers cache"""
+    total = 0
+    for layer in getattr(past_key_values, 'layers', ()):
+        for tensor in (getattr(layer, 'keys', None), getattr(layer, 'values', None)):
+            if tensor is not None and hasattr(tensor, 'numel'):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class PrefixCache:
+    """Past key/values of recent prompts, reused for prompts that start the same way.
+
+    Every prompt starts with the same "Instruction:" scaffold and mostly the
+    same request text, so the keys and values of its leading tokens are
+    usually already known. prefill() finds the cached prompt sharing the
+    longest token prefix with the new one, copies its cache cropped to that
+    prefix, runs the model over the remaining tokens only, and stores the
+    result for later prompts. Entries are kept per task model and evicted
+    least recently used first once they hold more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, min_prefix_tokens=4):
+        self.max_bytes = max_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self.entries = OrderedDict()  # (task_type, prompt token ids) -> (model id, past_key_values, bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self.prefilled_tokens = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _longest_prefix(self, task_type, model, ids):
+        """The cached entry sharing the most leading tokens with ids, and that count"""
+        best_key, best_length = None, 0
+        with self._lock:
+            for key, (model_id, _, _) in self.entries.items():
+                if key[0] != task_type or model_id != id(model):
+                    continue
+                cached = key[1]
+                length = 0
+                limit = min(len(cached), len(ids))
+                while length < limit and cached[length] == ids[length]:
+                    length += 1
+                if length > best_length:
+                    best_key, best_length = key, length
+            if best_key is None or best_length < self.min_prefix_tokens:
+                return None, 0
+            self.entries.move_to_end(best_key)
+            return self.entries[best_key][1], best_length
+
+    def prefill(self, task_type, model, ids):
+        """Run the model over all but the last prompt token, reusing a cached prefix.
+
+        Returns the past key/values of ids[:-1], ready for model.generate()
+        or a manual decoding loop to continue from the last token. The
+        returned cache belongs to the caller.
+        """
+        import torch
+
+        ids = tuple(ids)
+        needed = len(ids) - 1
+        past, reused = self._longest_prefix(task_type, model, ids)
+        reused = min(reused, needed)
+        if past is not None:
+            past = copy.deepcopy(past)
+            extra = past.get_seq_length() - reused
+            if extra > 0:
+                past.crop(-extra)
+        else:
+            from transformers import DynamicCache
+            past = DynamicCache()
+
+        if reused < needed:
+            with torch.inference_mode():
+                output = model(
+                    input_ids=torch.tensor([ids[reused:needed]], device=model.device),
+                    past_key_values=past,
+                    use_cache=True
+                )
+            past = output.past_key_values
+
+        with self._lock:
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.reused_tokens += reused
+            self.prefilled_tokens += needed - reused
+
+        if reused < needed:
+            self._store(task_type, model, ids[:needed], past)
+        return past
+
+    def _store(self, task_type, model, ids, past):
+        size = cache_bytes(past)
+        if size > self.max_bytes:
+            return
+        entry = copy.deepcopy(past)
+        with self._lock:
+            key = (task_type, ids)
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[2]
+            self.entries[key] = (id(model), entry, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self, task_type=None, model=None):
+        """Drop the entries of one task and/or one model (all entries by default)"""
+        with self._lock:
+            for key, (model_id, _, _) in list(self.entries.items()):
+                if task_type in (None, key[0]) and (model is None or model_id == id(model)):
+                    self.bytes -= self.entries.pop(key)[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "prefilled_tokens": self.prefilled_tokens,
+            }
@@ -0,0 +1,239 @@
+import gc
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+from app import formatting
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _PooledWSGIServer(BaseWSGIServer):
+    """werkzeug server that handles requests on a fixed-size thread pool"""
+
+    def __init__(self, host, port, app, threads, fd):
+        super().__init__(host, port, app, fd=fd)
+        # Created after BaseWSGIServer.__init__, which calls server_close() when given an fd
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="request")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        if hasattr(self, "pool"):
+            self.pool.shutdown(wait=True)
+        super().server_close()
+
+
+class PreforkServer:
+    """Loads the models once in a master process, then forks workers that share them.
+
+    The master loads every model, freezes the weights and moves everything
+    that exists at that point out of the garbage collector's reach
+    (gc.freeze), so the workers' weight pages stay shared copy-on-write
+    instead of each worker holding its own copy. All workers accept
+    connections on one listening socket and serve requests on `threads`
+    threads each.
+
+    SIGHUP reloads: the master reloads the models, starts a new set of
+    workers and then lets the old ones finish their requests and exit.
+    With a watch_interval the master also checks the model registry for new
+    versions that often and reloads the same way when it finds one.
+    SIGTERM/SIGINT stop all workers gracefully. Workers that die are replaced.
+    """
+
+    def __init__(self, app, teacher_ai, host="0.0.0.0", port=5000, workers=2, threads=8, torch_threads=0,
+                 watch_interval=0):
+        self.app = app
+        self.teacher_ai = teacher_ai
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.torch_threads = torch_threads
+        self.watch_interval = watch_interval
+        self.worker_pids = {}  # pid -> start time
+        self.socket = None
+        self._reload = False
+        self._stopping = False
+
+    def _load_models(self):
+        registry = self.teacher_ai.registry
+
+        # The master must not start OpenMP threads: a child forked after the
+        # parent used them can hang on its first parallel op. Workers set
+        # their own count after the fork, torch's default unless one is given
+        if not self.torch_threads and any(registry.is_available(task_type) for task_type in registry.model_paths):
+            import torch
+            self.torch_threads = torch.get_num_threads()
+        registry.num_threads = 1
+
+        # Let a background preload started at import time finish first, so
+        # that no thread is running when we fork; the master checks for new
+        # model versions itself
+        registry.stop_watching()
+        for thread in threading.enumerate():
+            if thread.name in ("model-preload", "model-watcher"):
+                thread.join()
+
+        start = time.perf_counter()
+        status = self.teacher_ai.warmup()
+        if self.teacher_ai.corpus is not None:
+            self.teacher_ai.corpus.build()
+        self.teacher_ai.question_bank.build()
+        formatting.precompile()
+        weight_bytes = registry.freeze()
+        logger.info(
+            f"📦 Master loaded {', '.join(t for t, s in status.items() if s['loaded']) or 'no models'} "
+            f"({weight_bytes / 1e6:.1f}MB of weights) in {time.perf_counter() - start:.2f}s"
+        )
+
+        gc.collect()
+        gc.freeze()
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.worker_pids[pid] = time.monotonic()
+            return pid
+
+        # Worker process
+        exit_code = 0
+        try:
+            self._run_worker()
+        except Exception as e:
+            logger.error(f"❌ Worker {os.getpid()} failed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _run_worker(self):
+        for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        if self.torch_threads and "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(self.torch_threads)
+
+        server = _PooledWSGIServer(self.host, self.port, self.app, self.threads, fd=self.socket.fileno())
+
+        def stop(signum, frame):
+            # shutdown() waits for serve_forever to return, so it can't run on this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        logger.info(f"👷 Worker {os.getpid()} serving with {self.threads} threads")
+        server.serve_forever()
+        server.server_close()  # waits for in-flight requests
+
+    def _stop_workers(self, pids, timeout=30):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+                    self.worker_pids.pop(pid, None)
+            time.sleep(0.1)
+        for pid in remaining:
+            logger.warning(f"⚠️ Worker {pid} did not stop in {timeout}s, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.worker_pids.pop(pid, None)
+
+    def _reap_workers(self):
+        """Collect exited workers; returns how many exited and whether any died right after starting"""
+        exited = 0
+        crashed = False
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            if pid in self.worker_pids:
+                started = self.worker_pids.pop(pid)
+                exited += 1
+                crashed = crashed or time.monotonic() - started < 5
+                logger.warning(f"⚠️ Worker {pid} exited with status {status}")
+        return exited, crashed
+
+    def _reload_models(self):
+        logger.info("🔄 Reloading models and workers...")
+        old_pids = list(self.worker_pids)
+        gc.unfreeze()
+        self.teacher_ai.registry.reset()
+        if self.teacher_ai.engine.prefix_cache is not None:
+            self.teacher_ai.engine.prefix_cache.clear()
+        self._load_models()
+        for _ in range(self.workers):
+            self._spawn_worker()
+        self._stop_workers(old_pids)
+        logger.info("✅ Reload complete")
+
+    def serve_forever(self):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The pre-fork server needs os.fork(); use the development server on this platform")
+
+        self.socket = socket.create_server((self.host, self.port), reuse_port=False, backlog=1024)
+        self.socket.set_inheritable(True)
+        self._load_models()
+
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "_reload", True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "_stopping", True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, "_stopping", True))
+
+        for _ in range(self.workers):
+            self._spawn_worker()
+        logger.info(f"🚀 Master {os.getpid()} serving http://{self.host}:{self.port} with {self.workers} workers")
+
+        next_check = time.monotonic() + self.watch_interval
+        try:
+            while not self._stopping:
+                time.sleep(0.5)
+                if self.watch_interval and time.monotonic() >= next_check:
+                    next_check = time.monotonic() + self.watch_interval
+                    pending = self.teacher_ai.registry.pending_updates()
+                    if pending:
+                        logger.info(f"🆕 New model versions: {', '.join(f'{t} {v}' for t, (_, v) in pending.items())}")
+                        self._reload = True
+                if self._reload:
+                    self._reload = False
+                    self._reload_models()
+                    continue
+                exited, crashed = self._reap_workers()
+                if crashed:
+                    # Don't spin when workers fail on startup
+                    time.sleep(5)
+                for _ in range(exited):
+                    if not self._stopping:
+                        self._spawn_worker()
+        finally:
+            logger.info("🛑 Stopping workers...")
+            self._stop_workers(list(self.worker_pids))
+            self.socket.close()
@@ -0,0 +1,186 @@
+import json
+import random
+import threading
+import logging
+from array import array
+from itertools import zip_longest
+
+from app.retrieval import _dataset_samples
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+# Where to top up a quiz when the requested difficulty runs out of questions
+_FALLBACK_ORDER = {
+    'easy': ('easy', 'medium', 'hard'),
+    'medium': ('medium', 'easy', 'hard'),
+    'hard': ('hard', 'medium', 'easy'),
+}
+
+# Used when the data files can't be read
+BUILTIN_QUESTIONS = [
+    {
+        "question": "Why was the young seagull afraid to fly?",
+        "options": [
+            "He had injured wings",
+            "He lacked confidence and was scared of failing",
+            "Other seagulls bullied him",
+            "The weather was too stormy"
+        ],
+        "correct_answer": "He lacked confidence and was scared of failing",
+        "explanation": "The story emphasizes the seagull's fear and lack of confidence rather than physical limitations."
+    },
+    {
+        "question": "What finally motivated the young seagull to fly?",
+        "options": [
+            "His parents forced him to fly",
+            "He saw his family eating and became very hungry",
+            "Another bird showed him how to fly",
+            "A storm forced him to leave the ledge"
+        ],
+        "correct_answer": "He saw his family eating and became very hungry",
+        "explanation": "Hunger was the primary motivation that overcame his fear."
+    },
+    {
+        "question": "How did the young seagull feel after his first successful flight?",
+        "options": [
+            "Still afraid and uncertain",
+            "Exhausted and tired",
+            "Proud, happy, and confident",
+            "Angry at his family for leaving him"
+        ],
+        "correct_answer": "Proud, happy, and confident",
+        "explanation": "The story describes his joy and newfound confidence after successfully flying."
+    },
+    {
+        "question": "What is the main theme of 'His First Flight'?",
+        "options": [
+            "The importance of family relationships",
+            "Overcoming fear and gaining self-confidence",
+            "The beauty of nature and flying",
+            "The struggle for survival in the wild"
+        ],
+        "correct_answer": "Overcoming fear and gaining self-confidence",
+        "explanation": "The central theme revolves around conquering fear and building self-confidence."
+    },
+    {
+        "question": "How did the seagull's parents try to help him overcome his fear?",
+        "options": [
+            "They brought him food regularly",
+            "They scolded and criticized him",
+            "They called to him encouragingly and demonstrated flying",
+            "They left him alone to figure it out himself"
+        ],
+        "correct_answer": "They called to him encouragingly and demonstrated flying",
+        "explanation": "His parents used encouragement and demonstration rather than force."
+    }
+]
+
+
+def display_question(item):
+    """A question in the training data schema as a display question, or None"""
+    if not isinstance(item, dict) or not item.get('question'):
+        return None
+    options = item.get('options') or {}
+    answer = item.get('correct_answer', '')
+    if isinstance(options, dict):
+        # Answers refer to option letters ("b"); show the option text instead
+        answer = options.get(str(answer).lower(), answer)
+        options = list(options.values())
+    question = {
+        "question": item['question'],
+        "options": list(options),
+        "correct_answer": answer
+    }
+    if item.get('explanation'):
+        question["explanation"] = item['explanation']
+    return question
+
+
+class QuestionBank:
+    """Every distinct quiz question in the curated data, bucketed by difficulty and type.
+
+    Questions are stored once, in display form; each (difficulty, type)
+    bucket is an array of indexes into that list. A question takes the
+    difficulty of the quiz it came from. The bank is loaded on first use.
+    """
+
+    def __init__(self, data_files):
+        self.data_files = data_files
+        self.questions = []
+        self.buckets = {}  # (difficulty, type) -> array of question indexes
+        self._levels = {}  # difficulty -> that difficulty's buckets
+        self._lock = threading.Lock()
+
+    def build(self):
+        with self._lock:
+            if self.questions:
+                return
+            questions = []
+            buckets = {}
+            seen = set()
+
+            def add(question, difficulty, question_type):
+                if question is None or question["question"] in seen:
+                    return
+                seen.add(question["question"])
+                buckets.setdefault((difficulty, question_type), array('I')).append(len(questions))
+                questions.append(question)
+
+            for path in self.data_files:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        samples = _dataset_samples(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Could not load questions from {path}: {e}")
+                    continue
+                for sample in samples:
+                    output = sample.get("output")
+                    if not isinstance(output, dict):
+                        continue
+                    difficulty = output.get("difficulty") if output.get("difficulty") in DIFFICULTIES else "medium"
+                    for item in output.get("questions", []):
+                        add(display_question(item), difficulty, item.get("type", "mcq") if isinstance(item, dict) else "mcq")
+
+            if not questions:
+                for item in BUILTIN_QUESTIONS:
+                    add(dict(item), "medium", "mcq")
+
+            self.buckets = buckets
+            self._levels = {
+                level: [bucket for (bucket_level, _), bucket in sorted(buckets.items()) if bucket_level == level]
+                for level in DIFFICULTIES
+            }
+            self.questions = questions
+            logger.info(f"🗂️ Question bank holds {len(questions)} questions in {len(buckets)} difficulty/type buckets")
+
+    def size(self, difficulty=None):
+        if not self.questions:
+            self.build()
+        return sum(len(bucket) for (level, _), bucket in self.buckets.items() if difficulty in (None, level))
+
+    def sample(self, difficulty, count, seed=None):
+        """Up to count distinct questions, preferring the requested difficulty.
+
+        Each difficulty's question types are dealt out in turn, so a quiz
+        mixes multiple choice, short answer, true/false and so on. When the
+        difficulty runs out, the nearest one tops the quiz up. The same seed
+        gives the same quiz; sampling costs O(count) per question type.
+        """
+        if not self.questions:
+            self.build()
+        rng = random.Random(seed)
+        chosen = []
+        for level in _FALLBACK_ORDER.get(difficulty, _FALLBACK_ORDER['medium']):
+            needed = count - len(chosen)
+            if needed <= 0:
+                break
+            draws = [rng.sample(bucket, min(needed, len(bucket))) for bucket in self._levels[level]]
+            rng.shuffle(draws)
+            for round_ in zip_longest(*draws):
+                chosen.extend(index for index in round_ if index is not None)
+            del chosen[count:]
+        return [dict(self.questions[index], options=list(self.questions[index]["options"])) for index in chosen]
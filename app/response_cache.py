@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Two-level cache of finished responses.
+
+    The first level is an in-process LRU dict with a TTL. The optional second
+    level is a SQLite file, so several workers on one machine share their
+    hits; entries found there are copied into the first level. Keys are
+    tuples of plain values and values must be JSON serializable.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        # SQLite connections must not be used across fork(); children open their own
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+        if db_path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def _db(self):
+        """One SQLite connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at, now):
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+        if self.db_path:
+            try:
+                row = self._db().execute(
+                    "SELECT value, stored_at FROM responses WHERE key = ?", (json.dumps(key),)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Response cache read failed: {e}")
+                row = None
+            if row is not None and not self._expired(row[1], now):
+                value = json.loads(row[0])
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store_in_memory(key, row[1], value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store_in_memory(key, now, value)
+            self._writes += 1
+            prune = self._writes % 100 == 0
+
+        if self.db_path:
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, stored_at) VALUES (?, ?, ?)",
+                    (json.dumps(key), json.dumps(value), now)
+                )
+                if prune:
+                    self._prune_db(db, now)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Response cache write failed: {e}")
+
+    def _store_in_memory(self, key, stored_at, value):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (stored_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_db(self, db, now):
+        """Drop expired rows and keep the newest max_entries"""
+        if self.ttl_seconds > 0:
+            db.execute("DELETE FROM responses WHERE stored_at < ?", (now - self.ttl_seconds,))
+        db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+        if self.db_path:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "shared": bool(self.db_path),
+        }
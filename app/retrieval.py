@@ -0,0 +1,159 @@
+import re
+import json
+import math
+import threading
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _dataset_samples(data):
+    """The samples list of a data file, whatever its top-level key is called"""
+    for value in data.values():
+        if isinstance(value, dict) and isinstance(value.get("samples"), list):
+            return value["samples"]
+    return []
+
+
+def _document_text(inputs, output):
+    """The text a sample is indexed under: its prompts and the descriptive output fields"""
+    parts = list(inputs)
+    for key in ('lesson_title', 'quiz_title', 'focus', 'difficulty', 'homework'):
+        if output.get(key):
+            parts.append(str(output[key]))
+    parts.extend(str(objective) for objective in output.get('objectives', []))
+    for step in output.get('lesson_steps', []):
+        if isinstance(step, dict):
+            parts.append(f"{step.get('activity', '')} {step.get('description', '')}")
+    for question in output.get('questions', []):
+        if isinstance(question, dict):
+            parts.append(str(question.get('question', '')))
+    return " ".join(parts)
+
+
+class _TaskIndex:
+    """BM25 index over the distinct samples of one task"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = documents
+        doc_tokens = [tokenize(doc["text"]) for doc in documents]
+        self.vocabulary = {}
+        for tokens in doc_tokens:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        doc_count = len(documents)
+        lengths = [len(tokens) for tokens in doc_tokens]
+        avg_length = sum(lengths) / doc_count if doc_count else 0.0
+        doc_freq = [0] * len(self.vocabulary)
+        term_freqs = []
+        for tokens in doc_tokens:
+            counts = {}
+            for token in tokens:
+                term = self.vocabulary[token]
+                counts[term] = counts.get(term, 0) + 1
+            for term in counts:
+                doc_freq[term] += 1
+            term_freqs.append(counts)
+
+        # Precompute every (document, term) BM25 weight, so that scoring a
+        # query is just a sum over the query's columns
+        self.weights = [{} for _ in documents]
+        for d, counts in enumerate(term_freqs):
+            norm = k1 * (1 - b + b * lengths[d] / avg_length) if avg_length else k1
+            for term, tf in counts.items():
+                idf = math.log(1 + (doc_count - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                self.weights[d][term] = idf * tf * (k1 + 1) / (tf + norm)
+
+        self.matrix = None
+        try:
+            # Imported here so that starting the app doesn't pay for numpy
+            import numpy as np
+        except ImportError:  # scoring falls back to plain Python
+            np = None
+        if np is not None and documents:
+            self.matrix = np.zeros((len(self.vocabulary), doc_count), dtype=np.float32)
+            for d, row in enumerate(self.weights):
+                for term, weight in row.items():
+                    self.matrix[term, d] = weight
+
+    def scores(self, query):
+        terms = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        if self.matrix is not None:
+            return self.matrix[terms].sum(axis=0).tolist()
+        return [sum(row.get(term, 0.0) for term in terms) for row in self.weights]
+
+
+class CorpusIndex:
+    """Nearest-match search over the curated lesson plans and quizzes in data/.
+
+    Identical outputs are indexed once, under all the prompts that produced
+    them. The index is built on first use; build() can be called at startup
+    to pay that cost up front.
+    """
+
+    def __init__(self, data_files):
+        self.data_files = data_files  # task_type -> list of JSON paths
+        self.indexes = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        with self._lock:
+            if self.indexes:
+                return
+            indexes = {}
+            for task_type, paths in self.data_files.items():
+                documents = {}
+                for path in paths:
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            samples = _dataset_samples(json.load(f))
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"⚠️ Could not index {path}: {e}")
+                        continue
+                    for sample in samples:
+                        output = sample.get("output")
+                        if not sample.get("input") or not isinstance(output, dict):
+                            continue
+                        key = json.dumps(output, sort_keys=True)
+                        document = documents.setdefault(key, {"id": sample.get("id", key[:32]), "inputs": [], "output": output})
+                        if sample["input"] not in document["inputs"]:
+                            document["inputs"].append(sample["input"])
+                for document in documents.values():
+                    document["text"] = _document_text(document["inputs"], document["output"])
+                indexes[task_type] = _TaskIndex(list(documents.values()))
+                logger.info(f"🔎 Indexed {len(documents)} distinct '{task_type}' samples")
+            self.indexes = indexes
+
+    def search(self, task_type, query, k=1):
+        """Return up to k (score, document) pairs, best first; k=None returns all.
+
+        Each document has "id", "inputs" and "output" (training data schema).
+        """
+        if not self.indexes:
+            self.build()
+        index = self.indexes.get(task_type)
+        if index is None or not index.documents:
+            return []
+        scores = index.scores(query)
+        ranked = sorted(range(len(scores)), key=lambda d: -scores[d])[:k]
+        return [(scores[d], index.documents[d]) for d in ranked]
+
+    def best_match_id(self, task_type, query):
+        results = self.search(task_type, query, k=1)
+        return results[0][1]["id"] if results else None
+
+    def examples(self, task_type, query, k=1):
+        """(instruction, output JSON) pairs to show a model as few-shot context"""
+        return [
+            (document["inputs"][0], json.dumps(document["output"]))
+            for _, document in self.search(task_type, query, k=k)
+        ]
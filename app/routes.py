@@ -1,53 +1,298 @@
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, Response, stream_with_context, g
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import json
+import time
 import logging
-from app import app
+from app import app, config, intent, formatting
 from app.teacher_ai_module import teacher_ai
+from app.scheduler import RequestScheduler, QueueFullError
+from app.metrics import metrics
+from app.compression import encoder
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Model-backed requests are queued per task type and run in batches
+scheduler = None
+if config.SCHEDULER_ENABLED:
+    scheduler = RequestScheduler(
+        {
+            task_type: (lambda user_inputs, task_type=task_type: teacher_ai.generate_task_responses(task_type, user_inputs))
+            for task_type in ('lesson_plan', 'quiz')
+        },
+        max_batch_size=config.SCHEDULER_MAX_BATCH_SIZE,
+        max_wait_ms=config.SCHEDULER_MAX_WAIT_MS,
+        max_queue_depth=config.SCHEDULER_MAX_QUEUE_DEPTH
+    )
+
+def _collect_metrics():
+    """Gauges read at scrape time: model readiness, response cache and queues"""
+    registry = teacher_ai.registry
+    for task_type in registry.model_paths:
+        labels = {"task_type": task_type}
+        yield "eduassist_model_ready", "gauge", "1 when the task's model is loaded", labels, registry.is_loaded(task_type)
+        if task_type in registry.load_times:
+            yield "eduassist_model_load_seconds", "gauge", "Seconds it took to load the task's model", labels, registry.load_times[task_type]
+        if task_type in registry.versions:
+            yield "eduassist_model_info", "gauge", "The model version serving the task", dict(labels, version=registry.versions[task_type]), 1
+    yield "eduassist_model_swaps_total", "counter", "New model versions swapped in while serving", {}, registry.swaps
+    yield "eduassist_model_draining", "gauge", "Replaced models still serving in-flight requests", {}, len(registry.retired)
+    
+    if teacher_ai.response_cache is not None:
+        stats = teacher_ai.response_cache.stats()
+        for result in ('hits', 'disk_hits', 'misses'):
+            yield "eduassist_response_cache_lookups_total", "counter", "Response cache lookups by result", {"result": result}, stats[result]
+        yield "eduassist_response_cache_hit_ratio", "gauge", "Share of response cache lookups that hit", {}, stats["hit_rate"]
+        yield "eduassist_response_cache_entries", "gauge", "Responses held in this worker's cache", {}, stats["entries"]
+    
+    prefix_cache = teacher_ai.engine.prefix_cache
+    if prefix_cache is not None:
+        stats = prefix_cache.stats()
+        for result in ('hits', 'misses'):
+            yield "eduassist_prefix_cache_lookups_total", "counter", "Prompt prefix cache lookups by result", {"result": result}, stats[result]
+        yield "eduassist_prefix_cache_reused_tokens_total", "counter", "Prompt tokens whose prefill was skipped", {}, stats["reused_tokens"]
+        yield "eduassist_prefix_cache_prefilled_tokens_total", "counter", "Prompt tokens prefilled by the model", {}, stats["prefilled_tokens"]
+        yield "eduassist_prefix_cache_bytes", "gauge", "Memory held by cached prompt keys and values", {}, stats["bytes"]
+    
+    if teacher_ai.inflight is not None:
+        stats = teacher_ai.inflight.stats()
+        yield "eduassist_singleflight_leaders_total", "counter", "Requests that started a generation others could join", {}, stats["leaders"]
+        yield "eduassist_singleflight_coalesced_total", "counter", "Requests that waited on an identical in-flight request", {}, stats["coalesced"]
+        yield "eduassist_singleflight_in_flight", "gauge", "Distinct requests being generated", {}, stats["in_flight"]
+    
+    queues = {f"generation-{task_type}": stats for task_type, stats in teacher_ai.engine.stats().items()}
+    if scheduler is not None:
+        queues.update({f"scheduler-{task_type}": stats for task_type, stats in scheduler.stats().items()})
+    for queue_name, stats in queues.items():
+        labels = {"queue": queue_name}
+        yield "eduassist_queue_depth", "gauge", "Requests waiting in a batching queue", labels, stats["depth"]
+        yield "eduassist_queue_batches_total", "counter", "Batches run by a batching queue", labels, stats["batches_run"]
+        yield "eduassist_queue_items_total", "counter", "Requests run by a batching queue", labels, stats["items_run"]
+
+metrics.add_collector(_collect_metrics)
+
+@app.before_request
+def _start_request_timer():
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    if metrics.enabled and request.url_rule is not None and request.url_rule.rule != '/metrics':
+        endpoint = request.url_rule.rule
+        task_type = g.get('task_type', 'none')
+        metrics.inc("eduassist_requests_total", endpoint=endpoint, task_type=task_type, status=response.status_code)
+        if 'request_start' in g:
+            metrics.observe(
+                "eduassist_stage_duration_seconds", time.perf_counter() - g.request_start, stage='request', endpoint=endpoint
+            )
+    return response
+
+def _busy_response(retry_after):
+    response = jsonify({"error": "EDUASSIST is busy right now. Please try again in a moment."})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/ask', methods=['POST'])
+def _ask_response(task_type, response_data, fmt, display=None):
+    """A successful /ask response in the requested format, compressed, with
+    an ETag and Cache-Control when the same request will get it again"""
+    body, content_type = formatting.response_body(response_data, fmt, display)
+    status, headers, body = encoder.encode(
+        body, content_type,
+        accept_encoding=request.headers.get('Accept-Encoding'),
+        if_none_match=request.headers.get('If-None-Match'),
+        cacheable=teacher_ai.is_repeatable(task_type, response_data)
+    )
+    return Response(body, status=status, headers=headers)
+
+@app.route('/ask', methods=['GET', 'POST'])
 def ask():
+    """Answer a request. POST {"message": ...} or GET /ask?message=...; an
+    optional format (json, text or html, in the query string or the body)
+    returns the response in that form instead of {"response": text}."""
     try:
-        data = request.get_json()
+        data = request.get_json() if request.method == 'POST' else request.args
         
         # Accept both 'message' and 'question' keys
         user_input = ""
         if data:
             user_input = data.get('message', '').strip() or data.get('question', '').strip()
         
+        fmt = request.args.get('format') or (data.get('format') if data else None)
+        if fmt is not None and fmt not in formatting.FORMATS:
+            return jsonify({"error": f"'format' must be one of: {', '.join(formatting.FORMATS)}."}), 400
+        
         logger.info(f"User input: '{user_input}'")
         
         if not user_input:
             return jsonify({"error": "Please enter a message."}), 400
         
-        # Generate response
-        response_data = teacher_ai.generate_response(user_input)
+        # Repeated requests are answered straight from the response cache
+        task_type = g.task_type = teacher_ai.detect_intent(user_input)
+        cached = teacher_ai.cached_response(task_type, user_input)
+        if cached is not None:
+            logger.info("✅ Served response from cache")
+            return _ask_response(task_type, cached["response"], fmt, cached["display"])
+        
+        # Generate response; requests that need a model go through the scheduler,
+        # and identical requests already being generated share that result
+        inflight = teacher_ai.inflight if task_type in ('lesson_plan', 'quiz') else None
+        if scheduler is not None and task_type in scheduler.queues and teacher_ai.has_model(task_type):
+            try:
+                if inflight is not None:
+                    future = inflight.submit(
+                        teacher_ai.cache_key(task_type, user_input), lambda: scheduler.submit(task_type, user_input)
+                    )
+                    try:
+                        response_data = future.result(timeout=config.SCHEDULER_TIMEOUT)
+                    except Exception:
+                        future.cancel()
+                        raise
+                else:
+                    response_data = scheduler.run(task_type, user_input, timeout=config.SCHEDULER_TIMEOUT)
+            except QueueFullError as e:
+                logger.warning(f"⚠️ {e}")
+                return _busy_response(e.retry_after)
+            except FutureTimeoutError:
+                logger.warning(f"⚠️ Timed out waiting for the '{task_type}' queue")
+                return _busy_response(scheduler.retry_after(task_type))
+        elif inflight is not None:
+            response_data = inflight.run(
+                teacher_ai.cache_key(task_type, user_input),
+                lambda: teacher_ai.generate_response(user_input, check_cache=False)
+            )
+        else:
+            response_data = teacher_ai.generate_response(user_input, check_cache=False)
         
         if not response_data.get("success", False):
             error_msg = response_data.get("message", "Unknown error occurred")
             return jsonify({"error": error_msg}), 400
         
-        # Format the response for display
-        formatted_response = teacher_ai.format_response_for_display(response_data)
-        
-        # Add note if it's a fallback response
-        final_response = formatted_response
-        if response_data.get("note"):
-            final_response = f"📝 {response_data['note']}\n\n{formatted_response}"
-        
         logger.info("✅ Successfully generated response")
-        return jsonify({"response": final_response})
+        return _ask_response(task_type, response_data, fmt)
         
     except Exception as e:
         logger.error(f"Error in /ask route: {e}")
         return jsonify({"error": "An internal server error occurred. Please try again."}), 500
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answer many requests in one call, e.g. a term's worth of quizzes.
+    
+    Accepts {"requests": [...]}, where each item is a request string or a
+    parameter set such as {"task_type": "quiz", "difficulty": "hard",
+    "question_count": 10}. Returns one {"response"} or {"error"} per item,
+    in order; identical requests are generated once.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'requests' must be a non-empty list."}), 400
+    if len(items) > config.BULK_MAX_REQUESTS:
+        return jsonify({"error": f"At most {config.BULK_MAX_REQUESTS} requests can be sent at once."}), 400
+    
+    results = [None] * len(items)
+    user_inputs = []
+    positions = []
+    for i, item in enumerate(items):
+        try:
+            user_inputs.append(intent.request_text(item))
+            positions.append(i)
+        except (ValueError, TypeError) as e:
+            results[i] = {"error": str(e)}
+    
+    logger.info(f"Batch of {len(items)} request(s)")
+    try:
+        responses = teacher_ai.generate_bulk(user_inputs)
+    except Exception as e:
+        logger.error(f"Error in /ask/batch route: {e}")
+        return jsonify({"error": "An internal server error occurred. Please try again."}), 500
+    
+    for i, user_input, response_data in zip(positions, user_inputs, responses):
+        if response_data.get("success", False):
+            results[i] = {
+                "response": teacher_ai.display_text(response_data),
+                "task_type": response_data.get("task_type"),
+                "source": response_data.get("source"),
+            }
+        else:
+            results[i] = {"error": response_data.get("message", "Unknown error occurred")}
+    
+    return jsonify({"responses": results})
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Like /ask, but sends the response as Server-Sent Events while it is produced"""
+    data = request.get_json(silent=True)
+    
+    user_input = ""
+    if data:
+        user_input = data.get('message', '').strip() or data.get('question', '').strip()
+    
+    logger.info(f"User input (stream): '{user_input}'")
+    
+    if not user_input:
+        return jsonify({"error": "Please enter a message."}), 400
+    
+    g.task_type = teacher_ai.detect_intent(user_input)
+    
+    def events():
+        try:
+            for event, payload in teacher_ai.stream_response(user_input):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in /ask/stream route: {e}")
+            payload = {"error": "An internal server error occurred. Please try again."}
+            yield f"event: error\ndata: {json.dumps(payload)}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "message": "EDUASSIST for 'His First Flight' is running"})
\ No newline at end of file
+    """Per-model readiness. Tasks without a ready model are still served from
+    the curated samples or templates, so only a failed load degrades health."""
+    models = {task_type: teacher_ai.registry.readiness(task_type) for task_type in teacher_ai.registry.model_paths}
+    status = "degraded" if "failed" in models.values() else "healthy"
+    return jsonify({
+        "status": status,
+        "message": "EDUASSIST for 'His First Flight' is running",
+        "models": models,
+        "versions": dict(teacher_ai.registry.versions),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Load task models ahead of the first request.
+
+    Accepts an optional JSON body: {"tasks": ["quiz"], "background": true}.
+    """
+    data = request.get_json(silent=True) or {}
+    tasks = data.get('tasks')
+    
+    if tasks is not None and not isinstance(tasks, list):
+        return jsonify({"error": "'tasks' must be a list of task names."}), 400
+    
+    if data.get('background'):
+        teacher_ai.registry.preload_in_background(tasks or list(teacher_ai.registry.model_paths))
+        logger.info(f"Started background warm-up for: {tasks or 'all tasks'}")
+        return jsonify({"status": "warming", "models": teacher_ai.registry.status()}), 202
+    
+    logger.info(f"Warming up models: {tasks or 'all tasks'}")
+    return jsonify({"status": "ready", "models": teacher_ai.warmup(tasks)})
@@ -0,0 +1,151 @@
+import math
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a task queue is at its maximum depth"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Queue '{name}' is full, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BatchQueue:
+    """A request queue that hands its items to `handler` in batches.
+
+    A worker thread takes the first waiting item, then keeps collecting for
+    up to max_wait_ms or until max_batch_size items are waiting, and calls
+    handler(items) once for the whole batch. handler must return one result
+    per item, in order; each caller's future is resolved with its result.
+    """
+
+    def __init__(self, name, handler, max_batch_size=8, max_wait_ms=10, max_queue_depth=0):
+        self.name = name
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_depth = max_queue_depth  # 0 means unbounded
+        self.requests = queue.Queue()
+        self.batches_run = 0
+        self.items_run = 0
+        self.avg_batch_seconds = 0.0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def depth(self):
+        return self.requests.qsize()
+
+    def retry_after(self):
+        """Seconds a rejected caller should wait, based on recent batch times"""
+        batches_ahead = self.depth() / max(self.max_batch_size, 1)
+        return max(1, math.ceil(batches_ahead * self.avg_batch_seconds))
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result"""
+        if self.max_queue_depth and self.depth() >= self.max_queue_depth:
+            raise QueueFullError(self.name, self.retry_after())
+
+        future = Future()
+        self.requests.put((item, future))
+        self._ensure_started()
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Requests that are already waiting always join the batch
+                if remaining <= 0:
+                    batch.append(self.requests.get_nowait())
+                else:
+                    batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Callers that already gave up don't need a slot in the batch
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self.handler([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"❌ Batch failed in queue '{self.name}': {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+            elapsed = time.perf_counter() - start
+            self.avg_batch_seconds = elapsed if not self.batches_run else 0.8 * self.avg_batch_seconds + 0.2 * elapsed
+            self.batches_run += 1
+            self.items_run += len(batch)
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "avg_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+            "avg_batch_seconds": self.avg_batch_seconds,
+        }
+
+
+class RequestScheduler:
+    """One BatchQueue per task type, sitting between the web routes and the models"""
+
+    def __init__(self, handlers, max_batch_size=8, max_wait_ms=10, max_queue_depth=64):
+        self.queues = {
+            task_type: BatchQueue(
+                f"scheduler-{task_type}",
+                handler,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                max_queue_depth=max_queue_depth
+            )
+            for task_type, handler in handlers.items()
+        }
+
+    def submit(self, task_type, item):
+        """Queue a request for a task; raises QueueFullError when the queue is full"""
+        return self.queues[task_type].submit(item)
+
+    def run(self, task_type, item, timeout=None):
+        """Queue a request and wait for its result"""
+        future = self.submit(task_type, item)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def retry_after(self, task_type):
+        return self.queues[task_type].retry_after()
+
+    def stats(self):
+        return {task_type: batch_queue.stats() for task_type, batch_queue in self.queues.items()}
@@ -0,0 +1,118 @@
+import threading
+import logging
+from concurrent.futures import Future, InvalidStateError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Runs concurrent identical requests once and shares the result.
+
+    The first request for a key starts the work; requests for the same key
+    that arrive while it is in flight wait for that result instead of
+    starting their own. Every caller gets its own Future, so one caller
+    timing out or going away does not cancel the others; the shared work is
+    only cancelled when every caller has given up on it.
+    """
+
+    def __init__(self):
+        self.calls = {}  # key -> [shared Future, number of callers still waiting]
+        self.leaders = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def submit(self, key, start):
+        """A Future for the result of start() -- a non-blocking call returning a
+        Future -- shared with every other in-flight submit() for the key"""
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = [start(), 0]
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+            call[1] += 1
+        if leader:
+            # Outside the lock: the callback runs straight away if the work already finished
+            call[0].add_done_callback(lambda shared: self._finished(key, shared))
+        return self._follow(key, call)
+
+    def run(self, key, func, timeout=None):
+        """Call func() unless an identical call is already running, then wait for the result.
+
+        The first caller runs func on its own thread; the others wait at most
+        `timeout` seconds.
+        """
+        leader = False
+        with self._lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                call[1] += 1
+            else:
+                call = self.calls[key] = [Future(), 1]
+                call[0].set_running_or_notify_cancel()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            future = self._follow(key, call)
+            try:
+                return future.result(timeout=timeout)
+            except Exception:
+                future.cancel()
+                raise
+
+        shared = call[0]
+        try:
+            result = func()
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            self._finished(key, shared)
+
+    def _follow(self, key, call):
+        """A caller's own Future, resolved from the shared one"""
+        shared = call[0]
+        future = Future()
+
+        def copy_result(done):
+            try:
+                if done.cancelled():
+                    future.cancel()
+                elif done.exception() is not None:
+                    future.set_exception(done.exception())
+                else:
+                    future.set_result(done.result())
+            except InvalidStateError:
+                pass  # this caller already gave up
+
+        def release(done):
+            if not done.cancelled():
+                return
+            with self._lock:
+                call[1] -= 1
+                abandoned = call[1] == 0
+            if abandoned:
+                shared.cancel()
+
+        future.add_done_callback(release)
+        shared.add_done_callback(copy_result)
+        return future
+
+    def _finished(self, key, shared):
+        with self._lock:
+            call = self.calls.get(key)
+            if call is not None and call[0] is shared:
+                del self.calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self.calls), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -23,9 +23,19 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Show loading indicator
         const loadingId = addMessage('bot', 'Thinking...');
-        
+
+        // Stream the answer when the browser can read response bodies incrementally
+        if (window.ReadableStream && window.TextDecoder) {
+            streamMessage(message, loadingId);
+        } else {
+            fetchMessage(message, loadingId);
+        }
+    }
+
+    function fetchMessage(message, loadingId) {
         // Send message to server
-        fetch('/ask', {
+        // The server renders the answer as an escaped HTML fragment
+        fetch('/ask?format=html', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -36,18 +46,14 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
             }
-            return response.json();
+            return response.text();
         })
-        .then(data => {
+        .then(html => {
             // Remove loading message
             removeMessage(loadingId);
             
-            if (data.error) {
-                addMessage('bot', '❌ ' + data.error);
-            } else if (data.response) {
-                // Properly format the response with line breaks
-                const formattedResponse = data.response.replace(/\n/g, '<br>');
-                addMessage('bot', formattedResponse, true);
+            if (html) {
+                addMessage('bot', html, true);
             } else {
                 addMessage('bot', '❌ No response received from server.');
             }
@@ -59,6 +65,110 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    function streamMessage(message, loadingId) {
+        let messageId = null;
+        let text = '';
+        let finished = false;
+
+        // Append (or replace) text in the bot message, creating it on the first chunk
+        function render(newText, replace) {
+            if (messageId === null) {
+                removeMessage(loadingId);
+                messageId = addMessage('bot', '', true);
+            }
+            text = replace ? newText : text + newText;
+            const textDiv = document.querySelector('#' + messageId + ' .message-text');
+            textDiv.innerHTML = escapeHTML(text).replace(/\n/g, '<br>');
+            chatBox.scrollTop = chatBox.scrollHeight;
+        }
+
+        function showError(errorText) {
+            finished = true;
+            if (messageId !== null) {
+                removeMessage(messageId);
+            }
+            removeMessage(loadingId);
+            addMessage('bot', '❌ ' + errorText);
+        }
+
+        function handleEvent(rawEvent) {
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+
+            const payload = JSON.parse(data);
+            if (eventName === 'chunk' || eventName === 'token') {
+                render(payload.text, false);
+            } else if (eventName === 'replace') {
+                render(payload.text, true);
+            } else if (eventName === 'error') {
+                showError(payload.error);
+            } else if (eventName === 'done') {
+                finished = true;
+            }
+        }
+
+        fetch('/ask/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ message: message })
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                return response.json().then(data => {
+                    const error = new Error('Network response was not ok');
+                    error.userMessage = data.error;
+                    throw error;
+                });
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        if (!finished && messageId === null) {
+                            showError('No response received from server.');
+                        }
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+
+                    // Server-Sent Events are separated by a blank line
+                    let boundary = buffer.indexOf('\n\n');
+                    while (boundary !== -1) {
+                        handleEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                        boundary = buffer.indexOf('\n\n');
+                    }
+                    return read();
+                });
+            }
+            return read();
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showError(error.userMessage || 'Sorry, there was an error processing your request. Please try again.');
+        });
+    }
+
+    function escapeHTML(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
     function addMessage(sender, text, isHTML = false) {
         const messageDiv = document.createElement('div');
         const messageId = 'msg-' + Date.now();
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmark for the full /ask path.
+
+Replays a shuffled mix of the `input` prompts from data/*.json through:
+
+  generate_response   TeacherAI.generate_response
+  format              TeacherAI.format_response_for_display
+  flask_client        POST /ask through Flask's test client
+  http                POST /ask over HTTP to a local threaded server
+
+and reports p50/p95/p99 latency, requests per second and peak RSS for each
+stage. Results are written to a JSON file; pass --compare with an earlier
+file to print the change against another commit. Run from the repository
+root, with the same EDUASSIST_* settings as the server being measured:
+
+    python benchmarks/bench_ask.py --requests 500 --output before.json
+    python benchmarks/bench_ask.py --requests 500 --compare before.json
+"""
+import os
+import sys
+import json
+import glob
+import time
+import random
+import logging
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_prompts(data_dir):
+    """Every `input` prompt in the data files, duplicates included"""
+    prompts = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for dataset in data.values():
+            if isinstance(dataset, dict):
+                prompts.extend(sample["input"] for sample in dataset.get("samples", []) if sample.get("input"))
+    return prompts
+
+
+def build_corpus(prompts, count, seed):
+    rng = random.Random(seed)
+    return [rng.choice(prompts) for _ in range(count)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_stage(name, call, corpus, concurrency=1):
+    """Time call(prompt) for every prompt and summarize the latencies.
+
+    call returns True when the request succeeded.
+    """
+    def timed(prompt):
+        start = time.perf_counter()
+        ok = call(prompt)
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(timed, corpus))
+    else:
+        timings = [timed(prompt) for prompt in corpus]
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in timings)
+    result = {
+        "requests": len(corpus),
+        "errors": sum(1 for _, ok in timings if not ok),
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "requests_per_second": round(len(corpus) / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"   {name:<17} p50 {result['p50_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms  "
+          f"p99 {result['p99_ms']:>9.3f}ms  {result['requests_per_second']:>9.1f} req/s  "
+          f"RSS {result['peak_rss_mb']}MB  errors {result['errors']}")
+    return result
+
+
+def _post_json(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            return response.status == 200
+    except urllib.error.HTTPError:
+        return False
+    except urllib.error.URLError as e:
+        # Not an answer at all: stop rather than time every request failing the same way
+        raise SystemExit(f"❌ Could not reach the server at {url}: {e.reason}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n📊 Compared with {baseline_path} (commit {baseline.get('commit')}):")
+    for stage, result in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "requests_per_second", "peak_rss_mb"):
+            if before.get(metric):
+                changes.append(f"{metric} {(result[metric] - before[metric]) / before[metric] * 100:+.1f}%")
+        print(f"   {stage:<17} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="requests per stage")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients for the HTTP stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "data"))
+    parser.add_argument("--stages", default="generate_response,format,flask_client,http",
+                        help="comma separated stages to run")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--output", default="bench_ask_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's per-request logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    from app import app
+    from app.teacher_ai_module import teacher_ai
+
+    if args.no_cache:
+        teacher_ai.response_cache = None
+
+    corpus = build_corpus(load_prompts(args.data_dir), args.requests, args.seed)
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    print(f"🧪 {len(corpus)} requests per stage ({len(set(corpus))} distinct prompts), stages: {', '.join(stages)}")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in os.environ.items() if key.startswith("EDUASSIST_")},
+        "args": vars(args),
+        "stages": {},
+    }
+
+    if "generate_response" in stages:
+        results["stages"]["generate_response"] = run_stage(
+            "generate_response", lambda prompt: teacher_ai.generate_response(prompt).get("success", False), corpus
+        )
+
+    if "format" in stages:
+        responses = {prompt: teacher_ai.generate_response(prompt) for prompt in set(corpus)}
+        results["stages"]["format"] = run_stage(
+            "format", lambda prompt: bool(teacher_ai.format_response_for_display(responses[prompt])), corpus
+        )
+
+    if "flask_client" in stages:
+        client = app.test_client()
+        results["stages"]["flask_client"] = run_stage(
+            "flask_client", lambda prompt: client.post('/ask', json={"message": prompt}).status_code == 200, corpus
+        )
+
+    if "http" in stages:
+        from werkzeug.serving import make_server
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_port}/ask"
+        try:
+            results["stages"]["http"] = run_stage(
+                "http", lambda prompt: _post_json(url, {"message": prompt}), corpus, concurrency=args.concurrency
+            )
+        finally:
+            server.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: intent and parameter extraction on a synthetic prompt corpus.
+
+Compares the single-pass matcher in app/intent.py with the substring scans
+TeacherAI used before it. Run from the repository root:
+
+    python benchmarks/bench_intent.py --prompts 100000
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import intent
+
+VERBS = ["Create", "Generate", "Make", "Prepare", "Design", "Can you build", "I need"]
+LESSON_PHRASES = ["a lesson plan", "a {n}-minute lesson plan", "a {n} minute class", "a teaching plan", "a lesson"]
+QUIZ_PHRASES = ["a quiz", "a {n}-question quiz", "{n} questions", "a test", "an assessment with {n} questions", "an exam"]
+DETAILS = ["", " focusing on character analysis", " on the theme of courage", " for reading comprehension",
+           " at easy difficulty", " that is hard", " of medium difficulty", " about the planet and classic tales"]
+TOPICS = ["for 'His First Flight'", "about His First Flight", "on the young seagull", "for my students"]
+
+
+def synthetic_prompts(count, seed=0):
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(count):
+        phrase = rng.choice(LESSON_PHRASES + QUIZ_PHRASES).format(n=rng.choice([3, 5, 10, 30, 45, 60]))
+        prompts.append(f"{rng.choice(VERBS)} {phrase} {rng.choice(TOPICS)}{rng.choice(DETAILS)}.")
+    return prompts
+
+
+def legacy_detect_intent(user_input):
+    """TeacherAI.detect_intent before the single-pass matcher"""
+    user_input_lower = user_input.lower()
+    lesson_plan_indicators = ['lesson plan', 'lesson', 'plan', 'teaching', 'class', 'duration', 'minute']
+    quiz_indicators = ['quiz', 'test', 'questions', 'assessment', 'exam', 'question']
+    lesson_score = sum(1 for word in lesson_plan_indicators if word in user_input_lower)
+    quiz_score = sum(1 for word in quiz_indicators if word in user_input_lower)
+    if "his first flight" in user_input_lower:
+        return 'lesson_plan' if lesson_score >= quiz_score else 'quiz'
+    if lesson_score > quiz_score:
+        return 'lesson_plan'
+    elif quiz_score > lesson_score:
+        return 'quiz'
+    return 'ambiguous'
+
+
+def legacy_extract_parameters(user_input):
+    """TeacherAI.extract_parameters before the single-pass matcher"""
+    params = {}
+    duration_match = re.search(r'(\d+)\s*min', user_input.lower())
+    params['duration'] = f"{duration_match.group(1)} minutes" if duration_match else "45 minutes"
+    if 'easy' in user_input.lower():
+        params['difficulty'] = 'easy'
+    elif 'hard' in user_input.lower() or 'difficult' in user_input.lower():
+        params['difficulty'] = 'hard'
+    else:
+        params['difficulty'] = 'medium'
+    count_match = re.search(r'(\d+)\s*question', user_input.lower())
+    params['question_count'] = int(count_match.group(1)) if count_match else 5
+    if 'character' in user_input.lower() or 'analysis' in user_input.lower():
+        params['focus'] = 'character analysis'
+    elif 'theme' in user_input.lower():
+        params['focus'] = 'theme analysis'
+    elif 'comprehension' in user_input.lower():
+        params['focus'] = 'reading comprehension'
+    else:
+        params['focus'] = 'character analysis'
+    return params
+
+
+def time_per_prompt(function, prompts):
+    start = time.perf_counter()
+    for prompt in prompts:
+        function(prompt)
+    return (time.perf_counter() - start) / len(prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=100000, help="number of synthetic prompts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    prompts = synthetic_prompts(args.prompts, args.seed)
+    print(f"🧪 {len(prompts)} synthetic prompts ({len(set(prompts))} distinct)")
+
+    legacy = time_per_prompt(lambda p: (legacy_detect_intent(p), legacy_extract_parameters(p)), prompts)
+    single_pass = time_per_prompt(intent._analyze.__wrapped__, prompts)
+    intent._analyze.cache_clear()
+    memoized = time_per_prompt(intent.analyze_request, prompts)
+
+    print(f"   legacy substring scans: {legacy * 1e6:8.2f} us/prompt")
+    print(f"   single-pass regex:      {single_pass * 1e6:8.2f} us/prompt ({legacy / single_pass:.1f}x)")
+    print(f"   memoized:               {memoized * 1e6:8.2f} us/prompt ({legacy / memoized:.1f}x)")
+
+    changed = [p for p in set(prompts) if legacy_detect_intent(p) != intent.detect_intent(p)
+               or legacy_extract_parameters(p) != intent.extract_parameters(p)]
+    print(f"   {len(changed)} distinct prompts get a different result, e.g.:")
+    for prompt in sorted(changed)[:5]:
+        print(f"     {prompt!r}: {legacy_detect_intent(prompt)} {legacy_extract_parameters(prompt)}"
+              f" -> {intent.detect_intent(prompt)} {intent.extract_parameters(prompt)}")
+
+
+if __name__ == "__main__":
+    main()
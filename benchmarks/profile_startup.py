@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Startup profile: import time of the app, module by module.
+
+Imports the app in a fresh interpreter with `python -X importtime` and
+reports the total time, peak memory, whether torch or transformers were
+imported, the slowest packages and the slowest app modules. Run from the
+repository root, with the environment you deploy with:
+
+    EDUASSIST_TEMPLATE_ONLY=1 python benchmarks/profile_startup.py
+    python benchmarks/profile_startup.py --target app.asgi --top 20
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child: import the target, then report what it cost
+PROBE = """
+import sys, time, json, resource
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in ("torch", "transformers", "numpy") if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, self microseconds, cumulative microseconds, depth) for every -X importtime line"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="app", help="module to import (default: app)")
+    parser.add_argument("--top", type=int, default=12, help="rows per table (default: 12)")
+    args = parser.parse_args()
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(target=args.target)],
+        cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+
+    # Self time summed per top-level package, then the app's own modules by cumulative time
+    packages = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    app_modules = sorted((row for row in rows if row[0].split(".")[0] == "app"), key=lambda row: -row[2])
+
+    print(f"import {args.target}: {summary['seconds'] * 1000:.0f}ms, peak RSS {summary['max_rss_mb']:.0f}MB, "
+          f"{len(rows)} modules")
+    print(f"heavy modules imported: {', '.join(summary['heavy']) or 'none'}")
+    print(f"\n{'package':<28}{'self ms':>10}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28}{self_us / 1000:>10.1f}")
+    print(f"\n{'app module':<28}{'self ms':>10}{'cumulative ms':>15}")
+    for name, self_us, cumulative_us, _ in app_modules[:args.top]:
+        print(f"{name:<28}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Evaluate the trained models on the validation sets.
+
+Every validation prompt is run through the task's model -- batched CPU
+generation, with the batches spread over a pool of worker processes -- and
+the output is scored against the sample's expected output: does it parse as
+JSON, does it match the schema of the training data, how many of the
+expected keys does it have, how many of the expected top-level values does
+it reproduce, and does a quiz have the expected number of questions. One
+JSON line per sample is written to --output, with the model version, so two
+runs can be compared sample by sample:
+
+    python evaluate_models.py --output eval_week41.jsonl --workers 2
+    python evaluate_models.py --model quiz=trained_models/final_model_quiz_new \\
+        --tasks quiz --output eval_new.jsonl --compare eval_week41.jsonl
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VALIDATION_FILES = {
+    'lesson_plan': 'data/lesson_plan_validation.json',
+    'quiz': 'data/quiz_validation.json',
+}
+TRAINING_FILES = {
+    'lesson_plan': 'data/lesson_plan_training.json',
+    'quiz': 'data/quiz_training.json',
+}
+
+_engine = None
+
+
+def _init_worker(model_paths, manifest_path, threads, max_new_tokens, constrained, quiet):
+    """Entry point of a worker process: a generation engine over the models under test"""
+    global _engine
+    if quiet:
+        logging.disable(logging.INFO)
+    from app.model_registry import ModelRegistry
+    from app.generation import GenerationEngine
+    from app.constrained import load_schemas
+
+    registry = ModelRegistry(model_paths, num_threads=threads or 0, manifest_path=manifest_path)
+    schemas = load_schemas({task_type: [path] for task_type, path in TRAINING_FILES.items()}) if constrained else None
+    _engine = GenerationEngine(registry, max_new_tokens=max_new_tokens, schemas=schemas)
+    # Load up front, so load times don't count against generation throughput
+    registry.warmup()
+
+
+def _generate(task_type, instructions):
+    """Generate one batch; returns (outputs, seconds, generated tokens or None, model version)"""
+    from app.metrics import metrics
+
+    counter = ("eduassist_generated_tokens_total", (("task_type", task_type),))
+    tokens_before = metrics.counters.get(counter, 0)
+    start = time.perf_counter()
+    outputs = _engine.generate_batch(task_type, instructions)
+    elapsed = time.perf_counter() - start
+    tokens = metrics.counters.get(counter, 0) - tokens_before if metrics.enabled else None
+    return outputs, elapsed, tokens, _engine.registry.versions.get(task_type)
+
+
+def read_samples(task_type, path, limit=None):
+    """The (id, input, expected output) of every usable sample in a validation file"""
+    from app.retrieval import _dataset_samples
+
+    with open(path, 'r', encoding='utf-8') as f:
+        samples = _dataset_samples(json.load(f))
+    usable = [
+        (sample.get("id", f"{task_type}-{i}"), sample["input"], sample["output"])
+        for i, sample in enumerate(samples, 1)
+        if sample.get("input") and isinstance(sample.get("output"), dict)
+    ]
+    return usable[:limit] if limit else usable
+
+
+def _key_paths(value, prefix=""):
+    """Every key path in a JSON value, with list positions folded into []"""
+    paths = set()
+    if isinstance(value, dict):
+        for key, item in value.items():
+            paths.add(prefix + key)
+            paths |= _key_paths(item, prefix + key + ".")
+    elif isinstance(value, list):
+        for item in value:
+            paths |= _key_paths(item, prefix + "[].")
+    return paths
+
+
+def _question_count(output):
+    questions = output.get("questions") if isinstance(output, dict) else None
+    return len(questions) if isinstance(questions, list) else None
+
+
+def score_sample(task_type, output, expected, schema=None):
+    """Scores of one generated output against the sample's expected output"""
+    result = {"valid_json": isinstance(output, dict)}
+    if not result["valid_json"]:
+        result.update(schema_valid=False, key_coverage=0.0, field_match=0.0)
+        if task_type == 'quiz':
+            result.update(question_count=None, expected_question_count=_question_count(expected), question_count_match=False)
+        return result
+
+    if schema is not None:
+        from app.constrained import schema_errors
+
+        errors = schema_errors(output, schema)
+        result["schema_valid"] = not errors
+        if errors:
+            result["schema_errors"] = errors[:5]
+
+    expected_keys = _key_paths(expected)
+    result["key_coverage"] = len(expected_keys & _key_paths(output)) / len(expected_keys) if expected_keys else 1.0
+
+    # Top-level scalars (title, duration, difficulty...) should come back as asked
+    fields = [key for key, value in expected.items() if not isinstance(value, (dict, list))]
+    result["field_match"] = sum(output.get(key) == expected[key] for key in fields) / len(fields) if fields else 1.0
+
+    if task_type == 'quiz':
+        result["question_count"] = _question_count(output)
+        result["expected_question_count"] = _question_count(expected)
+        result["question_count_match"] = result["question_count"] == result["expected_question_count"]
+    return result
+
+
+def summarize(results, generation_seconds, generated_tokens):
+    """Per-task averages of the sample scores, with generation throughput"""
+    summary = {}
+    for task_type in sorted({result["task_type"] for result in results}):
+        rows = [result for result in results if result["task_type"] == task_type and "error" not in result]
+        task = {"samples": len(rows), "errors": sum(result["task_type"] == task_type and "error" in result for result in results)}
+        for metric in ("valid_json", "schema_valid", "key_coverage", "field_match", "question_count_match"):
+            values = [float(row[metric]) for row in rows if row.get(metric) is not None]
+            if values:
+                task[metric] = round(sum(values) / len(values), 4)
+        seconds = generation_seconds.get(task_type, 0.0)
+        task["generation_seconds"] = round(seconds, 2)
+        if seconds:
+            task["samples_per_second"] = round(len(rows) / seconds, 2)
+            if generated_tokens.get(task_type) is not None:
+                task["tokens_per_second"] = round(generated_tokens[task_type] / seconds, 1)
+        summary[task_type] = task
+    return summary
+
+
+def compare(results, previous_path):
+    """Per-sample differences from an earlier run: {metric: (improved ids, regressed ids)}"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {(row["task_type"], row["id"]): row for row in map(json.loads, filter(str.strip, f))}
+    changes = {}
+    for result in results:
+        before = previous.get((result["task_type"], result["id"]))
+        if before is None:
+            continue
+        for metric in ("valid_json", "schema_valid", "question_count_match", "key_coverage", "field_match"):
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None or old == new:
+                continue
+            improved, regressed = changes.setdefault(metric, ([], []))
+            (improved if new > old else regressed).append(result["id"])
+    return changes
+
+
+def main():
+    from app import config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", nargs="+", default=list(VALIDATION_FILES), choices=list(VALIDATION_FILES))
+    parser.add_argument("--model", action="append", default=[], metavar="TASK=PATH",
+                        help="evaluate the model at PATH for TASK (default: the served version)")
+    parser.add_argument("--output", default="-", help="JSONL file for the per-sample results (default: stdout)")
+    parser.add_argument("--summary", default=None, help="also write the summary to this JSON file")
+    parser.add_argument("--compare", default=None, help="per-sample results of an earlier run to compare with")
+    parser.add_argument("--limit", type=int, default=None, help="samples per task (default: all)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; each loads its own copy of the models (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="samples per generate() call (default: EDUASSIST_GENERATION_MAX_BATCH_SIZE)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch threads per worker (default: CPU cores / workers)")
+    parser.add_argument("--max-new-tokens", type=int, default=None,
+                        help="token budget per sample (default: EDUASSIST_GENERATION_MAX_NEW_TOKENS)")
+    parser.add_argument("--constrained", action="store_true", default=config.CONSTRAINED_DECODING,
+                        help="decode under the JSON schema, as with EDUASSIST_CONSTRAINED_DECODING=1")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    from app.constrained import load_schemas
+
+    overrides = dict(item.split("=", 1) for item in args.model)
+    model_paths = {task_type: overrides.get(task_type, config.MODEL_PATHS[task_type]) for task_type in args.tasks}
+    # An explicit path is evaluated as given; otherwise the manifest picks the version, as when serving
+    manifest_path = None if overrides else config.MODEL_MANIFEST
+    schemas = load_schemas({task_type: [TRAINING_FILES[task_type]] for task_type in args.tasks})
+
+    batch_size = args.batch_size or config.GENERATION_MAX_BATCH_SIZE
+    max_new_tokens = args.max_new_tokens or config.GENERATION_MAX_NEW_TOKENS
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    start = time.perf_counter()
+
+    samples = {task_type: read_samples(task_type, VALIDATION_FILES[task_type], args.limit) for task_type in args.tasks}
+    batches = [
+        (task_type, task_samples[i:i + batch_size])
+        for task_type, task_samples in samples.items()
+        for i in range(0, len(task_samples), batch_size)
+    ]
+    print(f"📦 {sum(map(len, samples.values()))} sample(s) in {len(batches)} batch(es) on {workers} worker(s)", file=sys.stderr)
+
+    results = []
+    generation_seconds = {}
+    generated_tokens = {}
+
+    def record(task_type, batch, outcome=None, error=None):
+        if error is None:
+            outputs, seconds, tokens, version = outcome
+            generation_seconds[task_type] = generation_seconds.get(task_type, 0.0) + seconds
+            if tokens is not None:
+                generated_tokens[task_type] = generated_tokens.get(task_type, 0) + tokens
+        for i, (sample_id, user_input, expected) in enumerate(batch):
+            result = {"task_type": task_type, "id": sample_id, "input": user_input}
+            if error is not None:
+                result["error"] = error
+            else:
+                result["model_version"] = version
+                result.update(score_sample(task_type, outputs[i], expected, schemas.get(task_type)))
+                result["output"] = outputs[i]
+            results.append(result)
+
+    initargs = (model_paths, manifest_path, threads, max_new_tokens, args.constrained, not args.verbose)
+    if workers == 1:
+        _init_worker(*initargs)
+        for task_type, batch in batches:
+            try:
+                record(task_type, batch, _generate(task_type, [user_input for _, user_input, _ in batch]))
+            except Exception as e:
+                record(task_type, batch, error=str(e))
+    else:
+        # Child processes read OMP_NUM_THREADS when torch starts up
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=initargs) as executor:
+            jobs = {
+                executor.submit(_generate, task_type, [user_input for _, user_input, _ in batch]): (task_type, batch)
+                for task_type, batch in batches
+            }
+            for job in as_completed(jobs):
+                try:
+                    record(*jobs[job], job.result())
+                except Exception as e:
+                    record(*jobs[job], error=str(e))
+
+    # Validation file order, whatever order the batches finished in
+    order = {(task_type, sample[0]): i for task_type, task_samples in samples.items() for i, sample in enumerate(task_samples)}
+    results.sort(key=lambda result: (args.tasks.index(result["task_type"]), order[(result["task_type"], result["id"])]))
+    out = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    try:
+        for result in results:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = summarize(results, generation_seconds, generated_tokens)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    for task_type, task in summary.items():
+        print(f"\n📊 {task_type}: {task['samples']} sample(s), {task['errors']} error(s)", file=sys.stderr)
+        for metric, value in task.items():
+            if metric not in ("samples", "errors"):
+                print(f"   {metric:<22}{value}", file=sys.stderr)
+
+    if args.compare:
+        changes = compare(results, args.compare)
+        print(f"\n🔍 Compared with {args.compare}:", file=sys.stderr)
+        for metric, (improved, regressed) in changes.items():
+            print(f"   {metric:<22}{len(improved)} better, {len(regressed)} worse"
+                  + (f" ({', '.join(map(str, regressed[:5]))}{'...' if len(regressed) > 5 else ''})" if regressed else ""),
+                  file=sys.stderr)
+        if not changes:
+            print("   no per-sample differences", file=sys.stderr)
+
+    print(f"\n✅ Evaluated {len(results)} sample(s) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
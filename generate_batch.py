@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Generate lesson plans and quizzes in bulk from a JSONL file.
+
+Each input line is a JSON object with a "message" (or "question"), or a
+parameter set such as {"task_type": "quiz", "difficulty": "hard",
+"question_count": 10}; any other fields (an "id", say) are copied to the
+output. Identical requests are generated once. The distinct requests are
+split into batches that run on a pool of worker processes, and each result
+is written as one JSON line as soon as its batch finishes:
+
+    python generate_batch.py term_pack.jsonl --output term_pack_results.jsonl --workers 2
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_teacher_ai = None
+
+
+def _init_worker(threads, quiet):
+    """Entry point of a worker process: load the app once, with its share of the CPU"""
+    global _teacher_ai
+    if quiet:
+        logging.disable(logging.INFO)
+    from app.teacher_ai_module import teacher_ai
+    if threads:
+        teacher_ai.registry.num_threads = threads
+    _teacher_ai = teacher_ai
+
+
+def _generate(task_type, user_inputs):
+    """Generate one batch; returns (response_data, display text) pairs"""
+    responses = _teacher_ai.generate_task_responses(task_type, user_inputs)
+    return [(response_data, _teacher_ai.display_text(response_data)) for response_data in responses]
+
+
+def read_requests(path):
+    """Yield (line number, record, request text or None, error or None) for every non-empty line"""
+    from app import intent
+
+    with (sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield line_number, record, intent.request_text(record), None
+            except (ValueError, TypeError) as e:
+                yield line_number, None, None, str(e)
+
+
+def output_record(line_number, record, response_data=None, display=None, error=None):
+    result = {"line": line_number}
+    if isinstance(record, dict):
+        result.update({key: value for key, value in record.items() if key not in ("message", "question")})
+    if error is None and response_data is not None and not response_data.get("success", False):
+        error = response_data.get("message", "Unknown error occurred")
+    if error is not None:
+        result["error"] = error
+    else:
+        result.update({
+            "task_type": response_data.get("task_type"),
+            "source": response_data.get("source"),
+            "response": display,
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of requests ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; each loads its own copy of the models (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="distinct requests per batch (default: EDUASSIST_GENERATION_MAX_BATCH_SIZE)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch threads per worker (default: CPU cores / workers)")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    from app import config
+    from app.teacher_ai_module import teacher_ai
+
+    batch_size = args.batch_size or config.GENERATION_MAX_BATCH_SIZE
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    start = time.perf_counter()
+
+    out = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    written = 0
+
+    def write(result):
+        nonlocal written
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        written += 1
+
+    # Group identical requests by the response cache key, so each is generated once
+    groups = {}  # task_type -> {cache key: [(line number, record, request text)]}
+    for line_number, record, user_input, error in read_requests(args.input):
+        if error is not None:
+            write(output_record(line_number, record, error=error))
+            continue
+        task_type = teacher_ai.detect_intent(user_input)
+        if task_type == 'ambiguous':
+            write(output_record(line_number, record, teacher_ai.generate_response(user_input)))
+            continue
+        groups.setdefault(task_type, {}).setdefault(teacher_ai.cache_key(task_type, user_input), []).append(
+            (line_number, record, user_input)
+        )
+
+    batches = []
+    for task_type, by_key in groups.items():
+        duplicates = list(by_key.values())
+        batches.extend((task_type, duplicates[i:i + batch_size]) for i in range(0, len(duplicates), batch_size))
+    distinct = sum(len(by_key) for by_key in groups.values())
+    print(f"📦 {distinct} distinct request(s) in {len(batches)} batch(es) on {workers} worker(s)", file=sys.stderr)
+
+    def write_batch(batch, results):
+        for requests, (response_data, display) in zip(batch, results):
+            for line_number, record, _ in requests:
+                write(output_record(line_number, record, response_data, display))
+
+    try:
+        if workers == 1:
+            _init_worker(args.threads_per_worker, quiet=not args.verbose)
+            for task_type, batch in batches:
+                write_batch(batch, _generate(task_type, [requests[0][2] for requests in batch]))
+        else:
+            # Child processes read OMP_NUM_THREADS when torch starts up
+            os.environ["OMP_NUM_THREADS"] = str(threads)
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(threads, not args.verbose)) as executor:
+                jobs = {
+                    executor.submit(_generate, task_type, [requests[0][2] for requests in batch]): batch
+                    for task_type, batch in batches
+                }
+                for job in as_completed(jobs):
+                    write_batch(jobs[job], job.result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"✅ Wrote {written} result(s) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
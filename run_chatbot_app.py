@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import os
 import sys
-from app import app
+import argparse
+from app import app, config
 
 def main():
+    parser = argparse.ArgumentParser(description="Teacher AI Hub Chatbot Application")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS,
+                        help="pre-forked worker processes sharing the models (0 runs the development server)")
+    parser.add_argument("--threads", type=int, default=config.SERVER_THREADS,
+                        help="request threads per worker")
+    args = parser.parse_args()
+
     print("--- Initializing AI Assistant for the Web App ---")
     
     # Import and initialize the AI
@@ -11,11 +21,24 @@ def main():
     
     print("---------------------------------------------")
     print("🚀 Starting the Teacher AI Hub Chatbot Application...")
-    print("🌍 Open your web browser and navigate to http://localhost:5000")
+    print(f"🌍 Open your web browser and navigate to http://localhost:{args.port}")
     print("---------------------------------------------")
     
+    if args.workers > 0:
+        from app.prefork import PreforkServer
+        PreforkServer(
+            app, teacher_ai,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads=args.threads,
+            torch_threads=config.INFERENCE_THREADS,
+            watch_interval=config.MODEL_WATCH_INTERVAL
+        ).serve_forever()
+        return
+
     # Run the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    app.run(host=args.host, port=args.port, debug=False)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import json
+import gzip
+import asyncio
+import threading
+from app.asgi import application
+from app.teacher_ai_module import teacher_ai
+
+async def call(method, path, payload=None, disconnect=False, headers=()):
+    """Run one request through the ASGI app; returns (status, headers, body)"""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if not disconnect:
+            await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    await application(scope, receive, send)
+    if not sent:
+        return None, {}, b""
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+def test_asgi():
+    print("🧪 Testing the ASGI app...")
+
+    status, _, body = asyncio.run(call("GET", "/health"))
+    assert status == 200 and json.loads(body)["status"] in ("healthy", "degraded")
+
+    # Same JSON contract as the Flask /ask route
+    status, headers, body = asyncio.run(call("POST", "/ask", {"message": "Create a 5 question easy quiz on his first flight"}))
+    assert status == 200 and headers[b"content-type"] == b"application/json"
+    assert "QUIZ" in json.loads(body)["response"].upper()
+    print(f"   ✅ /ask answered {len(json.loads(body)['response'])} characters")
+
+    # The cache key and lookup run on the pool, never on the event loop
+    threads = []
+    cache_key = teacher_ai.cache_key
+    teacher_ai.cache_key = lambda *args: threads.append(threading.current_thread().name) or cache_key(*args)
+    try:
+        status, _, _ = asyncio.run(call("POST", "/ask", {"message": "Create a 5 question easy quiz on his first flight"}))
+    finally:
+        del teacher_ai.cache_key
+    assert status == 200 and threads and all(name.startswith("asgi") for name in threads), threads
+
+    # Other formats, compressed, with an ETag the client can revalidate
+    quiz = {"message": "Create a 7 question hard quiz on his first flight"}
+    status, headers, body = asyncio.run(call("POST", "/ask?format=html", quiz, headers=[("accept-encoding", "gzip")]))
+    assert status == 200 and headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(body).decode('utf-8').startswith('<div class="response quiz">')
+    status, _, _ = asyncio.run(call("POST", "/ask?format=html", quiz, headers=[("accept-encoding", "gzip"), ("if-none-match", headers[b"etag"].decode())]))
+    assert status == 304
+    status, headers, body = asyncio.run(call("GET", "/ask?format=json&message=Create+a+7+question+hard+quiz+on+his+first+flight"))
+    assert status == 200 and json.loads(body)["task_type"] == "quiz"
+    print(f"   ✅ format=json answered {len(body)} bytes, format=html revalidated with 304")
+
+    status, _, body = asyncio.run(call("POST", "/ask", {"message": "  "}))
+    assert status == 400 and json.loads(body) == {"error": "Please enter a message."}
+
+    # Server-Sent Events end with a "done" event
+    status, headers, body = asyncio.run(call("POST", "/ask/stream", {"question": "Make a 45 minute lesson plan on his first flight"}))
+    assert status == 200 and headers[b"content-type"].startswith(b"text/event-stream")
+    events = [block.split("\n")[0] for block in body.decode('utf-8').split("\n\n") if block]
+    assert events[-1] == "event: done", events
+    print(f"   ✅ /ask/stream sent {len(events)} events")
+
+    # A client that goes away gets nothing back
+    status, _, _ = asyncio.run(call("POST", "/ask", {"message": "Create a 6 question hard quiz on his first flight"}, disconnect=True))
+    print(f"   ✅ Disconnected client, response status: {status}")
+
+    status, _, _ = asyncio.run(call("GET", "/nowhere"))
+    assert status == 404
+
+    print("✅ ASGI testing complete!")
+
+if __name__ == "__main__":
+    test_asgi()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import json
+from app import config
+from app.constrained import load_schemas, schema_errors, walk
+
+def shortest_json(schema):
+    """Follow the grammar with the shortest choice, an empty string or 0 at every step"""
+    text = ""
+    steps = walk(schema, " ", ("",))
+    answer = None
+    while True:
+        try:
+            step = steps.send(answer)
+        except StopIteration:
+            return text
+        answer = None
+        if step[0] == "text":
+            text += step[1]
+        elif step[0] == "choice":
+            answer = min(range(len(step[1])), key=lambda i: len(step[1][i]))
+            text += step[1][answer]
+        elif step[0] == "string":
+            text += '"'
+        else:
+            text += step[1] + "0"
+
+def test_constrained():
+    print("🧪 Testing the JSON output schemas...")
+
+    schemas = load_schemas(config.RETRIEVAL_DATA_FILES)
+    assert set(schemas) == {"lesson_plan", "quiz"}
+
+    quiz = schemas["quiz"]
+    assert [key for key, _, _ in quiz["fields"]][:3] == ["quiz_title", "chapter", "total_marks"]
+    question = dict((key, field) for key, field, _ in quiz["fields"])["questions"]["items"]
+    assert {key: required for key, _, required in question["fields"]}["options"] is False
+    print(f"   ✅ Quiz schema has {len(quiz['fields'])} fields, difficulty is one of {dict((k, f) for k, f, _ in quiz['fields'])['difficulty']['enum']}")
+
+    # Whatever the model picks, the grammar only produces JSON in the training layout
+    for task_type, schema in schemas.items():
+        text = shortest_json(schema)
+        output = json.loads(text)
+        assert text == " " + json.dumps(output)
+        print(f"   ✅ Shortest {task_type}: {len(text)} characters")
+        assert schema_errors(output, schema) == []
+
+    # The curated samples conform to their schema; a damaged one doesn't
+    with open(config.RETRIEVAL_DATA_FILES["quiz"][0], 'r', encoding='utf-8') as f:
+        sample = next(iter(json.load(f).values()))["samples"][0]["output"]
+    assert schema_errors(sample, quiz) == []
+    broken = dict(sample, difficulty="Impossible", extra=1)
+    del broken["questions"]
+    assert schema_errors(broken, quiz) == [
+        f"$.difficulty: 'Impossible' is not one of {', '.join(dict((k, f) for k, f, _ in quiz['fields'])['difficulty']['enum'])}",
+        "$.questions: missing",
+        "$.extra: unexpected key",
+    ]
+    print("   ✅ Schema check flags a wrong enum value, a missing and an unexpected key")
+
+    print("✅ Constrained decoding testing complete!")
+
+if __name__ == "__main__":
+    test_constrained()
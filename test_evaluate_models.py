@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import json
+import copy
+import tempfile
+from app.constrained import load_schemas
+from evaluate_models import TRAINING_FILES, VALIDATION_FILES, read_samples, score_sample, summarize, compare
+
+def test_evaluate_models():
+    print("🧪 Testing the evaluation scores...")
+
+    schema = load_schemas({"quiz": [TRAINING_FILES["quiz"]]})["quiz"]
+    sample_id, user_input, expected = read_samples("quiz", VALIDATION_FILES["quiz"], limit=1)[0]
+
+    # The expected output itself scores perfectly
+    perfect = score_sample("quiz", expected, expected, schema)
+    assert perfect["valid_json"] and perfect["schema_valid"] and perfect["question_count_match"]
+    assert perfect["key_coverage"] == 1.0 and perfect["field_match"] == 1.0
+    print(f"   ✅ {sample_id} against itself: {perfect}")
+
+    # One question short, a different title and no explanations
+    output = copy.deepcopy(expected)
+    output["quiz_title"] = "Another quiz"
+    output["questions"] = [{k: v for k, v in question.items() if k != "explanation"} for question in output["questions"][:-1]]
+    partial = score_sample("quiz", output, expected, schema)
+    assert partial["valid_json"] and not partial["question_count_match"]
+    assert partial["question_count"] == partial["expected_question_count"] - 1
+    assert partial["key_coverage"] < 1.0 and partial["field_match"] < 1.0
+    print(f"   ✅ A flawed quiz: coverage {partial['key_coverage']:.2f}, fields {partial['field_match']:.2f}")
+
+    failed = score_sample("quiz", None, expected, schema)
+    assert not failed["valid_json"] and not failed["schema_valid"] and failed["key_coverage"] == 0.0
+
+    # Per-task averages, and per-sample differences between two runs
+    run = [dict(task_type="quiz", id=i, **scores) for i, scores in enumerate((perfect, partial, failed))]
+    summary = summarize(run, {"quiz": 2.0}, {"quiz": 300})
+    assert summary["quiz"]["valid_json"] == round(2 / 3, 4) and summary["quiz"]["tokens_per_second"] == 150.0
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as f:
+        f.write("".join(json.dumps(result) + "\n" for result in run))
+        f.flush()
+        rerun = [dict(run[0], valid_json=False), run[1], dict(run[2], valid_json=True)]
+        assert compare(rerun, f.name)["valid_json"] == ([2], [0])
+    print(f"   ✅ Summary and comparison: {summary['quiz']}")
+
+    print("✅ Evaluation testing complete!")
+
+if __name__ == "__main__":
+    test_evaluate_models()
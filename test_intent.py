@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+from app import intent
+
+def test_intent():
+    print("🧪 Testing request parsing...")
+
+    # Keywords match whole words only
+    assert intent.detect_intent("Tell me about the planet Mars") == "ambiguous"
+    assert intent.analyze_request("A classic story")["lesson_score"] == 0
+    assert intent.detect_intent("Create a quiz on the classic His First Flight") == "quiz"
+    assert intent.detect_intent("Plan a 40 min class on His First Flight") == "lesson_plan"
+    assert intent.detect_intent("His First Flight") == "lesson_plan"
+    print("   ✅ 'planet' isn't a plan and 'classic' isn't a class")
+
+    # Difficulty: "medium-difficulty" is not "difficult"
+    assert intent.extract_parameters("Create a 10 question medium-difficulty quiz on His First Flight")["difficulty"] == "medium"
+    assert intent.extract_parameters("Make a difficult quiz")["difficulty"] == "hard"
+    assert intent.extract_parameters("A HARD quiz")["difficulty"] == "hard"
+    assert intent.extract_parameters("An easy 3 questions test")["difficulty"] == "easy"
+    assert intent.extract_parameters("A quiz")["difficulty"] == "medium"
+    print("   ✅ Difficulty extraction")
+
+    # Counts, durations and focus in the same pass
+    parameters = intent.extract_parameters("An easy 3 questions test")
+    assert parameters["question_count"] == 3 and parameters["duration"] == "45 minutes"
+    parameters = intent.extract_parameters("Create a 30-minute lesson plan on His First Flight focusing on theme analysis")
+    assert parameters["duration"] == "30 minutes" and parameters["focus"] == "theme analysis"
+    assert intent.extract_parameters("Plan a 40 min class")["duration"] == "40 minutes"
+    assert intent.extract_parameters("A lesson plan on characters and themes")["focus"] == "character analysis"
+    assert intent.extract_parameters("A reading comprehension lesson")["focus"] == "reading comprehension"
+    print("   ✅ Question count, duration and focus")
+
+    # Bulk parameter sets read back to the same parameters
+    for item in ({"task_type": "quiz", "difficulty": "hard", "question_count": 10},
+                 {"task_type": "quiz", "difficulty": "easy", "question_count": 3},
+                 {"task_type": "lesson_plan", "duration": "40 minutes", "focus": "theme analysis"},
+                 {"task_type": "lesson_plan", "duration": 30, "focus": "reading comprehension"}):
+        analysis = intent.analyze_request(intent.request_text(item))
+        assert analysis["intent"] == item["task_type"]
+        for name, value in item.items():
+            if name == "duration":
+                assert analysis[name] == f"{int(str(value).split()[0])} minutes"
+            elif name != "task_type":
+                assert analysis[name] == value, (item, analysis)
+    assert intent.request_text({"message": "  A quiz  "}) == "A quiz"
+    for item in (42, {}, {"task_type": "quiz", "difficulty": "impossible"}, {"task_type": "lesson_plan", "focus": "maths"}, "  "):
+        try:
+            intent.request_text(item)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{item!r} was accepted")
+    print("   ✅ Parameter sets round-trip through request_text")
+
+    # Bulk parameter sets: a bad duration is a ValueError, like any other bad item
+    assert intent.request_text({"task_type": "lesson_plan", "duration": "30 minutes"}).startswith("Create a 30 minute lesson plan")
+    assert intent.request_text({"task_type": "lesson_plan", "duration": 40}).startswith("Create a 40 minute lesson plan")
+    for duration in ("", "   ", "long", None, "-5"):
+        try:
+            intent.request_text({"task_type": "lesson_plan", "duration": duration})
+        except ValueError as e:
+            print(f"   ✅ duration {duration!r}: {e}")
+        else:
+            raise AssertionError(f"duration {duration!r} was accepted")
+
+    print("✅ Request parsing testing complete!")
+
+if __name__ == "__main__":
+    test_intent()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import os
+import json
+import tempfile
+from app.model_registry import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeRegistry(ModelRegistry):
+    """A registry whose 'models' are plain objects, so no weights are loaded"""
+
+    def _load_model(self, model_path):
+        return FakeModel(model_path), f"tokenizer for {model_path}", None
+
+
+def test_model_registry():
+    print("🧪 Testing versioned model swaps...")
+
+    with tempfile.TemporaryDirectory() as root:
+        for name in ("quiz_v1", "quiz_v2", "quiz_v3"):
+            os.makedirs(os.path.join(root, name))
+        manifest = os.path.join(root, "manifest.json")
+
+        def publish(path, version):
+            with open(manifest, "w") as f:
+                json.dump({"quiz": {"path": path, "version": version}}, f)
+
+        publish("quiz_v1", "1")
+        registry = FakeRegistry({"quiz": os.path.join(root, "unused")}, manifest_path=manifest)
+        released = []
+        registry.release_callbacks.append(lambda task_type, model, tokenizer: released.append(model.path))
+
+        model, _ = registry.get("quiz")
+        assert model.path.endswith("quiz_v1") and registry.versions == {"quiz": "1"}
+        assert registry.pending_updates() == {}
+        print("   ✅ Loaded the version named in the manifest")
+
+        # The old model keeps serving the request that holds it, and is only
+        # released when that request finishes
+        publish("quiz_v2", "2")
+        warmed = []
+        with registry.lease("quiz") as (leased, _):
+            assert registry.check_for_updates(warm=lambda task_type, model, tokenizer: warmed.append(model.path)) == ["quiz"]
+            assert registry.get("quiz")[0].path.endswith("quiz_v2") and leased is model
+            assert warmed == [os.path.join(root, "quiz_v2")] and released == [] and len(registry.retired) == 1
+        assert released == [os.path.join(root, "quiz_v1")] and registry.retired == {}
+        assert registry.task_status("quiz")["version"] == "2" and registry.version("quiz") == "2" and registry.swaps == 1
+        print("   ✅ Swapped to version 2 and released version 1 after its last request")
+
+        # A version that fails its warm-up is not swapped in, nor retried
+        publish("quiz_v3", "3")
+
+        def failing_warmup(task_type, model, tokenizer):
+            raise RuntimeError("broken model")
+
+        assert registry.check_for_updates(warm=failing_warmup) == []
+        assert registry.versions == {"quiz": "2"} and registry.update_errors["quiz"][0] == "3"
+        assert registry.pending_updates() == {}
+        print("   ✅ Kept version 2 when version 3 failed its warm-up")
+
+    # Without a manifest the directory is watched, and a change is only picked
+    # up once two checks agree on it
+    with tempfile.TemporaryDirectory() as model_dir:
+        with open(os.path.join(model_dir, "config.json"), "w") as f:
+            f.write("{}")
+        os.utime(os.path.join(model_dir, "config.json"), (1_700_000_000, 1_700_000_000))
+        registry = FakeRegistry({"quiz": model_dir})
+        registry.get("quiz")
+        os.utime(os.path.join(model_dir, "config.json"), (1_800_000_000, 1_800_000_000))
+        assert registry.pending_updates() == {}
+        assert list(registry.pending_updates()) == ["quiz"]
+        assert registry.check_for_updates() == ["quiz"] and registry.pending_updates() == {}
+        print("   ✅ Picked up a rewritten model directory once it settled")
+
+        # Requests don't scan the disk: a model that appears is seen on the next check
+        missing = os.path.join(model_dir, "lesson_plan")
+        registry = FakeRegistry({"lesson_plan": missing})
+        assert not registry.is_available("lesson_plan")
+        os.makedirs(missing)
+        with open(os.path.join(missing, "config.json"), "w") as f:
+            f.write("{}")
+        assert not registry.is_available("lesson_plan")
+        registry.pending_updates()
+        assert registry.is_available("lesson_plan")
+        print("   ✅ Cached model lookups until the next check")
+
+    print("🎉 Model registry test passed!")
+
+
+if __name__ == "__main__":
+    test_model_registry()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+from app.prefix_cache import PrefixCache
+
+def tiny_model():
+    return GPT2LMHeadModel(GPT2Config(vocab_size=64, n_positions=64, n_embd=32, n_layer=2, n_head=2, bos_token_id=0, eos_token_id=0)).eval()
+
+def next_token_logits(model, ids, past=None):
+    """Logits after the last token of ids; with past, only the last token is run"""
+    with torch.inference_mode():
+        if past is None:
+            return model(input_ids=torch.tensor([ids])).logits[0, -1]
+        return model(input_ids=torch.tensor([ids[-1:]]), past_key_values=past, use_cache=True).logits[0, -1]
+
+def test_prefix_cache():
+    print("🧪 Testing the prompt-prefix cache...")
+
+    torch.manual_seed(0)
+    model = tiny_model()
+    cache = PrefixCache(max_bytes=1 << 20)
+
+    shared = [5, 9, 13, 2, 7, 31, 8, 40, 11, 3]
+    first = shared + [17, 22, 4, 60, 19]
+    prompts = [
+        ("a prompt with nothing cached", first),
+        ("the same prompt again", first),
+        ("a prompt that diverges after the shared tokens (cropped)", shared + [50, 51, 52]),
+        ("a prompt that is a prefix of a cached one (cropped)", first[:12]),
+        ("the diverging prompt again, after its cache was used", shared + [50, 51, 52]),
+    ]
+    for name, ids in prompts:
+        past = cache.prefill("quiz", model, ids)
+        assert past.get_seq_length() == len(ids) - 1
+        expected = next_token_logits(model, ids)
+        cached = next_token_logits(model, ids, past)
+        assert torch.allclose(cached, expected, atol=1e-5), (name, (cached - expected).abs().max())
+        print(f"   ✅ {name}: same logits, {cache.stats()['reused_tokens']} tokens reused so far")
+
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 4
+    assert stats["reused_tokens"] == 14 + len(shared) + 11 + 12
+
+    # Another model never gets this model's entries
+    other = tiny_model()
+    past = cache.prefill("quiz", other, first)
+    assert cache.stats()["misses"] == 2
+    assert torch.allclose(next_token_logits(other, first, past), next_token_logits(other, first), atol=1e-5)
+
+    print("✅ Prefix cache testing complete!")
+
+if __name__ == "__main__":
+    test_prefix_cache()
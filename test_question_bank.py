@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+from app.question_bank import QuestionBank
+from app.teacher_ai_module import teacher_ai
+
+DATA_FILES = ['data/quiz_training.json', 'data/quiz_validation.json']
+
+def test_question_bank():
+    print("🧪 Testing the question bank...")
+
+    bank = QuestionBank(DATA_FILES)
+    print(f"   {bank.size()} questions: {bank.size('easy')} easy, {bank.size('medium')} medium, {bank.size('hard')} hard")
+
+    # Asking for 10 questions gets 10 distinct questions
+    questions = bank.sample("medium", 10, seed=1)
+    assert len(questions) == 10
+    assert len({question["question"] for question in questions}) == 10
+
+    # The requested difficulty comes first, then the nearest one tops it up
+    hard = bank.sample("hard", bank.size("hard") + 3, seed=1)
+    hard_questions = {bank.questions[i]["question"] for bucket in bank._levels["hard"] for i in bucket}
+    assert {question["question"] for question in hard[:bank.size("hard")]} == hard_questions
+    assert len(hard) == bank.size("hard") + 3
+    print(f"   ✅ {len(hard)} questions for a hard quiz, {bank.size('hard')} of them hard")
+
+    # The same seed gives the same quiz
+    assert bank.sample("easy", 5, seed=7) == bank.sample("easy", 5, seed=7)
+    assert len(bank.sample("easy", 1000)) == bank.size()
+
+    # With retrieval on (the default), a quiz the curated samples of that
+    # difficulty can't cover comes from the bank instead
+    assert teacher_ai.corpus is not None
+    response = teacher_ai._build_response("quiz", "Create an easy 12 question quiz on His First Flight")
+    assert response["source"] == "template" and response["content"]["difficulty"] == "easy"
+    assert len(response["content"]["questions"]) == 12
+    response = teacher_ai._build_response("quiz", "Create a hard 5 question quiz on His First Flight")
+    assert response["source"] == "retrieval" and len(response["content"]["questions"]) == 5
+    response = teacher_ai._build_response("quiz", "Create a 0 question quiz on His First Flight")
+    assert response["content"]["questions"] == []
+    print("   ✅ Quizzes retrieval can't cover are drawn from the bank")
+    print("✅ Question bank testing complete!")
+
+if __name__ == "__main__":
+    test_question_bank()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+from app.response_cache import ResponseCache
+from app.teacher_ai_module import teacher_ai
+
+def test_response_cache():
+    print("🧪 Testing the response cache...")
+
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set(("quiz", "easy", 5), {"display": "quiz"})
+    cache.set(("lesson_plan", "45 minutes", "theme analysis"), {"display": "plan"})
+    assert cache.get(("quiz", "easy", 5)) == {"display": "quiz"}
+
+    # The least recently used entry is evicted first
+    cache.set(("quiz", "hard", 10), {"display": "hard quiz"})
+    assert cache.get(("lesson_plan", "45 minutes", "theme analysis")) is None
+    assert cache.get(("quiz", "easy", 5)) is not None
+    print(f"   ✅ LRU eviction: {cache.stats()}")
+
+    # A second cache on the same database sees the first one's entries
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "responses.db")
+        first = ResponseCache(max_entries=8, ttl_seconds=60, db_path=db_path)
+        second = ResponseCache(max_entries=8, ttl_seconds=60, db_path=db_path)
+        first.set(("quiz", "medium", 3), {"display": "shared"})
+        assert second.get(("quiz", "medium", 3)) == {"display": "shared"}
+        assert second.stats()["disk_hits"] == 1
+        print(f"   ✅ Shared through SQLite: {second.stats()}")
+
+    # A swapped-in model version gets its own entries
+    request = "Create a hard 5 question quiz on His First Flight"
+    before = teacher_ai.cache_key("quiz", request)
+    teacher_ai.registry.versions["quiz"] = "2026w42"
+    try:
+        assert teacher_ai.cache_key("quiz", request) != before
+        assert "2026w42" in teacher_ai.cache_key("quiz", request)
+    finally:
+        teacher_ai.registry.versions.pop("quiz")
+    assert teacher_ai.cache_key("quiz", request) == before
+    print("   ✅ Keyed on the model version")
+
+    # Keyed on the curated samples the response is really adapted from
+    hard = teacher_ai.cache_key("quiz", "Create a hard 10 question quiz on His First Flight")
+    assert len(hard[-1]) == 2 and len(teacher_ai.cache_key("quiz", request)[-1]) == 1
+    assert teacher_ai.cache_key("quiz", "Create an easy 12 question quiz on His First Flight")[-1] == ()
+    assert teacher_ai.cache_key("lesson_plan", "A lesson plan on His First Flight focusing on theme analysis")[-1] == ()
+    print("   ✅ Keyed on the retrieved samples")
+
+    print("✅ Response cache testing complete!")
+
+if __name__ == "__main__":
+    test_response_cache()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import threading
+from app.scheduler import BatchQueue, QueueFullError
+
+def test_scheduler():
+    print("🧪 Testing the micro-batching request scheduler...")
+
+    batch_sizes = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def handler(items):
+        entered.set()
+        release.wait(5)
+        batch_sizes.append(len(items))
+        return [item.upper() for item in items]
+
+    batch_queue = BatchQueue("test", handler, max_batch_size=4, max_wait_ms=50, max_queue_depth=6)
+
+    # The first request is picked up straight away and blocks in the handler,
+    # so the next ones pile up in the queue until it is full
+    first = batch_queue.submit("first")
+    assert entered.wait(5)
+    futures = [batch_queue.submit(f"request {i}") for i in range(6)]
+
+    try:
+        batch_queue.submit("one too many")
+        raise AssertionError("Expected the queue to be full")
+    except QueueFullError as e:
+        print(f"   ✅ Rejected when full (retry after {e.retry_after}s)")
+        assert e.retry_after >= 1
+
+    release.set()
+    assert first.result(timeout=5) == "FIRST"
+    results = [future.result(timeout=5) for future in futures]
+    assert results == [f"REQUEST {i}" for i in range(6)]
+
+    print(f"   Batch sizes: {batch_sizes}")
+    assert batch_sizes == [1, 4, 2]
+    print("✅ Scheduler testing complete!")
+
+if __name__ == "__main__":
+    test_scheduler()
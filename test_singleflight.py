@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from app.singleflight import SingleFlight
+
+def test_singleflight():
+    print("🧪 Testing single-flight request coalescing...")
+
+    inflight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def generate():
+        calls.append(1)
+        release.wait(30)
+        return {"response": "quiz"}
+
+    # Thirty identical requests at once run the generation once
+    with ThreadPoolExecutor(max_workers=30) as executor:
+        futures = [executor.submit(inflight.run, ("quiz", "easy", 5), generate, 30) for _ in range(30)]
+        deadline = time.monotonic() + 10
+        while inflight.stats()["coalesced"] < 29 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+    assert len(calls) == 1 and all(result == {"response": "quiz"} for result in results)
+    assert inflight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 29}
+    print(f"   ✅ 30 requests, {len(calls)} generation")
+
+    # Callers giving up only cancels the shared work once nobody waits for it
+    shared = Future()
+    first = inflight.submit("key", lambda: shared)
+    second = inflight.submit("key", lambda: Future())
+    first.cancel()
+    assert not shared.cancelled()
+    second.cancel()
+    assert shared.cancelled() and inflight.stats()["in_flight"] == 0
+    print("   ✅ Shared work cancelled after the last caller left")
+
+    # Work that finishes before submit() returns is shared and then forgotten
+    done = Future()
+    done.set_result("ready")
+    assert inflight.submit("fast", lambda: done).result(timeout=5) == "ready"
+    assert inflight.stats()["in_flight"] == 0
+    print("✅ Single-flight testing complete!")
+
+if __name__ == "__main__":
+    test_singleflight()
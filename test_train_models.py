@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import os
+import json
+import tempfile
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import GPT2Config, GPT2LMHeadModel
+from train_models import DynamicPaddingCollator, PackedCollator, PackedDataset, enable_packed_attention, _resume_checkpoint
+
+EOS = 49
+
+
+class TokenizedSamples:
+    """A stand-in for AIEducationDataset: token IDs ending in EOS, and prompt lengths"""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.lengths = np.array([len(input_ids) for input_ids, _ in samples])
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        input_ids, prompt_length = self.samples[idx]
+        return {"input_ids": torch.tensor(input_ids), "prompt_length": prompt_length}
+
+
+def summed_loss(model, batch):
+    labels = batch.pop("labels")
+    with torch.no_grad():
+        logits = model(**batch).logits
+    loss = F.cross_entropy(logits[:, :-1].reshape(-1, logits.shape[-1]), labels[:, 1:].reshape(-1),
+                           ignore_index=-100, reduction="sum")
+    return loss.item(), int((labels[:, 1:] != -100).sum())
+
+
+def test_train_models():
+    print("🧪 Testing padding and packing in the training loss...")
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=50, n_positions=64, n_embd=32, n_layer=2, n_head=2)).eval()
+    enable_packed_attention(model)
+    generator = torch.Generator().manual_seed(0)
+    samples = TokenizedSamples([
+        (torch.randint(0, EOS, (length,), generator=generator).tolist() + [EOS], prompt_length)
+        for length, prompt_length in ((11, 4), (6, 2), (17, 5), (3, 1))
+    ])
+
+    for mask_prompt in (False, True):
+        padded = DynamicPaddingCollator(EOS, mask_prompt=mask_prompt)([samples[i] for i in range(len(samples))])
+        assert (padded["labels"][padded["attention_mask"] == 0] == -100).all()
+
+        packed = PackedCollator(EOS, mask_prompt=mask_prompt)(list(PackedDataset(samples, max_length=24)))
+        assert (packed["labels"][packed["attention_mask"] == 0] == -100).all()
+
+        # Padding adds nothing, so both give the loss of the samples alone
+        padded_loss, padded_tokens = summed_loss(model, padded)
+        packed_loss, packed_tokens = summed_loss(model, packed)
+        expected_tokens = sum(len(input_ids) - (prompt_length if mask_prompt else 1) for input_ids, prompt_length in samples.samples)
+        assert padded_tokens == packed_tokens == expected_tokens
+        assert abs(padded_loss - packed_loss) < 1e-3 * padded_loss
+        print(f"   ✅ mask_prompt={mask_prompt}: {padded_tokens} labelled tokens, loss {padded_loss:.4f} padded, {packed_loss:.4f} packed")
+
+    # A run on changed data neither resumes from nor keeps the old checkpoints
+    with tempfile.TemporaryDirectory() as output_dir:
+        os.makedirs(os.path.join(output_dir, "checkpoint-40"))
+        with open(os.path.join(output_dir, "run_state.json"), "w") as f:
+            json.dump({"data_hashes": {"quiz.json": "old"}}, f)
+        assert _resume_checkpoint(output_dir, {"quiz.json": "old"}, True) == os.path.join(output_dir, "checkpoint-40")
+        assert _resume_checkpoint(output_dir, {"quiz.json": "new"}, True) is None
+        assert not os.path.exists(os.path.join(output_dir, "checkpoint-40"))
+    print("   ✅ Removed the checkpoints trained on the old data")
+
+    print("✅ Training loss testing complete!")
+
+if __name__ == "__main__":
+    test_train_models()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import os
+import json
+import tempfile
+from app.retrieval import _dataset_samples
+from training_data import SAMPLE_SCHEMAS, iter_samples, load_samples
+
+def test_training_data():
+    print("🧪 Testing the streaming dataset loader...")
+
+    # Streamed samples are the ones json.load finds, whatever the chunk size
+    path = "data/quiz_validation.json"
+    with open(path, 'r', encoding='utf-8') as f:
+        expected = _dataset_samples(json.load(f))
+    for chunk_size in (1, 13, 1 << 20):
+        assert list(iter_samples(path, chunk_size)) == expected
+    store, rejected, errors = load_samples(path, SAMPLE_SCHEMAS["quiz"], chunk_size=64)
+    assert rejected == 0 and len(store) == len(expected)
+    assert store[-1] == (expected[-1]["input"], json.dumps(expected[-1]["output"]))
+    print(f"   ✅ {len(store)} quiz samples streamed into {store.nbytes} bytes")
+
+    # JSONL, with a line that doesn't parse and samples the schema rejects
+    good = expected[0]
+    broken_quiz = dict(good["output"], questions=[{"question": "Why?"}])
+    lines = [
+        json.dumps(good),
+        "{not json",
+        "",
+        json.dumps({"id": "no-input", "output": good["output"]}),
+        json.dumps({"id": "no-answer", "input": "A quiz", "output": broken_quiz}),
+        json.dumps(dict(good, id="second")),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, "quiz.jsonl")
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        store, rejected, errors = load_samples(jsonl_path, SAMPLE_SCHEMAS["quiz"])
+    assert len(store) == 2 and rejected == 3
+    assert errors[0].startswith("sample 2: line 2:")
+    assert errors[1] == "sample no-input: input: missing or empty"
+    assert errors[2] == "sample no-answer: output.questions[0].correct_answer: missing"
+    print(f"   ✅ JSONL: kept {len(store)}, rejected {rejected}: {errors}")
+
+    print("✅ Dataset loader testing complete!")
+
+if __name__ == "__main__":
+    test_training_data()
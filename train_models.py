@@ -1,4 +1,6 @@
 import json
+import hashlib
+import numpy as np
 import torch
 from transformers import (
     AutoTokenizer,
@@ -7,9 +9,18 @@ from transformers import (
     Trainer,
     EarlyStoppingCallback
 )
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, ConcatDataset
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR, get_last_checkpoint
+import argparse
+import multiprocessing
 import os
-from typing import Dict, List
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from typing import Dict, List, Optional
+
+from training_data import SAMPLE_SCHEMAS, SampleStore, load_samples
 
 
 # ============================
@@ -18,6 +29,7 @@ from typing import Dict, List
 
 DATA_FOLDER = "data"
 MODEL_SAVE_PATH = "trained_models"
+BASE_MODEL_NAME = os.environ.get("EDUASSIST_BASE_MODEL", "microsoft/DialoGPT-small")
 
 FILES = {
     "lesson_plan": {
@@ -30,6 +42,20 @@ FILES = {
     }
 }
 
+# Tokenized datasets are cached here, keyed by tokenizer and data file hash
+TOKEN_CACHE_DIR = os.path.join(MODEL_SAVE_PATH, "token_cache")
+MAX_LENGTH = 512
+
+# Batch samples of similar length together so dynamic padding adds fewer pad tokens
+GROUP_BY_LENGTH = True
+
+# Only compute the loss on response tokens: prompts are labelled -100 (padding always is)
+MASK_PROMPT_LOSS = True
+
+# Pack several short samples into each MAX_LENGTH sequence. Packed samples
+# get their own position IDs and cannot attend to each other.
+PACK_SEQUENCES = False
+
 os.makedirs(MODEL_SAVE_PATH, exist_ok=True)
 
 
@@ -37,85 +63,332 @@ os.makedirs(MODEL_SAVE_PATH, exist_ok=True)
 # 🧠 DATASET CLASS
 # ============================
 
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 class AIEducationDataset(Dataset):
-    """Dataset class for tokenizing and loading structured JSON data."""
+    """Dataset of pre-tokenized samples for one task.
+
+    Every sample is tokenized once and cached on disk as a flat array of
+    token IDs plus an offsets array, keyed by tokenizer and data file hash.
+    Later runs memory-map the cache instead of re-reading and re-tokenizing
+    the JSON. Samples are not padded here; DynamicPaddingCollator pads each
+    batch to its longest sample.
+    """
 
-    def __init__(self, data_path: str, tokenizer, task_type: str, dataset_type: str, max_length: int = 512):
+    def __init__(self, data_path: str, tokenizer, task_type: str, dataset_type: str,
+                 max_length: int = MAX_LENGTH, cache_dir: str = TOKEN_CACHE_DIR, prompt_prefix: str = ""):
         self.tokenizer = tokenizer
         self.max_length = max_length
         self.task_type = task_type
-        self.samples = []
+        self.prompt_prefix = prompt_prefix
+        self.samples = SampleStore()
+        self.token_ids = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.prompt_lengths = np.zeros(0, dtype=np.int64)
+
+        cache_prefix = self._cache_prefix(data_path, dataset_type, cache_dir)
+        if cache_prefix and self._load_cache(cache_prefix):
+            print(f"⚡ Loaded {len(self)} cached tokenized samples for '{task_type}' ({dataset_type}).")
+            return
+
         self._load_data(data_path, dataset_type)
+        self._tokenize()
+        if cache_prefix and len(self):
+            self._save_cache(cache_prefix)
+
+    def _cache_prefix(self, data_path: str, dataset_type: str, cache_dir: str):
+        if not cache_dir or not os.path.exists(data_path):
+            return None
+        key_source = "|".join([
+            str(getattr(self.tokenizer, "name_or_path", "")),
+            str(len(self.tokenizer)),
+            str(self.max_length),
+            self.prompt_prefix,
+            file_sha256(data_path),
+        ])
+        key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cache_dir, f"{self.task_type}_{dataset_type}_{key}")
+
+    def _load_cache(self, cache_prefix: str) -> bool:
+        try:
+            self.token_ids = np.load(f"{cache_prefix}.ids.npy", mmap_mode='r')
+            self.offsets = np.load(f"{cache_prefix}.offsets.npy")
+            self.prompt_lengths = np.load(f"{cache_prefix}.prompts.npy")
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _save_cache(self, cache_prefix: str):
+        os.makedirs(os.path.dirname(cache_prefix), exist_ok=True)
+        arrays = (
+            (".ids.npy", self.token_ids),
+            (".offsets.npy", self.offsets),
+            (".prompts.npy", self.prompt_lengths),
+        )
+        for suffix, array in arrays:
+            # Write to a temporary file first so a crash never leaves a half-written cache
+            tmp_path = f"{cache_prefix}{suffix}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, f"{cache_prefix}{suffix}")
+        print(f"💾 Cached tokenized samples at: {cache_prefix}.*.npy")
 
     def _load_data(self, data_path: str, dataset_type: str):
         print(f"\n📘 Loading {dataset_type.upper()} data for '{self.task_type}' from: {data_path}")
         try:
-            with open(data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
+            self.samples, rejected, errors = load_samples(data_path, SAMPLE_SCHEMAS.get(self.task_type))
+        except (OSError, ValueError) as e:
             print(f"❌ ERROR: Cannot load {data_path} — {e}")
             return
 
-        # Automatically detect key
-        if "quiz_training_dataset" in data:
-            data_list = data["quiz_training_dataset"]["samples"]
-        elif "lesson_plan_training_dataset" in data:
-            data_list = data["lesson_plan_training_dataset"]["samples"]
-        elif "quiz_validation_dataset" in data:
-            data_list = data["quiz_validation_dataset"]["samples"]
-        elif "lesson_plan_validation_dataset" in data:
-            data_list = data["lesson_plan_validation_dataset"]["samples"]
-        else:
-            print(f"❌ ERROR: No recognizable key found in {data_path}.")
+        if rejected:
+            print(f"⚠️ Skipped {rejected} sample(s) that don't match the '{self.task_type}' schema:")
+            for error in errors:
+                print(f"   {error}")
+        print(f"✅ Loaded {len(self.samples)} samples for '{self.task_type}' ({dataset_type}), "
+              f"{self.samples.nbytes / 1e6:.1f}MB.")
+
+    def _tokenize(self, chunk_size: int = 1024):
+        """Tokenize the samples in batched calls of chunk_size into a flat token array"""
+        if not len(self.samples):
             return
+        token_ids = array('i')
+        lengths = array('q')
+        prompt_lengths = array('q')
+        for start in range(0, len(self.samples), chunk_size):
+            chunk = [self.samples[idx] for idx in range(start, min(start + chunk_size, len(self.samples)))]
+            prompts = [f"{self.prompt_prefix}Instruction: {user_input}\nResponse:" for user_input, _ in chunk]
+            texts = [
+                f"{prompt} {output}{self.tokenizer.eos_token}"
+                for prompt, (_, output) in zip(prompts, chunk)
+            ]
+            encodings = self.tokenizer(texts, max_length=self.max_length, truncation=True)["input_ids"]
+            prompt_encodings = self.tokenizer(prompts, max_length=self.max_length, truncation=True)["input_ids"]
+            for ids, prompt_ids in zip(encodings, prompt_encodings):
+                token_ids.extend(ids)
+                lengths.append(len(ids))
+                prompt_lengths.append(min(len(prompt_ids), len(ids)))
+
+        self.token_ids = np.frombuffer(token_ids, dtype=np.int32)
+        self.prompt_lengths = np.frombuffer(prompt_lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.frombuffer(lengths, dtype=np.int64))]).astype(np.int64)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {
+            "input_ids": torch.from_numpy(np.asarray(self.token_ids[start:end], dtype=np.int64)),
+            "prompt_length": int(self.prompt_lengths[idx])
+        }
+
+
+class MultiTaskDataset(ConcatDataset):
+    """Several task datasets trained as one, for a shared multi-task model"""
 
-        for i, item in enumerate(data_list):
-            input_text = item.get("input", "")
-            output_json = item.get("output", "")
-            if input_text and output_json:
-                formatted_output = json.dumps(output_json)
-                self.samples.append({
-                    "input": input_text,
-                    "output": formatted_output
-                })
+    @property
+    def lengths(self):
+        return np.concatenate([dataset.lengths for dataset in self.datasets])
 
-        print(f"✅ Loaded {len(self.samples)} samples for '{self.task_type}' ({dataset_type}).")
+
+class PackedDataset(Dataset):
+    """Packs several tokenized samples into each sequence of up to max_length tokens.
+
+    Samples are assigned to sequences first-fit, longest first. Each item
+    keeps the lengths of the samples it contains so that PackedCollator can
+    restart position IDs and block attention between them.
+    """
+
+    def __init__(self, dataset, max_length: int = MAX_LENGTH):
+        self.dataset = dataset
+        self.max_length = max_length
+        self.packs = []
+
+        pack_lengths = []
+        for idx in np.argsort(-dataset.lengths, kind='stable'):
+            length = int(dataset.lengths[idx])
+            for pack, used in enumerate(pack_lengths):
+                if used + length <= max_length:
+                    self.packs[pack].append(int(idx))
+                    pack_lengths[pack] += length
+                    break
+            else:
+                self.packs.append([int(idx)])
+                pack_lengths.append(length)
+
+        if len(dataset):
+            print(f"📦 Packed {len(dataset)} samples into {len(self.packs)} sequences of up to {max_length} tokens.")
 
     def __len__(self):
-        return len(self.samples)
+        return len(self.packs)
 
     def __getitem__(self, idx):
-        sample = self.samples[idx]
-        text = f"Instruction: {sample['input']}\nResponse: {sample['output']}{self.tokenizer.eos_token}"
-
-        encoding = self.tokenizer(
-            text,
-            max_length=self.max_length,
-            padding="max_length",
-            truncation=True,
-            return_tensors="pt"
-        )
+        features = [self.dataset[sample_idx] for sample_idx in self.packs[idx]]
+        return {
+            "input_ids": torch.cat([feature["input_ids"] for feature in features]),
+            "segment_lengths": [len(feature["input_ids"]) for feature in features],
+            "prompt_lengths": [feature["prompt_length"] for feature in features]
+        }
+
+
+class DynamicPaddingCollator:
+    """Pads each batch to its own longest sample instead of a fixed max_length.
+
+    Padding is always labelled -100. With mask_prompt the prompt is too, so
+    the loss only covers the response and its closing EOS token.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: int = 8, mask_prompt: bool = False):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.mask_prompt = mask_prompt
+
+    def _batch_length(self, lengths: List[int]) -> int:
+        batch_length = max(lengths)
+        if self.pad_to_multiple_of:
+            multiple = self.pad_to_multiple_of
+            batch_length = (batch_length + multiple - 1) // multiple * multiple
+        return batch_length
+
+    def __call__(self, features: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        batch_length = self._batch_length([len(feature["input_ids"]) for feature in features])
+
+        input_ids = torch.full((len(features), batch_length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), batch_length), dtype=torch.long)
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            input_ids[row, :length] = feature["input_ids"]
+            attention_mask[row, :length] = 1
+
+        labels = input_ids.clone()
+        # Padding is masked by position: the pad token is EOS, which ends every sample
+        labels[attention_mask == 0] = -100
+        if self.mask_prompt:
+            for row, feature in enumerate(features):
+                labels[row, :feature["prompt_length"]] = -100
+
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "labels": labels
+        }
+
+
+class PackedCollator(DynamicPaddingCollator):
+    """Collates PackedDataset items.
+
+    Position IDs restart at every packed sample, the first token of each
+    sample is never predicted from the previous one, and segment_ids tell
+    enable_packed_attention which tokens may attend to each other.
+    """
+
+    def __call__(self, features: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        batch_length = self._batch_length([len(feature["input_ids"]) for feature in features])
+
+        shape = (len(features), batch_length)
+        input_ids = torch.full(shape, self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros(shape, dtype=torch.long)
+        position_ids = torch.zeros(shape, dtype=torch.long)
+        segment_ids = torch.zeros(shape, dtype=torch.long)
+        labels = torch.full(shape, -100, dtype=torch.long)
+
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            input_ids[row, :length] = feature["input_ids"]
+            attention_mask[row, :length] = 1
+            labels[row, :length] = feature["input_ids"]
+
+            start = 0
+            for segment, (segment_length, prompt_length) in enumerate(
+                    zip(feature["segment_lengths"], feature["prompt_lengths"]), 1):
+                end = start + segment_length
+                position_ids[row, start:end] = torch.arange(segment_length)
+                segment_ids[row, start:end] = segment
+                masked = prompt_length if self.mask_prompt else 1
+                labels[row, start:start + max(masked, 1)] = -100
+                start = end
+
         return {
-            "input_ids": encoding.input_ids.squeeze(),
-            "attention_mask": encoding.attention_mask.squeeze(),
-            "labels": encoding.input_ids.squeeze()
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "position_ids": position_ids,
+            "segment_ids": segment_ids,
+            "labels": labels
         }
 
 
+def _block_causal_mask(segment_ids: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    """Additive (batch, 1, seq, seq) mask: causal, and only within each packed sample"""
+    seq_length = segment_ids.shape[1]
+    causal = torch.ones((seq_length, seq_length), dtype=torch.bool, device=segment_ids.device).tril()
+    allowed = (segment_ids[:, :, None] == segment_ids[:, None, :]) & causal
+    # Padding only attends to itself, which keeps its softmax well defined
+    allowed |= torch.eye(seq_length, dtype=torch.bool, device=segment_ids.device)
+
+    mask = torch.zeros(allowed.shape, dtype=dtype, device=segment_ids.device)
+    mask.masked_fill_(~allowed, torch.finfo(dtype).min)
+    return mask[:, None, :, :]
+
+
+def enable_packed_attention(model):
+    """Make the model honour PackedCollator's segment_ids.
+
+    GPT-2 only accepts a 2D padding mask, so a pre-hook on the model turns
+    segment_ids into a block-diagonal causal mask and hooks on each attention
+    layer use it in place of the mask GPT-2 builds.
+    """
+    state = {"mask": None}
+
+    def model_pre_hook(module, args, kwargs):
+        segment_ids = kwargs.pop("segment_ids", None)
+        state["mask"] = None if segment_ids is None else _block_causal_mask(segment_ids, module.dtype)
+        return args, kwargs
+
+    def attention_pre_hook(module, args, kwargs):
+        if state["mask"] is not None:
+            kwargs["attention_mask"] = state["mask"]
+        return args, kwargs
+
+    model.register_forward_pre_hook(model_pre_hook, with_kwargs=True)
+    for name, module in model.named_modules():
+        if name.endswith(".attn"):
+            module.register_forward_pre_hook(attention_pre_hook, with_kwargs=True)
+
+
 # ============================
 # ⚙️ TRAINING FUNCTION
 # ============================
 
-def train_specific_model(task_type: str, train_path: str, val_path: str):
-    print("\n" + "="*60)
-    print(f"🚀 STARTING TRAINING FOR: {task_type.upper()}")
-    print("="*60)
+def task_prefix_token(task_type: str) -> str:
+    """Special token that starts every prompt of a task in the multi-task model"""
+    return f"<|{task_type}|>"
+
 
-    model_name = "microsoft/DialoGPT-small"
+def load_base_model(model_name: str = BASE_MODEL_NAME):
     print(f"📦 Loading pretrained model: {model_name}")
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     tokenizer.pad_token = tokenizer.eos_token
     model = AutoModelForCausalLM.from_pretrained(model_name)
+    return model, tokenizer
+
+
+def train_specific_model(task_type: str, train_path: str, val_path: str, resume: bool = True) -> Optional[Dict]:
+    print("\n" + "="*60)
+    print(f"🚀 STARTING TRAINING FOR: {task_type.upper()}")
+    print("="*60)
+
+    model, tokenizer = load_base_model()
 
     # Load datasets
     train_dataset = AIEducationDataset(train_path, tokenizer, task_type, "training")
@@ -123,11 +396,93 @@ def train_specific_model(task_type: str, train_path: str, val_path: str):
 
     if len(train_dataset) == 0 or len(val_dataset) == 0:
         print(f"🛑 Skipping {task_type} — no valid data loaded.")
-        return
+        return None
+
+    return _run_training(task_type, model, tokenizer, train_dataset, val_dataset, [train_path, val_path], resume)
+
+
+def train_multitask_model(task_types: List[str], resume: bool = True) -> Optional[Dict]:
+    """Train one shared model for several tasks.
+
+    Every prompt starts with the task's prefix token (e.g. <|quiz|>), which is
+    added to the tokenizer as a special token.
+    """
+    print("\n" + "="*60)
+    print(f"🚀 STARTING MULTI-TASK TRAINING FOR: {', '.join(t.upper() for t in task_types)}")
+    print("="*60)
+
+    model, tokenizer = load_base_model()
+    tokenizer.add_special_tokens({"additional_special_tokens": [task_prefix_token(t) for t in task_types]})
+    model.resize_token_embeddings(len(tokenizer))
+
+    train_sets, val_sets, data_paths = [], [], []
+    for task_type in task_types:
+        prefix = task_prefix_token(task_type)
+        train_sets.append(AIEducationDataset(FILES[task_type]["train"], tokenizer, task_type, "training", prompt_prefix=prefix))
+        val_sets.append(AIEducationDataset(FILES[task_type]["val"], tokenizer, task_type, "validation", prompt_prefix=prefix))
+        data_paths += [FILES[task_type]["train"], FILES[task_type]["val"]]
+
+    train_dataset = MultiTaskDataset([d for d in train_sets if len(d)])
+    val_dataset = MultiTaskDataset([d for d in val_sets if len(d)])
+
+    if len(train_dataset) == 0 or len(val_dataset) == 0:
+        print("🛑 Skipping multi-task training — no valid data loaded.")
+        return None
+
+    return _run_training("multitask", model, tokenizer, train_dataset, val_dataset, data_paths, resume)
+
+
+def _remove_checkpoints(output_dir: str):
+    """Delete an earlier run's checkpoints, so that a restart of the new run can't
+    resume from them and checkpoint rotation can't keep them over its own"""
+    stale = [name for name in os.listdir(output_dir) if name.startswith(f"{PREFIX_CHECKPOINT_DIR}-")]
+    for name in stale:
+        shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+    if stale:
+        print(f"🧹 Removed {len(stale)} checkpoint(s) of the previous run.")
+
+
+def _resume_checkpoint(output_dir: str, data_hashes: Dict[str, str], resume: bool) -> Optional[str]:
+    """Newest checkpoint in output_dir, if it was trained on the same data.
+
+    Otherwise the run starts fresh and the old checkpoints are removed.
+    """
+    if not os.path.isdir(output_dir):
+        return None
+    if not resume:
+        _remove_checkpoints(output_dir)
+        return None
+    state_path = os.path.join(output_dir, "run_state.json")
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            previous_hashes = json.load(f).get("data_hashes")
+    except (OSError, ValueError):
+        previous_hashes = None
+    if previous_hashes != data_hashes:
+        print("ℹ️ Training data changed since the last checkpoint — starting fresh.")
+        _remove_checkpoints(output_dir)
+        return None
+    return get_last_checkpoint(output_dir)
+
+
+def _run_training(run_name: str, model, tokenizer, train_dataset, val_dataset,
+                  data_paths: List[str], resume: bool = True) -> Dict:
+    start = time.perf_counter()
+    output_dir = os.path.join(MODEL_SAVE_PATH, f"{run_name}_checkpoints")
+    data_hashes = {path: file_sha256(path) for path in data_paths}
+    train_tokens = int(train_dataset.lengths.sum())
+
+    if PACK_SEQUENCES:
+        train_dataset = PackedDataset(train_dataset, MAX_LENGTH)
+        val_dataset = PackedDataset(val_dataset, MAX_LENGTH)
+        data_collator = PackedCollator(tokenizer.pad_token_id, mask_prompt=MASK_PROMPT_LOSS)
+        enable_packed_attention(model)
+    else:
+        data_collator = DynamicPaddingCollator(tokenizer.pad_token_id, mask_prompt=MASK_PROMPT_LOSS)
 
     # Training arguments
     training_args = TrainingArguments(
-        output_dir=os.path.join(MODEL_SAVE_PATH, f"{task_type}_checkpoints"),
+        output_dir=output_dir,
         num_train_epochs=15,
         per_device_train_batch_size=2,
         per_device_eval_batch_size=4,
@@ -145,7 +500,8 @@ def train_specific_model(task_type: str, train_path: str, val_path: str):
         save_total_limit=3,
         fp16=torch.cuda.is_available(),
         dataloader_pin_memory=False,
-        remove_unused_columns=False
+        remove_unused_columns=False,
+        group_by_length=GROUP_BY_LENGTH and not PACK_SEQUENCES
     )
 
     # Trainer setup
@@ -154,41 +510,140 @@ def train_specific_model(task_type: str, train_path: str, val_path: str):
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=data_collator,
         tokenizer=tokenizer,
         callbacks=[EarlyStoppingCallback(early_stopping_patience=5)]
     )
 
+    checkpoint = _resume_checkpoint(output_dir, data_hashes, resume)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "run_state.json"), 'w', encoding='utf-8') as f:
+        json.dump({"data_hashes": data_hashes}, f, indent=2)
+
+    if checkpoint:
+        print(f"🔁 Resuming from checkpoint: {checkpoint}")
     print("🔥 Training started (optimized for small datasets)...")
 
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
 
-    trainer.train()
-    print(f"✅ Training for {task_type} completed!")
+    train_result = trainer.train(resume_from_checkpoint=checkpoint)
+    print(f"✅ Training for {run_name} completed!")
 
-    final_path = os.path.join(MODEL_SAVE_PATH, f"final_model_{task_type}")
+    final_path = os.path.join(MODEL_SAVE_PATH, f"final_model_{run_name}")
     trainer.save_model(final_path)
     tokenizer.save_pretrained(final_path)
-    print(f"📦 Saved fine-tuned {task_type} model to: {final_path}")
+    print(f"📦 Saved fine-tuned {run_name} model to: {final_path}")
+
+    metrics = train_result.metrics
+    runtime = metrics.get("train_runtime") or 0.0
+    epochs = metrics.get("epoch") or training_args.num_train_epochs
+    return {
+        "run": run_name,
+        "final_model": final_path,
+        "resumed_from": checkpoint,
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "train_runtime": runtime,
+        "train_samples_per_second": metrics.get("train_samples_per_second"),
+        "train_tokens_per_second": round(train_tokens * epochs / runtime, 1) if runtime else None,
+        "train_loss": metrics.get("train_loss"),
+        "best_eval_loss": trainer.state.best_metric,
+        "global_step": trainer.state.global_step,
+        "torch_threads": torch.get_num_threads(),
+    }
 
 
 # ============================
-# 🧩 MAIN EXECUTION
+# 🧵 ORCHESTRATION
 # ============================
 
-if __name__ == "__main__":
-    # Train Lesson Plan Model
-    train_specific_model(
-        task_type="lesson_plan",
-        train_path=FILES["lesson_plan"]["train"],
-        val_path=FILES["lesson_plan"]["val"]
-    )
+def _train_in_subprocess(task_type: str, threads: int, cores: Optional[List[int]], resume: bool) -> Optional[Dict]:
+    """Entry point of a worker process: pin it to its cores and threads, then train"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    return train_specific_model(task_type, FILES[task_type]["train"], FILES[task_type]["val"], resume=resume)
+
+
+def train_tasks_in_parallel(task_types: List[str], resume: bool = True, threads_per_task: Optional[int] = None) -> List[Optional[Dict]]:
+    """Train each task in its own process, with the CPU cores split between them"""
+    cpu_count = os.cpu_count() or 1
+    threads = threads_per_task or max(1, cpu_count // len(task_types))
+    can_pin = threads * len(task_types) <= cpu_count
+
+    # Download the base model once, before the workers race to fetch it
+    load_base_model()
+
+    jobs = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(task_types), mp_context=context) as executor:
+        for i, task_type in enumerate(task_types):
+            cores = list(range(i * threads, (i + 1) * threads)) if can_pin else None
+            print(f"🧵 Training '{task_type}' in its own process with {threads} thread(s)"
+                  + (f" on cores {cores[0]}-{cores[-1]}" if cores else ""))
+            # Child processes read OMP_NUM_THREADS when torch starts up
+            os.environ["OMP_NUM_THREADS"] = str(threads)
+            jobs.append(executor.submit(_train_in_subprocess, task_type, threads, cores, resume))
+        return [job.result() for job in jobs]
+
+
+def write_run_summary(mode: str, runs: List[Optional[Dict]], wall_seconds: float) -> str:
+    summary_path = os.path.join(MODEL_SAVE_PATH, "run_summary.json")
+    summary = {
+        "mode": mode,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "wall_seconds": round(wall_seconds, 2),
+        "cpu_count": os.cpu_count(),
+        "runs": [run for run in runs if run],
+    }
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune the EDUASSIST lesson plan and quiz models.")
+    parser.add_argument("--tasks", nargs="+", choices=sorted(FILES), default=["lesson_plan", "quiz"],
+                        help="Tasks to train (default: all)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--parallel", action="store_true",
+                      help="Train each task concurrently in its own process")
+    mode.add_argument("--multitask", action="store_true",
+                      help="Train one shared model with a task prefix token")
+    parser.add_argument("--threads-per-task", type=int, default=None,
+                        help="Torch threads per task process with --parallel (default: CPU cores / tasks)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore existing checkpoints and start from the base model")
+    return parser.parse_args()
 
-    # Train Quiz Model
-    train_specific_model(
-        task_type="quiz",
-        train_path=FILES["quiz"]["train"],
-        val_path=FILES["quiz"]["val"]
-    )
 
-    print("\n🎉 All models (lesson_plan & quiz) trained successfully!")
+# ============================
+# 🧩 MAIN EXECUTION
+# ============================
+
+if __name__ == "__main__":
+    args = parse_args()
+    resume = not args.no_resume
+    run_start = time.perf_counter()
+
+    if args.multitask:
+        mode = "multitask"
+        runs = [train_multitask_model(args.tasks, resume=resume)]
+    elif args.parallel and len(args.tasks) > 1:
+        mode = "parallel"
+        runs = train_tasks_in_parallel(args.tasks, resume=resume, threads_per_task=args.threads_per_task)
+    else:
+        mode = "sequential"
+        runs = [
+            train_specific_model(
+                task_type=task_type,
+                train_path=FILES[task_type]["train"],
+                val_path=FILES[task_type]["val"],
+                resume=resume
+            )
+            for task_type in args.tasks
+        ]
+
+    summary_path = write_run_summary(mode, runs, time.perf_counter() - run_start)
+    print(f"\n📊 Timing and throughput summary written to: {summary_path}")
+    print(f"\n🎉 All models ({' & '.join(args.tasks)}) trained successfully!")
@@ -0,0 +1,244 @@
+"""Streaming loader for the training and validation data.
+
+Samples are read one at a time -- from the dataset JSON files in data/
+({"<name>_dataset": {"metadata": ..., "samples": [...]}}) through a chunked
+raw_decode scanner, or from JSONL files with one sample per line -- and each
+is checked against its task's schema as it is read. Accepted samples are
+packed into a SampleStore: one byte buffer holding every input and
+serialized output, plus an array of offsets. Memory grows with the text
+itself, not with a dict and two str objects per sample, and a file is never
+held in memory whole.
+"""
+import json
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# What a sample needs to be trained on: a non-empty "input" prompt and an
+# "output" object with at least these keys. A dict inside a list describes
+# the list's items. Other keys are allowed, so datasets for other chapters
+# can add fields.
+SAMPLE_SCHEMAS = {
+    "lesson_plan": {
+        "lesson_title": str,
+        "duration": str,
+        "objectives": list,
+        "lesson_steps": [{"time": str, "activity": str, "description": str}],
+    },
+    "quiz": {
+        "quiz_title": str,
+        "difficulty": str,
+        "questions": [{"question": str, "correct_answer": str}],
+    },
+}
+
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\r\n"
+
+
+class SampleStore:
+    """(input, output text) pairs packed into one buffer.
+
+    Sample i's input is buffer[offsets[2i]:offsets[2i + 1]] and its output
+    buffer[offsets[2i + 1]:offsets[2i + 2]], both UTF-8.
+    """
+
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array("q", [0])
+
+    def append(self, user_input: str, output: str):
+        self.buffer += user_input.encode("utf-8")
+        self.offsets.append(len(self.buffer))
+        self.buffer += output.encode("utf-8")
+        self.offsets.append(len(self.buffer))
+
+    def __len__(self) -> int:
+        return len(self.offsets) // 2
+
+    def __getitem__(self, idx: int) -> Tuple[str, str]:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, middle, end = self.offsets[2 * idx], self.offsets[2 * idx + 1], self.offsets[2 * idx + 2]
+        return self.buffer[start:middle].decode("utf-8"), self.buffer[middle:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets)
+
+
+class _JSONStream:
+    """A JSON text read in chunks and decoded one value at a time"""
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Append the next chunk, dropping what has been consumed; False at the end of the file"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, or '' at the end of the file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {char or 'the end of the file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the chunk
+                if self._fill():
+                    continue
+                raise
+            # A number at the very end of the chunk may continue in the next one
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _stream_array(stream: _JSONStream) -> Iterator:
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(",]") == "]":
+            return
+
+
+def _stream_object(stream: _JSONStream, nested: bool = False):
+    """Yield the items of the object's "samples" list, or of the first object
+    one level down that has one; returns whether one was found"""
+    stream.expect("{")
+    found = False
+    if stream.peek() == "}":
+        stream.pos += 1
+        return found
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        char = stream.peek()
+        if not found and key == "samples" and char == "[":
+            yield from _stream_array(stream)
+            found = True
+        elif not found and not nested and char == "{":
+            found = yield from _stream_object(stream, nested=True)
+        else:
+            stream.value()  # metadata
+        if stream.expect(",}") == "}":
+            return found
+
+
+def iter_samples(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the raw samples of a dataset JSON file (or a bare list of samples)
+    or of a JSONL file, one at a time. A JSONL line that doesn't parse is
+    yielded as the ValueError it raised."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f"line {line_number}: {e}")
+            return
+
+        stream = _JSONStream(f, chunk_size)
+        if stream.peek() == "[":
+            yield from _stream_array(stream)
+        elif not (yield from _stream_object(stream)):
+            raise ValueError("no samples list found")
+
+
+def _shape_errors(value, shape, path: str) -> List[str]:
+    if isinstance(shape, dict):
+        if not isinstance(value, dict):
+            return [f"{path}: expected an object"]
+        errors = []
+        for key, item_shape in shape.items():
+            if key in value:
+                errors.extend(_shape_errors(value[key], item_shape, f"{path}.{key}"))
+            else:
+                errors.append(f"{path}.{key}: missing")
+        return errors
+    if isinstance(shape, list):
+        if not isinstance(value, list):
+            return [f"{path}: expected a list"]
+        return [error for i, item in enumerate(value) for error in _shape_errors(item, shape[0], f"{path}[{i}]")]
+    if not isinstance(value, shape):
+        return [f"{path}: expected {shape.__name__}"]
+    return []
+
+
+def sample_errors(sample, schema: Optional[Dict] = None) -> List[str]:
+    """Why a sample can't be trained on, one message per problem (empty when it is fine)"""
+    if isinstance(sample, ValueError):
+        return [str(sample)]
+    if not isinstance(sample, dict):
+        return ["not an object"]
+    errors = []
+    user_input = sample.get("input")
+    if not isinstance(user_input, str) or not user_input.strip():
+        errors.append("input: missing or empty")
+    output = sample.get("output")
+    if not isinstance(output, dict):
+        return errors + ["output: expected an object"]
+    if schema is not None:
+        errors.extend(_shape_errors(output, schema, "output"))
+    return errors
+
+
+def load_samples(path: str, schema: Optional[Dict] = None, max_errors: int = 5,
+                 chunk_size: int = CHUNK_SIZE) -> Tuple[SampleStore, int, List[str]]:
+    """Stream a data file into a SampleStore.
+
+    Outputs are stored as json.dumps(output), the text the models are
+    trained on. Returns the store, the number of rejected samples and the
+    reasons for the first max_errors of them.
+    """
+    store = SampleStore()
+    rejected = 0
+    errors = []
+    for number, sample in enumerate(iter_samples(path, chunk_size), 1):
+        problems = sample_errors(sample, schema)
+        if problems:
+            rejected += 1
+            if len(errors) < max_errors:
+                sample_id = sample.get("id", number) if isinstance(sample, dict) else number
+                errors.append(f"sample {sample_id}: {'; '.join(problems[:3])}")
+            continue
+        store.append(sample["input"], json.dumps(sample["output"]))
+    return store, rejected, errors